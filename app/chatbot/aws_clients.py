@@ -0,0 +1,74 @@
+# app/chatbot/aws_clients.py
+"""
+Shared AWS clients for the GlucoMate chatbot stack
+- One client per (service, region) for the whole process, created lazily
+- boto3 clients are thread-safe once built; only construction is locked
+- Connection pool size, keep-alive and timeouts come from env
+"""
+
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# ---------------------------- Env flags ----------------------------
+AWS_REGION = os.getenv("GLUCOMATE_AWS_REGION", "us-east-1")
+AWS_TCP_KEEPALIVE = os.getenv("GLUCOMATE_AWS_TCP_KEEPALIVE", "1") == "1"
+
+try:
+    AWS_MAX_POOL_CONNECTIONS = int(os.getenv("GLUCOMATE_AWS_MAX_POOL_CONNECTIONS", "50"))
+except ValueError:
+    AWS_MAX_POOL_CONNECTIONS = 50
+
+try:
+    AWS_CONNECT_TIMEOUT_SECS = float(os.getenv("GLUCOMATE_AWS_CONNECT_TIMEOUT_SECS", "5"))
+except ValueError:
+    AWS_CONNECT_TIMEOUT_SECS = 5.0
+
+try:
+    AWS_READ_TIMEOUT_SECS = float(os.getenv("GLUCOMATE_AWS_READ_TIMEOUT_SECS", "60"))
+except ValueError:
+    AWS_READ_TIMEOUT_SECS = 60.0
+
+_CLIENTS = {}  # {(service_name, region_name): client}
+_LOCK = threading.Lock()
+_SESSION = None
+
+
+def _client_config():
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=AWS_CONNECT_TIMEOUT_SECS,
+        read_timeout=AWS_READ_TIMEOUT_SECS,
+        tcp_keepalive=AWS_TCP_KEEPALIVE,
+        # retries/backoff are done by app.utils.rate_limiter.call_aws
+        retries={"mode": "standard", "total_max_attempts": 1},
+    )
+
+
+def get_client(service_name, region_name=None):
+    """Return the process-wide client for a service (built on first use)."""
+    key = (service_name, region_name or AWS_REGION)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    global _SESSION
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            # boto3's default session is not safe to share while building clients
+            if _SESSION is None:
+                _SESSION = boto3.session.Session()
+            client = _SESSION.client(key[0], region_name=key[1], config=_client_config())
+            _CLIENTS[key] = client
+    return client
+
+
+def reset_clients():
+    """Drop cached clients (e.g. after a fork or a credentials rotation)."""
+    global _SESSION
+    with _LOCK:
+        _CLIENTS.clear()
+        _SESSION = None
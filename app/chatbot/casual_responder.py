@@ -0,0 +1,160 @@
+# app/chatbot/casual_responder.py
+"""
+Templated replies for small talk (no model or network call)
+- Greetings, "how are you", thanks and goodbyes in the six supported
+  languages, matched on the raw input with one keyword-automaton pass
+- Only messages made of nothing but small talk are answered: "thanks so
+  much!" is, "hi, what can I eat for breakfast?" is left to the model
+- Replies reuse the cultural greeting/farewell and the cataloged
+  encouragement phrases, personalized with the patient's first name
+"""
+
+from app.chatbot.glucomate_core import ENCOURAGEMENT_PHRASES
+from app.chatbot.translation_catalog import localize
+from app.utils.keyword_matcher import KeywordAutomaton, tokenize
+from app.utils.metrics import METRICS
+
+INTENT_KEYWORDS = {
+    'greeting': [
+        'hi', 'hello', 'hey', 'hiya', 'good morning', 'good afternoon', 'good evening',
+        'hola', 'buenos días', 'buenas tardes', 'buenas noches',
+        'bonjour', 'bonsoir', 'salut',
+        'olá', 'oi', 'bom dia', 'boa tarde', 'boa noite',
+        'hallo', 'guten tag', 'guten morgen', 'guten abend',
+        'مرحبا', 'marhaba', 'السلام عليكم', 'أهلا', 'أهلا وسهلا', 'صباح الخير', 'مساء الخير',
+    ],
+    'how_are_you': [
+        'how are you', 'how are you doing', 'how\'s it going', 'what\'s up',
+        'cómo estás', 'cómo está', 'qué tal',
+        'comment ça va', 'ça va', 'comment allez-vous',
+        'como vai', 'tudo bem', 'como está',
+        'wie geht es dir', 'wie geht es ihnen', 'wie geht\'s', 'wie gehts',
+        'كيف حالك', 'كيفك',
+    ],
+    'thanks': [
+        'thanks', 'thank you', 'thx', 'cheers',
+        'gracias', 'muchas gracias',
+        'merci', 'merci beaucoup',
+        'obrigado', 'obrigada', 'muito obrigado', 'muito obrigada',
+        'danke', 'vielen dank', 'danke schön',
+        'شكرا', 'شكرا جزيلا', 'مشكور',
+    ],
+    'farewell': [
+        'bye', 'goodbye', 'bye bye', 'see you', 'see you later', 'good night',
+        'adiós', 'hasta luego', 'hasta pronto',
+        'au revoir', 'à bientôt', 'bonne nuit',
+        'tchau', 'até logo', 'até mais',
+        'tschüss', 'auf wiedersehen', 'gute nacht',
+        'مع السلامة', 'وداعا', 'تصبح على خير',
+    ],
+}
+
+# Words that may accompany small talk without making it a question
+FILLER_WORDS = set(tokenize(
+    "there glucomate gluco mate bot you so much very again a lot too and all everyone ok okay oh "
+    "friend dear doc buddy "
+    "y tú usted amigo amiga muy mucho "
+    "et toi vous ami amie bien très "
+    "e você amigo muito "
+    "und du sie sehr freund "
+    "و يا صديقي جزيلا"
+))
+
+# Fixed replies per language (greeting and farewell come from the bot)
+HOW_ARE_YOU_REPLIES = {
+    'en': "I'm doing well, thank you for asking! How are you feeling today, and how have your blood sugar levels been?",
+    'es': "¡Estoy bien, gracias por preguntar! ¿Cómo se siente hoy y cómo han estado sus niveles de azúcar en sangre?",
+    'fr': "Je vais bien, merci de demander ! Comment vous sentez-vous aujourd'hui, et comment se porte votre glycémie ?",
+    'ar': "أنا بخير، شكراً لسؤالك! كيف تشعر اليوم، وكيف كانت مستويات السكر في الدم لديك؟",
+    'pt': "Estou bem, obrigado por perguntar! Como você está se sentindo hoje e como estão seus níveis de açúcar no sangue?",
+    'de': "Mir geht es gut, danke der Nachfrage! Wie fühlen Sie sich heute, und wie waren Ihre Blutzuckerwerte?",
+}
+
+THANKS_REPLIES = {
+    'en': "You're very welcome! I'm here whenever you need me.",
+    'es': "¡De nada! Estoy aquí siempre que me necesite.",
+    'fr': "Avec plaisir ! Je suis là chaque fois que vous avez besoin de moi.",
+    'ar': "على الرحب والسعة! أنا هنا متى احتجت إلي.",
+    'pt': "De nada! Estou aqui sempre que precisar.",
+    'de': "Gern geschehen! Ich bin jederzeit für Sie da.",
+}
+
+INVITATIONS = {
+    'en': "How can I help you with your diabetes care today?",
+    'es': "¿En qué puedo ayudarle hoy con el cuidado de su diabetes?",
+    'fr': "Comment puis-je vous aider aujourd'hui pour la gestion de votre diabète ?",
+    'ar': "كيف يمكنني مساعدتك اليوم في رعاية مرض السكري؟",
+    'pt': "Como posso ajudar você hoje com o cuidado do seu diabetes?",
+    'de': "Wie kann ich Ihnen heute bei Ihrer Diabetesversorgung helfen?",
+}
+
+INTENT_MATCHER = KeywordAutomaton(
+    (keyword, intent, None) for intent, keywords in INTENT_KEYWORDS.items() for keyword in keywords
+).build()
+
+
+def small_talk_intents(user_input):
+    """
+    Small-talk intents of a message that is nothing but small talk
+
+    Returns:
+        set: intents ('greeting', 'how_are_you', 'thanks', 'farewell'); empty
+             if there are none or the message also says something else
+    """
+    tokens = tokenize(user_input)
+    matches = INTENT_MATCHER.find_all(user_input)
+    if not tokens or not matches:
+        return set()
+    covered = set()
+    for match in matches:
+        covered.update(range(match.start, match.end))
+    if any(i not in covered and token not in FILLER_WORDS for i, token in enumerate(tokens)):
+        return set()
+    return {match.category for match in matches}
+
+
+def with_name(text, name, language_code):
+    """Address the patient in the first exclamation: "Hello, Sarah! ..." / "مرحباً يا سارة! ..." """
+    cut = text.find("!")
+    if not name or cut < 0:
+        return text
+    head = text[:cut].rstrip()
+    vocative = f" يا {name}" if language_code == 'ar' else f", {name}"
+    return head + vocative + text[len(head):]
+
+
+def template_reply(user_input, language_code, greeting, farewell, name=None):
+    """
+    Templated reply for pure small talk, or None when the model should answer
+
+    Args:
+        user_input (str): raw (untranslated) user message
+        language_code (str): reply language
+        greeting, farewell (str): the bot's cultural greeting/farewell in that language
+        name (str): patient's first name, if known
+    """
+    if language_code not in INVITATIONS:
+        return None
+    intents = small_talk_intents(user_input)
+    if not intents:
+        return None
+
+    parts = []
+    if 'greeting' in intents:
+        parts.append(greeting)
+    if 'how_are_you' in intents:
+        parts.append(HOW_ARE_YOU_REPLIES[language_code])
+    if 'thanks' in intents:
+        parts.append(THANKS_REPLIES[language_code])
+        if 'farewell' not in intents:
+            phrase = ENCOURAGEMENT_PHRASES[sum(map(ord, user_input)) % len(ENCOURAGEMENT_PHRASES)]
+            parts.append(localize(phrase, language_code))
+    if 'farewell' in intents:
+        parts.append(farewell)
+    elif intents == {'greeting'}:
+        parts.append(INVITATIONS[language_code])
+
+    parts[0] = with_name(parts[0], name, language_code)
+    for intent in intents:
+        METRICS.incr(f"casual.templated.{intent}")
+    return " ".join(parts)
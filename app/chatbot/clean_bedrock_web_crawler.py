@@ -6,9 +6,81 @@ Adds: Enhanced knowledge base with web-crawled content
 
 import boto3
 import json
+import os
 import sys
-from app.chatbot.fixed_knowledge_enhanced_glucomate import KnowledgeEnhancedGlucoMate
+from app.chatbot.fixed_knowledge_enhanced_glucomate import KnowledgeEnhancedGlucoMate, kb_cache_generation
 from .fixed_knowledge_enhanced_glucomate import KnowledgeEnhancedGlucoMate
+from app.chatbot.local_knowledge import answer_locally, format_local_answer
+from app.chatbot.question_cache import NearDuplicateQuestionCache
+from app.chatbot.clean_multilingual_glucomate import (
+    NATIVE_GENERATION_LANGS, NATIVE_STREAM_CHECK_CHARS, TRANSLATE_STAGE_TIMEOUT_SECS,
+)
+from app.chatbot.pipeline_context import turn_context
+from app.utils.metrics import span
+from app.utils.stage_executor import STAGES, Stage
+
+# ---------------------------- Near-duplicate question cache ----------------------------
+# Final answers to non-personalized, non-urgent medical questions, shared by every bot
+QUESTION_CACHE_ENABLED = os.getenv("GLUCOMATE_QUESTION_CACHE", "1") == "1"
+
+try:
+    QUESTION_CACHE_THRESHOLD = float(os.getenv("GLUCOMATE_QUESTION_CACHE_THRESHOLD", "0.8"))
+except ValueError:
+    QUESTION_CACHE_THRESHOLD = 0.8
+
+try:
+    QUESTION_CACHE_SIZE = int(os.getenv("GLUCOMATE_QUESTION_CACHE_SIZE", "1000"))
+except ValueError:
+    QUESTION_CACHE_SIZE = 1000
+
+try:
+    QUESTION_CACHE_TTL_SECS = int(os.getenv("GLUCOMATE_QUESTION_CACHE_TTL_SECS", str(6 * 3600)))
+except ValueError:
+    QUESTION_CACHE_TTL_SECS = 6 * 3600
+
+_QUESTION_CACHE = NearDuplicateQuestionCache(
+    threshold=QUESTION_CACHE_THRESHOLD,
+    maxsize=QUESTION_CACHE_SIZE,
+    ttl_secs=QUESTION_CACHE_TTL_SECS,
+)
+
+# ---------------------------- Local knowledge pre-check ----------------------------
+# Non-urgent questions that a curated local passage clearly answers skip the
+# knowledge base and the model entirely
+LOCAL_KB_PRECHECK = os.getenv("GLUCOMATE_LOCAL_KB_PRECHECK", "1") == "1"
+
+try:
+    LOCAL_KB_PRECHECK_CONFIDENCE = float(os.getenv("GLUCOMATE_LOCAL_KB_PRECHECK_CONFIDENCE", "0.7"))
+except ValueError:
+    LOCAL_KB_PRECHECK_CONFIDENCE = 0.7
+
+
+try:
+    KNOWLEDGE_STAGE_TIMEOUT_SECS = float(os.getenv("GLUCOMATE_KNOWLEDGE_STAGE_TIMEOUT_SECS", "30"))
+except ValueError:
+    KNOWLEDGE_STAGE_TIMEOUT_SECS = 30.0
+
+
+def invalidate_question_cache():
+    """Drop cached answers, e.g. after the knowledge base was re-synced"""
+    _QUESTION_CACHE.invalidate()
+
+
+_question_cache_generation = None
+
+
+def _sync_question_cache_generation():
+    """Drop this worker's cached answers once the KB cache was purged (by any worker)"""
+    global _question_cache_generation
+    generation = kb_cache_generation()
+    if _question_cache_generation is not None and generation != _question_cache_generation:
+        _QUESTION_CACHE.invalidate()
+    _question_cache_generation = generation
+
+
+def get_question_cache_stats():
+    return _QUESTION_CACHE.stats()
+
 
 class BedrockWebCrawlerGlucoMate(KnowledgeEnhancedGlucoMate):
     """
@@ -17,81 +89,260 @@ class BedrockWebCrawlerGlucoMate(KnowledgeEnhancedGlucoMate):
     Adds: Enhanced responses using web-crawled medical content
     """
     
+    SOURCE_ATTRIBUTION = "🕷️ **Enhanced Sources**: This response uses my knowledge base which includes web-crawled content from authoritative medical sources for maximum accuracy."
+    
     def __init__(self):
         super().__init__()  # Get ALL previous functionality
         print("🕷️ GlucoMate Level 4: Enhanced knowledge base with web-crawled content loaded")
     
-    def enhanced_medical_chat(self, user_input, target_language_code):
+    def enhanced_medical_chat(self, user_input, target_language_code, context=None):
         """
         Enhanced chat using knowledge base with web-crawled content
         """
+        turn = self._prepare_medical_turn(user_input, target_language_code, context)
+        if 'reply' in turn:
+            return turn['reply']
+        
+        response = self.call_bedrock_model(
+            turn['prompt'], 
+            conversation_type="medical"
+        )
+        generated = not self.is_error_response(response)
+        
+        # Translate the response (unless generated natively) together with the
+        # encouragement, warning and attribution, in one request
+        if target_language_code != 'en' and not self.keeps_native_answer(response, target_language_code):
+            parts = self._translated_reply_parts(turn, response)
+        else:
+            parts = self._translated_reply_parts(turn)
+        response = parts.get('response', response)
+        
+        # Add encouragement if needed
+        if parts['encouragement']:
+            response += "\n\n" + parts['encouragement']
+        
+        # Add medical disclaimer
+        response = self.add_medical_disclaimer(response, turn['language_name'])
+        
+        # Add safety warnings if needed
+        if parts['warning']:
+            response = parts['warning'] + "\n\n" + response
+        
+        # Add source attribution
+        response += "\n\n" + parts['attribution']
+        
+        if generated:
+            self._remember_answer(turn, response)
+        return response
+    
+    def enhanced_medical_chat_stream(self, user_input, target_language_code, context=None):
+        """
+        Streaming variant of enhanced_medical_chat
+        
+        Yields text chunks. English answers stream token by token, as do natively
+        generated languages once the first chunks pass the language check; other
+        languages are translated as a whole and arrive in one chunk. Disclaimer,
+        safety warning and source attribution are sent at the end of the stream.
+        """
+        turn = self._prepare_medical_turn(user_input, target_language_code, context)
+        if 'reply' in turn:
+            yield turn['reply']
+            return
+        
+        extras = turn['reply_parts'] or self._reply_parts(turn)
+        
+        if target_language_code == 'en':
+            chunks = []
+            for chunk in self.stream_bedrock_model(turn['prompt'], conversation_type="medical"):
+                chunks.append(chunk)
+                yield chunk
+            generated = bool(chunks) and not self.is_error_response(chunks[-1])
+            body = "".join(chunks)
+        elif target_language_code in NATIVE_GENERATION_LANGS:
+            chunks = []
+            native_ok = None  # decided once enough text has arrived
+            streamed = False
+            for chunk in self.stream_bedrock_model(turn['prompt'], conversation_type="medical"):
+                chunks.append(chunk)
+                if streamed:
+                    yield chunk
+                elif native_ok is None and sum(len(c) for c in chunks) >= NATIVE_STREAM_CHECK_CHARS:
+                    native_ok = self.keeps_native_answer("".join(chunks), target_language_code)
+                    if native_ok:
+                        streamed = True
+                        yield "".join(chunks)
+            generated = bool(chunks) and not self.is_error_response(chunks[-1])
+            body = "".join(chunks)
+            if native_ok is None:
+                # short answer: check it as a whole
+                native_ok = self.keeps_native_answer(body, target_language_code)
+            if not native_ok:
+                # wrong language: translated as a whole, with the extras
+                extras = self._translated_reply_parts(turn, body)
+                body = extras['response']
+            if not streamed:
+                yield body
+        else:
+            response = self.call_bedrock_model(turn['prompt'], conversation_type="medical")
+            generated = not self.is_error_response(response)
+            extras = self._translated_reply_parts(turn, response)
+            body = extras['response']
+            yield body
+        
+        # extras not translated with the body yet (catalog/cache hits, at most one request)
+        if 'response' not in extras:
+            extras = self._translated_reply_parts(turn)
+        if extras['encouragement']:
+            yield "\n\n" + extras['encouragement']
+            body += "\n\n" + extras['encouragement']
+        
+        tail = self.add_medical_disclaimer("", turn['language_name'])
+        if extras['warning']:
+            tail += "\n\n" + extras['warning']
+        tail += "\n\n" + extras['attribution']
+        yield tail
+        
+        if generated:
+            self._remember_answer(turn, body + tail)
+    
+    def _prepare_medical_turn(self, user_input, target_language_code, context=None):
+        """
+        Everything in a medical turn before the final model call
+        
+        Returns:
+            dict: {'reply': str} when the turn is already answered (emergency,
+                  casual or multilingual fallback), otherwise the generation
+                  prompt plus english_input, safety_check, language_name and
+                  target_language_code for finishing the response; a casual or
+                  multilingual fallback gets the turn context so translation,
+                  safety and classification are not repeated
+        """
+        context = turn_context(context, user_input, target_language_code)
+        
+        # Emergencies are recognised in any supported language, before translating
+        emergency_msg = context.memo('pre_translation_emergency',
+                                     lambda: self.pre_translation_emergency(user_input, target_language_code))
+        if emergency_msg:
+            return {'reply': emergency_msg}
+        
+        # Pure small talk needs neither Translate nor the model
+        small_talk = context.memo('small_talk', lambda: self.casual_reply(user_input, target_language_code))
+        if small_talk:
+            return {'reply': small_talk}
         
         # Translate input to English for processing
-        english_input = self.translate_to_english(user_input, target_language_code)
+        english_input = context.memo('english_input',
+                                     lambda: self.translate_to_english(user_input, target_language_code))
         
         # Safety check first
-        safety_check = self.check_safety(english_input)
+        safety_check = context.memo('safety_check', lambda: self.check_safety(english_input))
         
         if safety_check['is_emergency']:
             emergency_msg = safety_check['message']
             if target_language_code != 'en':
                 emergency_msg = self.translate_response(emergency_msg, target_language_code)
-            return emergency_msg
+            return {'reply': emergency_msg}
         
         # Get language name
-        language_name = "English"
-        for code, (name, lang_code) in self.supported_languages.items():
-            if lang_code == target_language_code:
-                language_name = name
-                break
+        language_name = context.memo('language_name', lambda: self.language_name_for(target_language_code))
         
         # Classify conversation type
-        conversation_type = self.classify_conversation_type(english_input)
+        conversation_type = context.memo('conversation_type', lambda: self.classify_conversation_type(english_input))
         
         # Handle casual conversation
         if conversation_type == "casual":
-            return self.multilingual_chat(user_input, target_language_code)
+            return {'reply': self.multilingual_chat(user_input, target_language_code, context)}
         
-        # For medical questions, use the enhanced knowledge base
-        kb_response = self.query_medical_knowledge(english_input)
+        # A curated local passage that clearly answers it? (milliseconds, no
+        # network). English input gets here without a network call (the
+        # passages are English, so other languages are translated first);
+        # the question cache below may read the shared KB generation.
+        if LOCAL_KB_PRECHECK and safety_check['urgency_level'] == 'NORMAL':
+            local = answer_locally(english_input, LOCAL_KB_PRECHECK_CONFIDENCE)
+            if local:
+                print(f"📖 Answered from local knowledge (confidence {local['confidence']:.2f})")
+                return {'reply': self._local_knowledge_reply(local, target_language_code, language_name)}
         
-        if kb_response:
-            # Enhance KB response with conversational tone
-            enhancement_prompt = self.create_knowledge_enhanced_prompt(
-                english_input, kb_response, language_name
-            )
-            
-            response = self.call_bedrock_model(
-                enhancement_prompt, 
-                conversation_type="medical"
+        # Same question (give or take wording) answered recently?
+        cacheable = QUESTION_CACHE_ENABLED and safety_check['urgency_level'] == 'NORMAL'
+        if cacheable:
+            _sync_question_cache_generation()
+            cached = _QUESTION_CACHE.lookup(english_input, target_language_code)
+            if cached:
+                print("♻️ Served near-duplicate question from cache")
+                return {'reply': cached}
+        
+        # For medical questions, ground the answer in the enhanced knowledge base.
+        # Reply parts the catalog doesn't cover are translated meanwhile.
+        reply_parts = self._reply_parts({'english_input': english_input, 'safety_check': safety_check})
+        stages = {
+            'knowledge': Stage(
+                lambda: self.build_knowledge_prompt(english_input, language_name),
+                timeout=KNOWLEDGE_STAGE_TIMEOUT_SECS,
+            ),
+        }
+        if self.needs_translate_call(reply_parts, target_language_code):
+            stages['reply_parts'] = Stage(
+                lambda: self.translate_segments(reply_parts, target_language_code),
+                timeout=TRANSLATE_STAGE_TIMEOUT_SECS,
             )
-        else:
-            # Fallback to multilingual chat
-            return self.multilingual_chat(user_input, target_language_code)
+        with span("kb_retrieval"):
+            results = STAGES.run(stages)
+        knowledge_prompt = results['knowledge']
         
-        # Add encouragement if needed
-        if any(word in english_input.lower() for word in ['scared', 'worried', 'difficult', 'hard', 'confused']):
-            encouragement = "\n\n" + self.encouragement[hash(english_input) % len(self.encouragement)]
-            response = response + encouragement
+        if not knowledge_prompt:
+            # Fallback to multilingual chat
+            return {'reply': self.multilingual_chat(user_input, target_language_code, context)}
         
-        # Translate response if needed
+        return {
+            'prompt': knowledge_prompt,
+            'english_input': english_input,
+            'safety_check': safety_check,
+            'language_name': language_name,
+            'target_language_code': target_language_code,
+            'cacheable': cacheable,
+            'reply_parts': results.get('reply_parts'),  # already translated, or None
+        }
+    
+    def _local_knowledge_reply(self, local, target_language_code, language_name):
+        """Reply built from a local passage: translated if needed, with the disclaimer"""
+        response = format_local_answer(local)
         if target_language_code != 'en':
             response = self.enhance_medical_translation(response, target_language_code)
-        
-        # Add medical disclaimer
-        response = self.add_medical_disclaimer(response, language_name)
-        
-        # Add safety warnings if needed
-        if safety_check['urgency_level'] in ['HIGH', 'MODERATE']:
-            warning_msg = safety_check['message']
-            if target_language_code != 'en':
-                warning_msg = self.translate_response(warning_msg, target_language_code)
-            response = warning_msg + "\n\n" + response
-        
-        # Add source attribution
-        response += "\n\n🕷️ **Enhanced Sources**: This response uses my knowledge base which includes web-crawled content from authoritative medical sources for maximum accuracy."
-        
-        return response
+        return self.add_medical_disclaimer(response, language_name)
+    
+    def _remember_answer(self, turn, response):
+        """Keep the final answer for near-duplicate questions (non-urgent turns only)"""
+        if turn['cacheable']:
+            _QUESTION_CACHE.store(turn['english_input'], turn['target_language_code'], response)
+    
+    def _encouragement_for(self, english_input):
+        """Encouragement line for worried/struggling users ('' otherwise)"""
+        if any(word in english_input.lower() for word in ['scared', 'worried', 'difficult', 'hard', 'confused']):
+            return self.encouragement[hash(english_input) % len(self.encouragement)]
+        return ""
+    
+    def _translated_reply_parts(self, turn, response=None):
+        """
+        Reply parts (and the response, if given) in the user's language: parts
+        translated during the KB lookup are reused, the rest go in one request
+        """
+        ready = turn['reply_parts']
+        parts = {} if ready else self._reply_parts(turn)
+        if response is not None:
+            parts['response'] = response
+        parts = self.translate_segments(parts, turn['target_language_code'])
+        return dict(ready or {}, **parts)
+    
+    def _reply_parts(self, turn):
+        """English text added around the answer: encouragement, HIGH/MODERATE warning, attribution"""
+        safety_check = turn['safety_check']
+        return {
+            'encouragement': self._encouragement_for(turn['english_input']),
+            'warning': safety_check['message'] if safety_check['urgency_level'] in ['HIGH', 'MODERATE'] else '',
+            'attribution': self.SOURCE_ATTRIBUTION,
+        }
+
 
 def main():
     """Demo of Level 4 - Enhanced Web Crawler GlucoMate"""
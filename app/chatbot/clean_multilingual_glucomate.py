@@ -6,8 +6,157 @@ Adds: Translation and cultural adaptation (without automatic language detection)
 
 import boto3
 import json
+import os
+import re
 import sys
+from app.chatbot.casual_responder import template_reply
 from app.chatbot.glucomate_core import GlucoMateCore
+from app.chatbot.language_id import ARABIC_LETTER, identify_language, language_margin
+from app.chatbot.pipeline_context import turn_context
+from app.chatbot.translation_catalog import lookup_translation
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.metrics import METRICS, span
+from app.utils.stage_executor import STAGES, Stage
+from app.utils.state_store import StateStore
+from app.utils.ttl_cache import TTLCache, make_cache_key
+
+# Per-stage timeouts when independent steps run concurrently (see StageExecutor)
+try:
+    MODEL_STAGE_TIMEOUT_SECS = float(os.getenv("GLUCOMATE_MODEL_STAGE_TIMEOUT_SECS", "60"))
+except ValueError:
+    MODEL_STAGE_TIMEOUT_SECS = 60.0
+
+try:
+    TRANSLATE_STAGE_TIMEOUT_SECS = float(os.getenv("GLUCOMATE_TRANSLATE_STAGE_TIMEOUT_SECS", "10"))
+except ValueError:
+    TRANSLATE_STAGE_TIMEOUT_SECS = 10.0
+
+# ---------------------------- Batched translation ----------------------------
+# The parts of one reply (answer, warning, ...) go to Translate in a single
+# request, joined by a separator line; TranslateText takes at most 10,000 bytes
+TRANSLATE_BATCH_SEPARATOR = "\n\n=====\n\n"
+_BATCH_SPLIT = re.compile(r"\s*=====\s*")
+
+try:
+    TRANSLATE_MAX_BATCH_BYTES = int(os.getenv("GLUCOMATE_TRANSLATE_MAX_BATCH_BYTES", "9000"))
+except ValueError:
+    TRANSLATE_MAX_BATCH_BYTES = 9000
+
+# ---------------------------- Translation cache ----------------------------
+# Safety messages, fallback notices and short user phrases repeat constantly;
+# keyed on (source, target, formality, text) so each is translated once
+TRANSLATION_CACHE_ENABLED = os.getenv("GLUCOMATE_TRANSLATION_CACHE", "1") == "1"
+TRANSLATION_CACHE_SHARED = os.getenv("GLUCOMATE_TRANSLATION_CACHE_SHARED", "1") == "1"
+
+try:
+    TRANSLATION_CACHE_SIZE = int(os.getenv("GLUCOMATE_TRANSLATION_CACHE_SIZE", "2048"))
+except ValueError:
+    TRANSLATION_CACHE_SIZE = 2048
+
+try:
+    TRANSLATION_CACHE_TTL_SECS = int(os.getenv("GLUCOMATE_TRANSLATION_CACHE_TTL_SECS", str(24 * 3600)))
+except ValueError:
+    TRANSLATION_CACHE_TTL_SECS = 24 * 3600
+
+_TRANSLATION_CACHE = TTLCache(
+    maxsize=TRANSLATION_CACHE_SIZE,
+    ttl_secs=TRANSLATION_CACHE_TTL_SECS,
+    store=StateStore(namespace="glucomate-translate", default_ttl_secs=TRANSLATION_CACHE_TTL_SECS)
+    if TRANSLATION_CACHE_SHARED else None,
+    suffix="translation",
+)
+
+
+# ---------------------------- Language identification ----------------------------
+# Input the identifier confidently calls English skips translate_to_english.
+# The identifier only overrides the declared language on input long enough to
+# judge ("merci beaucoup" scores as English) and with a clear per n-gram margin
+# over the declared language's score.
+LANGUAGE_ID_ENABLED = os.getenv("GLUCOMATE_LANGUAGE_ID", "1") == "1"
+
+try:
+    LANGUAGE_ID_MIN_CONFIDENCE = float(os.getenv("GLUCOMATE_LANGUAGE_ID_MIN_CONFIDENCE", "0.95"))
+except ValueError:
+    LANGUAGE_ID_MIN_CONFIDENCE = 0.95
+
+try:
+    LANGUAGE_ID_MIN_WORDS = int(os.getenv("GLUCOMATE_LANGUAGE_ID_MIN_WORDS", "4"))
+except ValueError:
+    LANGUAGE_ID_MIN_WORDS = 4
+
+try:
+    LANGUAGE_ID_MIN_MARGIN = float(os.getenv("GLUCOMATE_LANGUAGE_ID_MIN_MARGIN", "0.5"))
+except ValueError:
+    LANGUAGE_ID_MIN_MARGIN = 0.5
+
+# ---------------------------- Pre-translation safety ----------------------------
+# Emergency keywords of every supported language run on the raw input, so an
+# emergency is answered (from the translation catalog) before any network call
+PRE_TRANSLATION_SAFETY = os.getenv("GLUCOMATE_PRE_TRANSLATION_SAFETY", "1") == "1"
+
+# ---------------------------- Casual templates ----------------------------
+# Pure small talk ("hi", "thanks!", "bye") is answered from templates, no model call
+CASUAL_TEMPLATES_ENABLED = os.getenv("GLUCOMATE_CASUAL_TEMPLATES", "1") == "1"
+
+# ---------------------------- Native generation ----------------------------
+# Languages whose answers are kept as generated (the prompts already say
+# "Respond in {language}") instead of going through Translate a second time,
+# e.g. GLUCOMATE_NATIVE_GENERATION_LANGS=fr,es,pt,de
+NATIVE_GENERATION_LANGS = {
+    code.strip() for code in os.getenv("GLUCOMATE_NATIVE_GENERATION_LANGS", "").split(",") if code.strip()
+}
+
+try:
+    # Streaming: characters buffered before the language check lets the rest through
+    NATIVE_STREAM_CHECK_CHARS = int(os.getenv("GLUCOMATE_NATIVE_STREAM_CHECK_CHARS", "200"))
+except ValueError:
+    NATIVE_STREAM_CHECK_CHARS = 200
+
+# Common function words; enough to tell the supported Latin-script languages from English
+_FUNCTION_WORDS = {
+    'en': {'the', 'and', 'is', 'are', 'you', 'your', 'with', 'for', 'this', 'that', 'it', 'of', 'to',
+           'be', 'can', 'have', 'not', 'or', 'if', 'should', 'will', 'what', 'when', 'about'},
+    'fr': {'le', 'la', 'les', 'des', 'et', 'est', 'vous', 'votre', 'vos', 'pour', 'avec', 'une', 'dans',
+           'sur', 'pas', 'qui', 'au', 'du', 'sont', 'ce', 'il', 'peut', 'plus', 'si'},
+    'es': {'el', 'la', 'los', 'las', 'y', 'es', 'usted', 'su', 'sus', 'para', 'con', 'una', 'en', 'por',
+           'que', 'del', 'se', 'no', 'como', 'más', 'está', 'puede', 'pero', 'si'},
+    'pt': {'o', 'os', 'as', 'e', 'é', 'você', 'seu', 'sua', 'para', 'com', 'uma', 'em', 'não', 'do',
+           'da', 'dos', 'das', 'que', 'mais', 'está', 'pode', 'ou', 'se', 'no'},
+    'de': {'der', 'die', 'das', 'und', 'ist', 'sie', 'ihr', 'ihre', 'für', 'mit', 'eine', 'ein', 'nicht',
+           'zu', 'auf', 'den', 'dem', 'sich', 'auch', 'es', 'oder', 'wenn', 'kann', 'bei'},
+}
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+def clearly_wrong_language(text, language_code):
+    """
+    Cheap check that generated text is NOT in the requested language
+
+    Arabic is judged by script (share of Arabic letters); Latin-script languages
+    by function words (more English ones than target ones). Short or ambiguous
+    text passes - only a clear miss returns True.
+    """
+    if language_code == 'en' or not text:
+        return False
+    letters = [ch for ch in text if ch.isalpha()]
+    if len(letters) < 20:
+        return False
+    if language_code == 'ar':
+        arabic = sum(1 for ch in letters if ARABIC_LETTER.match(ch))
+        return arabic / len(letters) < 0.3
+    target_words = _FUNCTION_WORDS.get(language_code)
+    if not target_words:
+        return False
+    words = _WORD.findall(text.lower())
+    english = sum(1 for w in words if w in _FUNCTION_WORDS['en'])
+    target = sum(1 for w in words if w in target_words)
+    return english >= 3 and english > target
+
+
+def get_translation_cache_stats():
+    """Hit/miss counters of the translation cache (per language pair in METRICS "translate.cache.")"""
+    return dict(_TRANSLATION_CACHE.stats(), by_pair=METRICS.snapshot("translate.cache.")["counters"])
+
 
 class MultilingualGlucoMate(GlucoMateCore):
     """
@@ -55,6 +204,42 @@ class MultilingualGlucoMate(GlucoMateCore):
         
         print("🌍 GlucoMate Level 2: Multilingual support loaded (simplified)")
     
+    def pre_translation_emergency(self, user_input, target_language_code):
+        """
+        Emergency reply for raw (untranslated) input, or None
+        
+        The safety keywords include every supported language, so this runs
+        before translate_to_english; the reply is the cataloged emergency
+        message, i.e. no Translate or Bedrock call for an emergency.
+        """
+        if not PRE_TRANSLATION_SAFETY:
+            return None
+        safety_check = self.check_safety(user_input)
+        if not safety_check['is_emergency']:
+            return None
+        METRICS.incr("safety.pre_translation.emergencies")
+        print(f"🚨 Emergency keywords in raw input: {', '.join(safety_check['keywords_found'])}")
+        return self.translate_response(safety_check['message'], target_language_code)
+    
+    def casual_reply(self, user_input, target_language_code):
+        """Templated reply for pure small talk in the raw input, or None (see casual_responder)"""
+        if not CASUAL_TEMPLATES_ENABLED:
+            return None
+        reply = template_reply(
+            user_input,
+            target_language_code,
+            greeting=self.get_cultural_greeting(target_language_code),
+            farewell=self.get_cultural_farewell(target_language_code),
+            name=self.patient_first_name(),
+        )
+        if reply:
+            print("💬 Small talk answered from templates")
+        return reply
+    
+    def patient_first_name(self):
+        """First name for personalized replies (no patient profile at this level)"""
+        return None
+    
     def translate_to_english(self, text, source_language):
         """
         Translate user input to English for processing
@@ -66,16 +251,17 @@ class MultilingualGlucoMate(GlucoMateCore):
         Returns:
             str: Translated text or original if translation fails
         """
+        detected = self.detect_input_language(text, source_language)
         if source_language == 'en':
             return text
+        if detected == 'en':
+            print(f"🔤 Input already in English (declared {source_language}); not translating")
+            return text
+        if detected in self.language_codes():
+            source_language = detected  # e.g. declared 'fr' but typed Spanish
         
         try:
-            response = self.translate_client.translate_text(
-                Text=text,
-                SourceLanguageCode=source_language,
-                TargetLanguageCode='en'
-            )
-            translated = response['TranslatedText']
+            translated = self._translate_text(text, source_language, 'en')
             print(f"🔄 Translated from {source_language}: '{text}' → '{translated}'")
             return translated
             
@@ -83,6 +269,47 @@ class MultilingualGlucoMate(GlucoMateCore):
             print(f"❌ Translation to English failed: {e}")
             return text  # Return original if translation fails
     
+    def detect_input_language(self, text, declared_language):
+        """
+        Language the identifier confidently sees in user input, or None
+        
+        A language other than the declared one needs LANGUAGE_ID_MIN_WORDS
+        words and a LANGUAGE_ID_MIN_MARGIN score margin over the declared
+        language (Arabic is told apart by its script and needs neither).
+        
+        Counts every verdict against the declared language in METRICS
+        ("language_id."): checked, undetermined, kept_declared, mismatch and
+        declared.<code>.detected.<code>
+        """
+        if not LANGUAGE_ID_ENABLED:
+            return None
+        detected, confidence = identify_language(text)
+        METRICS.incr("language_id.checked")
+        if detected is None or confidence < LANGUAGE_ID_MIN_CONFIDENCE:
+            METRICS.incr("language_id.undetermined")
+            return None
+        if detected != declared_language and detected != 'ar' and (
+            len(text.split()) < LANGUAGE_ID_MIN_WORDS
+            or language_margin(text, declared_language) < LANGUAGE_ID_MIN_MARGIN
+        ):
+            # too little text, or too close a call, to overrule the user
+            METRICS.incr("language_id.kept_declared")
+            return None
+        METRICS.incr(f"language_id.declared.{declared_language}.detected.{detected}")
+        if detected != declared_language:
+            METRICS.incr("language_id.mismatch")
+        return detected
+    
+    def language_codes(self):
+        return {code for _, code in self.supported_languages.values()}
+    
+    def language_name_for(self, language_code):
+        """Display name of a supported language code ("English" if unknown)"""
+        for name, code in self.supported_languages.values():
+            if code == language_code:
+                return name
+        return "English"
+    
     def translate_response(self, text, target_language):
         """
         Translate response back to user's language
@@ -97,22 +324,143 @@ class MultilingualGlucoMate(GlucoMateCore):
         if target_language == 'en':
             return text
         
+        # Fixed bot strings (safety messages, footers, ...) are pre-translated
+        cataloged = lookup_translation(text, target_language)
+        if cataloged is not None:
+            return cataloged
+        
         try:
             # Use formal tone for medical content
-            response = self.translate_client.translate_text(
-                Text=text,
-                SourceLanguageCode='en',
-                TargetLanguageCode=target_language,
-                Settings={
-                    'Formality': 'FORMAL'  # Use formal tone for medical content
-                }
-            )
-            return response['TranslatedText']
+            return self._translate_text(text, 'en', target_language, formality='FORMAL')
             
         except Exception as e:
             print(f"❌ Translation to {target_language} failed: {e}")
             return text  # Return original if translation fails
     
+    def _translate_text(self, text, source_language, target_language, formality=None, check_cache=True):
+        """One Amazon Translate call behind the translation cache; raises on failure"""
+        if not (text or "").strip():
+            return text
+        
+        cached = self._cached_translation(text, source_language, target_language, formality) if check_cache else None
+        if cached is not None:
+            return cached
+        
+        kwargs = {
+            'Text': text,
+            'SourceLanguageCode': source_language,
+            'TargetLanguageCode': target_language,
+        }
+        if formality:
+            kwargs['Settings'] = {'Formality': formality}
+        response = self._aws_call("translate.translate_text", self.translate_client.translate_text, **kwargs)
+        translated = response['TranslatedText']
+        
+        self._cache_translation(text, source_language, target_language, formality, translated)
+        return translated
+    
+    def _cached_translation(self, text, source_language, target_language, formality=None):
+        if not TRANSLATION_CACHE_ENABLED:
+            return None
+        pair = f"{source_language}-{target_language}"
+        cached = _TRANSLATION_CACHE.get(make_cache_key(source_language, target_language, formality, text))
+        METRICS.incr(f"translate.cache.{pair}." + ("hits" if cached is not None else "misses"))
+        return cached
+    
+    def _cache_translation(self, text, source_language, target_language, formality, translated):
+        if TRANSLATION_CACHE_ENABLED:
+            _TRANSLATION_CACHE.set(make_cache_key(source_language, target_language, formality, text), translated)
+    
+    def translate_segments(self, segments, target_language):
+        """
+        Translate the English parts of one reply with as few Translate calls as possible
+        
+        Catalog and cache hits cost nothing; the remaining parts are joined with
+        TRANSLATE_BATCH_SEPARATOR into one request (several if over
+        TRANSLATE_MAX_BATCH_BYTES) and split back apart. If the separators don't
+        survive translation, those parts are translated one by one.
+        
+        Args:
+            segments (dict): name -> English text ('' / None left as is)
+            target_language (str): Target language code
+            
+        Returns:
+            dict: name -> translated text (original text where translation failed)
+        """
+        results = dict(segments)
+        if target_language == 'en':
+            return results
+        
+        pending = []  # (name, leading whitespace, text, trailing whitespace)
+        for name, segment in segments.items():
+            core = (segment or "").strip()
+            if not core:
+                continue
+            lead = segment[:len(segment) - len(segment.lstrip())]
+            trail = segment[len(segment.rstrip()):]
+            hit = lookup_translation(core, target_language)
+            if hit is None:
+                hit = self._cached_translation(core, 'en', target_language, 'FORMAL')
+            if hit is not None:
+                results[name] = lead + hit + trail
+            else:
+                pending.append((name, lead, core, trail))
+        
+        batch, batch_bytes = [], 0
+        for item in pending + [None]:
+            size = len(item[2].encode("utf-8")) + len(TRANSLATE_BATCH_SEPARATOR) if item else 0
+            if batch and (item is None or batch_bytes + size > TRANSLATE_MAX_BATCH_BYTES):
+                with span("back_translation"):
+                    translated = self._translate_batch([core for _, _, core, _ in batch], target_language)
+                for (name, lead, _, trail), text in zip(batch, translated):
+                    results[name] = lead + text + trail
+                batch, batch_bytes = [], 0
+            if item:
+                batch.append(item)
+                batch_bytes += size
+        return results
+    
+    def needs_translate_call(self, segments, target_language):
+        """True if some part is not in the catalog, i.e. translating the parts may need a Translate request"""
+        if target_language == 'en':
+            return False
+        return any((segment or "").strip() and lookup_translation(segment.strip(), target_language) is None
+                   for segment in segments.values())
+    
+    def _translate_batch(self, texts, target_language):
+        """Translate several English texts in one request; falls back to one request each"""
+        if len(texts) > 1 and not any(_BATCH_SPLIT.search(text) for text in texts):
+            try:
+                response = self._aws_call(
+                    "translate.translate_text",
+                    self.translate_client.translate_text,
+                    Text=TRANSLATE_BATCH_SEPARATOR.join(texts),
+                    SourceLanguageCode='en',
+                    TargetLanguageCode=target_language,
+                    Settings={'Formality': 'FORMAL'}
+                )
+                parts = _BATCH_SPLIT.split(response['TranslatedText'].strip())
+                if len(parts) == len(texts):
+                    METRICS.incr("translate.batch.requests")
+                    METRICS.incr("translate.batch.calls_saved", len(texts) - 1)
+                    for text, translated in zip(texts, parts):
+                        self._cache_translation(text, 'en', target_language, 'FORMAL', translated)
+                    return parts
+                METRICS.incr("translate.batch.split_mismatch")
+                print(f"⚠️ Batched translation came back in {len(parts)} parts, expected {len(texts)}")
+            except Exception as e:
+                METRICS.incr("translate.batch.errors")
+                print(f"❌ Batched translation to {target_language} failed: {e}")
+        return [self._translate_uncached(text, target_language) for text in texts]
+    
+    def _translate_uncached(self, text, target_language):
+        # caller already missed the catalog and the cache
+        try:
+            return self._translate_text(text, 'en', target_language, formality='FORMAL', check_cache=False)
+        except Exception as e:
+            print(f"❌ Translation to {target_language} failed: {e}")
+            return text
+    
     def create_culturally_aware_prompt(self, user_input, language_code, language_name):
         """
         Create prompts that are culturally sensitive
@@ -171,23 +519,62 @@ class MultilingualGlucoMate(GlucoMateCore):
         
         return translated
     
-    def multilingual_chat(self, user_input, target_language_code):
+    def localize_generated_response(self, text, target_language):
+        """
+        Model output from a prompt that asked for target_language, in that language
+        
+        With native generation enabled for the language the text is kept as
+        generated unless it is clearly in the wrong language; otherwise (and for
+        every other language) it goes through enhance_medical_translation.
+        """
+        if target_language == 'en' or self.keeps_native_answer(text, target_language):
+            return text
+        with span("back_translation"):
+            return self.enhance_medical_translation(text, target_language)
+    
+    def keeps_native_answer(self, text, target_language):
+        """True if a generated answer can be served as is (native generation on and language check passed)"""
+        if target_language not in NATIVE_GENERATION_LANGS:
+            return False
+        if not clearly_wrong_language(text, target_language):
+            METRICS.incr(f"native_generation.{target_language}.kept")
+            return True
+        METRICS.incr(f"native_generation.{target_language}.translated")
+        print(f"🔤 Answer not in {target_language}, translating")
+        return False
+    
+    def multilingual_chat(self, user_input, target_language_code, context=None):
         """
         Enhanced chat with multilingual support (no auto-detection)
         
         Args:
             user_input (str): User's input
             target_language_code (str): Target language code
+            context (ChatTurnContext): this message's context when called as a
+                fallback; stages it already ran are not repeated
             
         Returns:
             str: Response in target language
         """
+        context = turn_context(context, user_input, target_language_code)
+        
+        # Emergencies are recognised in any supported language, before translating
+        emergency_msg = context.memo('pre_translation_emergency',
+                                     lambda: self.pre_translation_emergency(user_input, target_language_code))
+        if emergency_msg:
+            return emergency_msg
+        
+        # Pure small talk needs neither Translate nor the model
+        small_talk = context.memo('small_talk', lambda: self.casual_reply(user_input, target_language_code))
+        if small_talk:
+            return small_talk
         
         # Translate input to English for processing
-        english_input = self.translate_to_english(user_input, target_language_code)
+        english_input = context.memo('english_input',
+                                     lambda: self.translate_to_english(user_input, target_language_code))
         
         # Use inherited safety check
-        safety_check = self.check_safety(english_input)
+        safety_check = context.memo('safety_check', lambda: self.check_safety(english_input))
         
         if safety_check['is_emergency']:
             emergency_msg = safety_check['message']
@@ -197,14 +584,10 @@ class MultilingualGlucoMate(GlucoMateCore):
             return emergency_msg
         
         # Get language name for prompt
-        language_name = "English"
-        for code, (name, lang_code) in self.supported_languages.items():
-            if lang_code == target_language_code:
-                language_name = name
-                break
+        language_name = context.memo('language_name', lambda: self.language_name_for(target_language_code))
         
         # Create culturally-aware prompt
-        conversation_type = self.classify_conversation_type(english_input)
+        conversation_type = context.memo('conversation_type', lambda: self.classify_conversation_type(english_input))
         
         if conversation_type == "casual":
             # Use inherited base prompt for casual conversation
@@ -219,23 +602,42 @@ class MultilingualGlucoMate(GlucoMateCore):
                 english_input, target_language_code, language_name
             )
         
-        # Get response from Bedrock (inherited method)
-        response = self.call_bedrock_model(prompt, conversation_type=conversation_type)
+        # Get response from Bedrock (inherited method). A safety warning the
+        # catalog doesn't cover is translated while the model generates.
+        warning = safety_check['message'] if safety_check['urgency_level'] in ['HIGH', 'MODERATE'] else ''
+        stages = {
+            'response': Stage(
+                lambda: self.call_bedrock_model(prompt, conversation_type=conversation_type),
+                timeout=MODEL_STAGE_TIMEOUT_SECS,
+                default=self._handle_bedrock_error("request timed out"),
+                reraise=(CircuitOpenError,),
+            ),
+        }
+        if self.needs_translate_call({'warning': warning}, target_language_code):
+            stages['warning'] = Stage(
+                lambda: self.translate_segments({'warning': warning}, target_language_code)['warning'],
+                timeout=TRANSLATE_STAGE_TIMEOUT_SECS,
+                default=warning,
+            )
+        results = STAGES.run(stages)
+        response = results['response']
         
-        # Enhance translation with medical terms
-        if target_language_code != 'en':
-            response = self.enhance_medical_translation(response, target_language_code)
+        # Translate the answer (unless generated natively), with the warning
+        # unless that was already translated above, in one request
+        parts = {} if 'warning' in results else {'warning': warning}
+        if target_language_code != 'en' and not self.keeps_native_answer(response, target_language_code):
+            parts['response'] = response
+        parts = self.translate_segments(parts, target_language_code)
+        parts['warning'] = results.get('warning', parts.get('warning'))
+        response = parts.get('response', response)
         
         # Add disclaimer in appropriate language (inherited method)
         if conversation_type == "medical":
             response = self.add_medical_disclaimer(response, language_name)
         
         # Add warning if needed (inherited safety check)
-        if safety_check['urgency_level'] in ['HIGH', 'MODERATE']:
-            warning_msg = safety_check['message']
-            if target_language_code != 'en':
-                warning_msg = self.translate_response(warning_msg, target_language_code)
-            response = warning_msg + "\n\n" + response
+        if parts['warning']:
+            response = parts['warning'] + "\n\n" + response
         
         return response
     
@@ -6,8 +6,124 @@ Adds: Knowledge base queries, medical citations, authoritative sources
 
 import boto3
 import json
+import os
 import sys
 from app.chatbot.clean_multilingual_glucomate import MultilingualGlucoMate
+from app.chatbot.model_routing import ROUTES
+from app.chatbot.pipeline_context import turn_context
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.hedging import Hedger
+from app.utils.metrics import span
+from app.utils.rate_limiter import THROTTLE_CODES, RateLimitDeadlineExceeded, aws_error_code
+from app.utils.single_flight import SingleFlight
+from app.utils.state_store import StateStore
+from app.utils.ttl_cache import TTLCache, make_cache_key
+
+# ---------------------------- Env flags ----------------------------
+# "single": retrieve passages + one persona-aware generation call
+# "two_pass": retrieve_and_generate (Haiku) + a tone rewrite on the chat model
+KB_PIPELINE_MODE = os.getenv("GLUCOMATE_KB_PIPELINE", "single").strip().lower()
+
+try:
+    KB_PASSAGE_COUNT = int(os.getenv("GLUCOMATE_KB_PASSAGES", "5"))
+except ValueError:
+    KB_PASSAGE_COUNT = 5
+
+KB_PASSAGE_MAX_CHARS = 1200
+
+# Hedging (two_pass only): if retrieve_and_generate on the KB model is slower
+# than the recent p<PERCENTILE>, race the fallback model and take the first answer.
+# The default single pipeline has no KB model call to hedge (retrieve only).
+KB_HEDGE_ENABLED = os.getenv("GLUCOMATE_KB_HEDGE", "0") == "1"
+
+try:
+    KB_HEDGE_PERCENTILE = float(os.getenv("GLUCOMATE_KB_HEDGE_PERCENTILE", "95"))
+except ValueError:
+    KB_HEDGE_PERCENTILE = 95.0
+
+try:
+    KB_HEDGE_BUDGET = float(os.getenv("GLUCOMATE_KB_HEDGE_BUDGET", "0.05"))
+except ValueError:
+    KB_HEDGE_BUDGET = 0.05
+
+try:
+    KB_HEDGE_MIN_DELAY_MS = float(os.getenv("GLUCOMATE_KB_HEDGE_MIN_DELAY_MS", "500"))
+except ValueError:
+    KB_HEDGE_MIN_DELAY_MS = 500.0
+
+_KB_HEDGER = Hedger(
+    "kb",
+    percentile=KB_HEDGE_PERCENTILE,
+    budget=KB_HEDGE_BUDGET,
+    min_delay_ms=KB_HEDGE_MIN_DELAY_MS,
+)
+
+# Concurrent identical KB queries share one Bedrock agent call (across workers with Redis)
+_KB_FLIGHTS = SingleFlight(
+    "bedrock-agent",
+    store=StateStore(namespace="glucomate-flight", default_ttl_secs=60)
+    if os.getenv("GLUCOMATE_SINGLE_FLIGHT_SHARED", "1") == "1" else None,
+)
+
+# ---------------------------- KB result cache ----------------------------
+# retrieve / retrieve_and_generate results keyed on (generation, KB id, call kind,
+# enhanced query). Many phrasings enhance to the same query string.
+KB_CACHE_ENABLED = os.getenv("GLUCOMATE_KB_CACHE", "1") == "1"
+KB_CACHE_SHARED = os.getenv("GLUCOMATE_KB_CACHE_SHARED", "1") == "1"
+
+try:
+    KB_CACHE_SIZE = int(os.getenv("GLUCOMATE_KB_CACHE_SIZE", "256"))
+except ValueError:
+    KB_CACHE_SIZE = 256
+
+try:
+    KB_CACHE_TTL_SECS = int(os.getenv("GLUCOMATE_KB_CACHE_TTL_SECS", str(6 * 3600)))
+except ValueError:
+    KB_CACHE_TTL_SECS = 6 * 3600
+
+_KB_CACHE_STORE = StateStore(namespace="glucomate-kb", default_ttl_secs=KB_CACHE_TTL_SECS) if KB_CACHE_SHARED else None
+
+_KB_CACHE = TTLCache(
+    maxsize=KB_CACHE_SIZE,
+    ttl_secs=KB_CACHE_TTL_SECS,
+    store=_KB_CACHE_STORE,
+    suffix="kb-result",
+)
+
+# Purging bumps the generation that is part of every key, so entries cached by
+# other workers (local tiers included) stop matching without being enumerated
+_KB_GENERATION_TTL_SECS = 30 * 24 * 3600
+_kb_local_generation = 0
+
+
+def kb_cache_generation():
+    """Current KB cache generation (shared across workers when the store is)"""
+    if _KB_CACHE_STORE is not None and _KB_CACHE_STORE.is_shared:
+        try:
+            data = _KB_CACHE_STORE.get_json("generation", suffix="kb-generation")
+            return max(_kb_local_generation, int((data or {}).get("v", 0)))
+        except Exception:
+            pass
+    return _kb_local_generation
+
+
+def purge_knowledge_cache():
+    """Invalidate every cached KB result, e.g. after the knowledge base was re-synced"""
+    global _kb_local_generation
+    generation = kb_cache_generation() + 1
+    _kb_local_generation = generation
+    if _KB_CACHE_STORE is not None and _KB_CACHE_STORE.is_shared:
+        try:
+            _KB_CACHE_STORE.set_json("generation", {"v": generation}, suffix="kb-generation", ttl=_KB_GENERATION_TTL_SECS)
+        except Exception:
+            pass
+    _KB_CACHE.clear()
+    return generation
+
+
+def get_knowledge_cache_stats():
+    return dict(_KB_CACHE.stats(), enabled=KB_CACHE_ENABLED, generation=kb_cache_generation())
+
 
 class KnowledgeEnhancedGlucoMate(MultilingualGlucoMate):
     """
@@ -24,6 +140,7 @@ class KnowledgeEnhancedGlucoMate(MultilingualGlucoMate):
         
         # Override model specifically for knowledge base (different from inherited model)
         self.kb_model_id = "anthropic.claude-3-haiku-20240307-v1:0"  # KB-compatible model
+        self.kb_fallback_model_id = "amazon.titan-text-express-v1"
         
         # Query enhancement for better knowledge base results
         self.medical_query_enhancements = {
@@ -39,7 +156,12 @@ class KnowledgeEnhancedGlucoMate(MultilingualGlucoMate):
         
         print("📚 GlucoMate Level 3: Knowledge base integration loaded")
         print(f"🔧 Using KB model: {self.kb_model_id}")
-        print(f"🔧 Using chat model: {self.model_id}")
+        routes = ", ".join(f"{t}={m}" for t, m in self.chat_model_routes().items())
+        print(f"🔧 Chat models by conversation type: {routes}")
+    
+    def chat_model_routes(self):
+        """{conversation type: model id} actually called (the route map, or this bot's model with routing off)"""
+        return {t: self._route_for(t).model_id for t in ROUTES}
     
     def enhance_query_for_knowledge_base(self, question):
         """
@@ -64,28 +186,30 @@ class KnowledgeEnhancedGlucoMate(MultilingualGlucoMate):
         """
         Query the diabetes knowledge base with proper model compatibility
         """
+        fallback_tried = []  # set when the hedge already sent the fallback-model request
         try:
             # Enhance query for better results
             enhanced_query = self.enhance_query_for_knowledge_base(question)
             print(f"🔍 Querying knowledge base: {enhanced_query}")
             
             # Use the KB-specific model (not the inherited chat model)
-            response = self.bedrock_agent.retrieve_and_generate(
-                input={'text': enhanced_query},
-                retrieveAndGenerateConfiguration={
-                    'type': 'KNOWLEDGE_BASE',
-                    'knowledgeBaseConfiguration': {
-                        'knowledgeBaseId': self.knowledge_base_id,
-                        'modelArn': f'arn:aws:bedrock:us-east-1::foundation-model/{self.kb_model_id}'
-                    }
-                }
-            )
+            if KB_HEDGE_ENABLED:
+                def fallback():
+                    fallback_tried.append(True)
+                    return self._retrieve_and_generate(enhanced_query, self.kb_fallback_model_id)
+                
+                response = _KB_HEDGER.run(
+                    lambda: self._retrieve_and_generate(enhanced_query, self.kb_model_id),
+                    fallback,
+                )
+            else:
+                response = self._retrieve_and_generate(enhanced_query, self.kb_model_id)
             
             print("✅ Knowledge base query successful!")
             
             # Extract response and sources
-            answer = response['output']['text']
-            citations = response.get('citations', [])
+            answer = response['text']
+            citations = response['citations']
             
             # Process and enhance the response
             enhanced_answer = self.process_knowledge_response(answer, citations)
@@ -95,28 +219,24 @@ class KnowledgeEnhancedGlucoMate(MultilingualGlucoMate):
             error_msg = str(e)
             print(f"❌ Knowledge base error: {error_msg[:100]}...")
             
-            # Try fallback with Titan Express
-            try:
-                print("🔄 Trying Titan Express fallback...")
-                fallback_response = self.bedrock_agent.retrieve_and_generate(
-                    input={'text': enhanced_query},
-                    retrieveAndGenerateConfiguration={
-                        'type': 'KNOWLEDGE_BASE',
-                        'knowledgeBaseConfiguration': {
-                            'knowledgeBaseId': self.knowledge_base_id,
-                            'modelArn': 'arn:aws:bedrock:us-east-1::foundation-model/amazon.titan-text-express-v1'
-                        }
-                    }
-                )
+            # Throttled (even after retries) or circuit open: a second model would only add load
+            throttled = aws_error_code(e) in THROTTLE_CODES or isinstance(e, RateLimitDeadlineExceeded)
+            circuit_open = isinstance(e, CircuitOpenError)
+            
+            # Try fallback with Titan Express (unless the hedge already did)
+            if not throttled and not circuit_open and not fallback_tried:
+                try:
+                    print("🔄 Trying Titan Express fallback...")
+                    fallback_response = self._retrieve_and_generate(enhanced_query, self.kb_fallback_model_id)
                 
-                print("✅ Fallback model successful!")
-                answer = fallback_response['output']['text']
-                citations = fallback_response.get('citations', [])
-                enhanced_answer = self.process_knowledge_response(answer, citations)
-                return enhanced_answer
+                    print("✅ Fallback model successful!")
+                    answer = fallback_response['text']
+                    citations = fallback_response['citations']
+                    enhanced_answer = self.process_knowledge_response(answer, citations)
+                    return enhanced_answer
                 
-            except Exception as e2:
-                print(f"❌ Fallback also failed: {str(e2)[:50]}...")
+                except Exception as e2:
+                    print(f"❌ Fallback also failed: {str(e2)[:50]}...")
             
             # Specific error handling
             if "ThrottlingException" in error_msg:
@@ -132,6 +252,89 @@ class KnowledgeEnhancedGlucoMate(MultilingualGlucoMate):
             else:
                 return None
     
+    def _retrieve_and_generate(self, enhanced_query, model_id):
+        """
+        One retrieve_and_generate call, shared by concurrent identical queries
+        
+        Returns:
+            dict: {'text': str, 'citations': list}; raises on failure
+        """
+        def call():
+            response = self._aws_call(
+                "bedrock-agent.retrieve_and_generate",
+                self.bedrock_agent.retrieve_and_generate,
+                input={'text': enhanced_query},
+                retrieveAndGenerateConfiguration={
+                    'type': 'KNOWLEDGE_BASE',
+                    'knowledgeBaseConfiguration': {
+                        'knowledgeBaseId': self.knowledge_base_id,
+                        'modelArn': f'arn:aws:bedrock:us-east-1::foundation-model/{model_id}'
+                    }
+                }
+            )
+            return {'text': response['output']['text'], 'citations': response.get('citations', [])}
+        
+        return self._kb_cached(("retrieve_and_generate", model_id), enhanced_query, call)
+    
+    def retrieve_medical_passages(self, question):
+        """
+        Fetch knowledge base passages only (retrieve API, no generation)
+        
+        Returns:
+            list: [{'text': str, 'source': str or None, 'score': float}], or None on failure
+        """
+        try:
+            enhanced_query = self.enhance_query_for_knowledge_base(question)
+            print(f"🔍 Retrieving knowledge base passages: {enhanced_query}")
+            passages = self._retrieve(enhanced_query)
+            print(f"✅ Retrieved {len(passages)} passages")
+            return passages
+        except Exception as e:
+            print(f"❌ Knowledge base retrieve error: {str(e)[:100]}...")
+            return None
+    
+    def _retrieve(self, enhanced_query):
+        """One retrieve call, shared by concurrent identical queries; raises on failure"""
+        def call():
+            response = self._aws_call(
+                "bedrock-agent.retrieve",
+                self.bedrock_agent.retrieve,
+                knowledgeBaseId=self.knowledge_base_id,
+                retrievalQuery={'text': enhanced_query},
+                retrievalConfiguration={
+                    'vectorSearchConfiguration': {'numberOfResults': KB_PASSAGE_COUNT}
+                }
+            )
+            passages = []
+            for result in response.get('retrievalResults', []):
+                text = (result.get('content') or {}).get('text', '').strip()
+                if not text:
+                    continue
+                location = result.get('location') or {}
+                source = (
+                    (location.get('webLocation') or {}).get('url')
+                    or (location.get('s3Location') or {}).get('uri')
+                )
+                passages.append({'text': text, 'source': source, 'score': result.get('score', 0.0)})
+            return passages
+        
+        return self._kb_cached(("retrieve", KB_PASSAGE_COUNT), enhanced_query, call)
+    
+    def _kb_cached(self, kind, enhanced_query, call):
+        """KB result cache + single-flight around one Bedrock agent call"""
+        key = make_cache_key(kb_cache_generation(), self.knowledge_base_id, kind, enhanced_query)
+        if KB_CACHE_ENABLED:
+            cached = _KB_CACHE.get(key)
+            if cached is not None:
+                print("♻️ Knowledge base result from cache")
+                return cached
+        
+        result = _KB_FLIGHTS.do(key, call)
+        # Empty results may be a transient retrieval problem: don't pin them
+        if KB_CACHE_ENABLED and result:
+            _KB_CACHE.set(key, result)
+        return result
+    
     def process_knowledge_response(self, answer, citations):
         """
         Process knowledge base response and add proper citations
@@ -184,16 +387,76 @@ Respond in {language} with a caring, personal touch while keeping all the medica
 
         return prompt
     
-    def knowledge_enhanced_chat(self, user_input, target_language_code):
+    def create_grounded_answer_prompt(self, user_input, passages, language="English"):
+        """
+        Single-pass prompt: answer straight from retrieved passages in GlucoMate's voice
+        """
+        excerpts = "\n\n".join(
+            f"[{i}] {p['text'][:KB_PASSAGE_MAX_CHARS]}" for i, p in enumerate(passages, 1)
+        )
+        
+        prompt = f"""You are GlucoMate, a warm and caring diabetes companion. A person asked: "{user_input}"
+
+Authoritative medical excerpts from your knowledge base:
+{excerpts}
+
+Answer their question using only the information in these excerpts. Your answer should:
+1. Keep all the medical accuracy and important details from the excerpts
+2. Sound like a knowledgeable friend, not a medical textbook
+3. Show empathy and understanding
+4. Use encouraging, supportive language
+5. Include practical tips they can use
+6. Make complex medical information easy to understand
+7. Say so plainly if the excerpts do not answer the question, rather than guessing
+
+Respond in {language} with a caring, personal touch while keeping all the medical accuracy:"""
+
+        return prompt
+    
+    def build_knowledge_prompt(self, english_input, language_name="English"):
+        """
+        Generation prompt grounded in the knowledge base, or None if the KB had nothing
+        
+        GLUCOMATE_KB_PIPELINE=single (default) retrieves passages and needs one model
+        call; two_pass keeps the original retrieve_and_generate + rewrite flow.
+        """
+        if KB_PIPELINE_MODE == "two_pass":
+            kb_response = self.query_medical_knowledge(english_input)
+            if not kb_response:
+                return None
+            return self.create_knowledge_enhanced_prompt(english_input, kb_response, language_name)
+        
+        passages = self.retrieve_medical_passages(english_input)
+        if not passages:
+            return None
+        return self.create_grounded_answer_prompt(english_input, passages, language_name)
+    
+    def knowledge_enhanced_chat(self, user_input, target_language_code, context=None):
         """
         Enhanced chat with knowledge base integration (no auto-detection)
+        
+        context (ChatTurnContext) carries translation, safety and classification
+        results into the multilingual fallback
         """
+        context = turn_context(context, user_input, target_language_code)
+        
+        # Emergencies are recognised in any supported language, before translating (inherited)
+        emergency_msg = context.memo('pre_translation_emergency',
+                                     lambda: self.pre_translation_emergency(user_input, target_language_code))
+        if emergency_msg:
+            return emergency_msg
+        
+        # Pure small talk needs neither Translate nor the model (inherited)
+        small_talk = context.memo('small_talk', lambda: self.casual_reply(user_input, target_language_code))
+        if small_talk:
+            return small_talk
         
         # Translate input to English for processing (inherited)
-        english_input = self.translate_to_english(user_input, target_language_code)
+        english_input = context.memo('english_input',
+                                     lambda: self.translate_to_english(user_input, target_language_code))
         
         # Safety check first (inherited)
-        safety_check = self.check_safety(english_input)
+        safety_check = context.memo('safety_check', lambda: self.check_safety(english_input))
         
         if safety_check['is_emergency']:
             emergency_msg = safety_check['message']
@@ -201,30 +464,22 @@ Respond in {language} with a caring, personal touch while keeping all the medica
                 emergency_msg = self.translate_response(emergency_msg, target_language_code)
             return emergency_msg
         
-        # Get language name for responses
-        language_name = "English"
-        for code, (name, lang_code) in self.supported_languages.items():
-            if lang_code == target_language_code:
-                language_name = name
-                break
+        # Get language name for responses (inherited)
+        language_name = context.memo('language_name', lambda: self.language_name_for(target_language_code))
         
         # Determine if this needs knowledge base lookup
-        conversation_type = self.classify_conversation_type(english_input)
+        conversation_type = context.memo('conversation_type', lambda: self.classify_conversation_type(english_input))
         
         if conversation_type == "casual":
             # Use inherited multilingual chat for casual conversation
-            return self.multilingual_chat(user_input, target_language_code)
+            return self.multilingual_chat(user_input, target_language_code, context)
         
         # Try knowledge base for medical questions
-        kb_response = self.query_medical_knowledge(english_input)
+        with span("kb_retrieval"):
+            enhancement_prompt = self.build_knowledge_prompt(english_input, language_name)
         
-        if kb_response:
-            # Enhance knowledge base response with conversational tone
-            enhancement_prompt = self.create_knowledge_enhanced_prompt(
-                english_input, kb_response, language_name
-            )
-            
-            # Use the inherited chat model for response enhancement
+        if enhancement_prompt:
+            # Use the inherited chat model for the knowledge-grounded answer
             response = self.call_bedrock_model(
                 enhancement_prompt, 
                 conversation_type="medical",
@@ -235,11 +490,11 @@ Respond in {language} with a caring, personal touch while keeping all the medica
         else:
             # Fallback to inherited multilingual functionality
             print("⚠️ Using multilingual fallback response")
-            return self.multilingual_chat(user_input, target_language_code)
+            return self.multilingual_chat(user_input, target_language_code, context)
         
         # Translate response if needed (inherited method)
         if target_language_code != 'en':
-            response = self.enhance_medical_translation(response, target_language_code)
+            response = self.localize_generated_response(response, target_language_code)
         
         # Add medical disclaimer (inherited method)
         response = self.add_medical_disclaimer(response, language_name)
@@ -275,8 +530,11 @@ Respond in {language} with a caring, personal touch while keeping all the medica
         """Get information about knowledge base usage"""
         return {
             'knowledge_base_id': self.knowledge_base_id,
+            'pipeline_mode': KB_PIPELINE_MODE,
+            'hedging': KB_HEDGE_ENABLED and KB_PIPELINE_MODE == "two_pass",
+            'result_cache': get_knowledge_cache_stats(),
             'kb_model_id': self.kb_model_id,
-            'chat_model_id': self.model_id,
+            'chat_model_routes': self.chat_model_routes(),
             'enhancement_terms': len(self.medical_query_enhancements)
         }
 
@@ -308,7 +566,8 @@ def main():
     print(f"\n📊 Configuration:")
     print(f"   • Knowledge Base ID: {kb_stats['knowledge_base_id']}")
     print(f"   • KB Model: {kb_stats['kb_model_id']}")
-    print(f"   • Chat Model: {kb_stats['chat_model_id']}")
+    for conversation_type, model_id in kb_stats['chat_model_routes'].items():
+        print(f"   • Chat Model ({conversation_type}): {model_id}")
     print(f"   • Query Enhancements: {kb_stats['enhancement_terms']} medical terms")
     
     # Language selection (inherited)
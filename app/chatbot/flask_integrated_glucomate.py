@@ -26,6 +26,10 @@ from app.models import (
 )
 from app.utils.state_store import StateStore
 from app.chatbot.clean_bedrock_web_crawler import BedrockWebCrawlerGlucoMate
+from app.chatbot.local_knowledge import answer_locally, format_local_answer
+from app.chatbot.pipeline_context import ChatTurnContext
+from app.chatbot.translation_catalog import localize
+from app.utils.metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -47,10 +51,102 @@ except ValueError:
 
 WEEKLY_PROMPT_THROTTLE_HOURS = int(os.getenv("WEEKLY_PROMPT_THROTTLE_HOURS", "24"))
 
+# Same bar as the crawler's local pre-check: only a clear local match replaces the generic offline text
+try:
+    OFFLINE_MIN_CONFIDENCE = float(os.getenv("GLUCOMATE_OFFLINE_MIN_CONFIDENCE", "0.7"))
+except ValueError:
+    OFFLINE_MIN_CONFIDENCE = 0.7
+
 # State store (Redis → file → in-mem)
 _STATE = StateStore(namespace="glucomate", default_ttl_secs=14 * 24 * 3600)
 _GLUCO_INSTANCES = {}  # optional per-user reuse
 
+# ---------------------------- Fixed strings ----------------------------
+# Served in the user's language from data/translation_catalog.json (no network);
+# {placeholders} are filled in after the lookup
+CHECKIN_INTRO = (
+    "🌟 Hi {name}! Time for your weekly diabetes check-in. "
+    "I'll ask you 6 quick questions. You can say 'skip' for any question, or 'stop' to do this later."
+)
+CHECKIN_QUESTION_LABEL = "Question"
+CHECKIN_OPTIONS_LABEL = "Options:"
+CHECKIN_ANSWER_HINT = "Just tell me the number or describe your answer!"
+CHECKIN_PROGRESS = "Great! ({done}/{total} completed)"
+CHECKIN_STOPPED = "No worries! Say 'weekly check-in' anytime to resume. 😊"
+
+OFFLINE_HYPOGLYCEMIA = (
+    "🚑 **Possible hypoglycemia (low blood sugar). Quick steps:**\n"
+    "1) If you can test, check your glucose now.\n"
+    "2) If below ~70 mg/dL *or you have symptoms*: take **15g fast carbs** (e.g., 120–150 ml juice, 3–4 glucose tabs, 1 tbsp honey).\n"
+    "3) Wait 15 minutes, **re-check**. If still low, repeat Step 2.\n"
+    "4) Once normal and next meal is >1 hour away, eat a **small snack** with carbs + protein (e.g., crackers + cheese).\n"
+    "5) If symptoms are severe, you can’t keep food down, or you’re alone and getting worse → seek medical help immediately.\n"
+)
+OFFLINE_LIBRARY_INTRO = "I’m having trouble reaching the medical model right now, so here is what my offline diabetes library says:"
+OFFLINE_DIABETES_BASICS = (
+    "**Diabetes** is a condition where the body has trouble regulating blood glucose. "
+    "Either the pancreas makes little/no insulin (Type 1), or the body doesn’t use insulin well (Type 2). "
+    "Gestational diabetes happens during pregnancy. Management focuses on healthy eating, activity, "
+    "monitoring glucose, and—if prescribed—medications or insulin."
+)
+OFFLINE_DEFAULT = (
+    "I’m having trouble reaching the medical model right now, but I can still help:\n"
+    "• Tell me your question (symptoms, reading, meal idea) and I’ll give general guidance.\n"
+    "• For urgent symptoms (confusion, severe dizziness, fainting), seek medical care immediately."
+)
+OFFLINE_DIET_BASICS = (
+    "🍽️ **Diabetes-friendly diet quick tips**\n"
+    "• Build plates with **½ non-starchy veg**, **¼ lean protein**, **¼ high-fiber carbs** (whole grains/legumes).\n"
+    "• Aim ~**45–60g carbs per meal** (individualize) and **15–20g per snack**; spread carbs evenly.\n"
+    "• Prefer water/unsweetened drinks; limit juices/sugary drinks.\n"
+    "• Choose **whole grains**, beans, lentils; limit refined carbs and ultra-processed snacks.\n"
+    "• Include healthy fats (olive oil, nuts) and proteins to slow glucose spikes.\n"
+    "• Pre-meal walk (10–15 min) can improve post-meal glucose.\n"
+)
+ANSWER_CUT_SHORT = "⚠️ My answer was cut short. Please ask again if you need the rest."
+
+CHECKIN_QUESTIONS = [
+    {
+        "field": "glucose_frequency",
+        "question": "How often did you check your glucose this week?",
+        "options": ["1-2 times total", "3-4 times total", "Once daily", "2-3 times daily", "4+ times daily"],
+        "type": "choice",
+    },
+    {
+        "field": "range_compliance",
+        "question": "What percentage of your readings were in target range this week?",
+        "options": ["Less than 25%", "25-50%", "50-75%", "75-90%", "90%+", "Not sure"],
+        "type": "choice",
+    },
+    {
+        "field": "energy_level",
+        "question": "On a scale of 1-10, how has your energy been this week?",
+        "options": ["1-2 (Much worse)", "3-4 (Worse)", "5-6 (About the same)", "7-8 (Better)", "9-10 (Much better)"],
+        "type": "scale",
+    },
+    {
+        "field": "sleep_quality",
+        "question": "How has your sleep quality been this week (1-10)?",
+        "options": ["1-2 (Very poor)", "3-4 (Poor)", "5-6 (Fair)", "7-8 (Good)", "9-10 (Excellent)"],
+        "type": "scale",
+    },
+    {
+        "field": "medication_adherence",
+        "question": "How consistently did you take your diabetes medications this week?",
+        "options": ["Less than 50%", "50-70%", "70-85%", "85-95%", "95-100%", "I don't take medications"],
+        "type": "choice",
+    },
+    {"field": "concerns", "question": "Any concerns or symptoms you've noticed this week?", "type": "text"},
+]
+
+# Everything above except the check-in questions (see translation_catalog.catalog_source_strings)
+CATALOG_STRINGS = [
+    CHECKIN_INTRO, CHECKIN_QUESTION_LABEL, CHECKIN_OPTIONS_LABEL, CHECKIN_ANSWER_HINT,
+    CHECKIN_PROGRESS, CHECKIN_STOPPED,
+    OFFLINE_HYPOGLYCEMIA, OFFLINE_LIBRARY_INTRO, OFFLINE_DIABETES_BASICS, OFFLINE_DEFAULT,
+    OFFLINE_DIET_BASICS, ANSWER_CUT_SHORT,
+]
+
 
 # ---------------------------- DB adapter ----------------------------
 class FlaskPostgreSQLDatabase:
@@ -211,6 +307,9 @@ class FlaskPostgreSQLDatabase:
 
 # ---------------------------- Main chatbot ----------------------------
 class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
+    # Open Bedrock circuit -> CircuitOpenError -> _offline_medical_fallback
+    RAISE_WHEN_CIRCUIT_OPEN = True
+
     def __init__(self, user_id=None, start_monitor=None):
         super().__init__()
         self.user_id = user_id
@@ -311,6 +410,10 @@ class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
             dtype = self.patient_profile.get("diabetes_type") or "diabetes"
             logger.info("Loaded profile for user_id=%s (type=%s)", self.user_id, dtype)
 
+    def patient_first_name(self):
+        name = (self.patient_profile or {}).get("name") or ""
+        return name.split()[0] if name.split() else None
+
     # ---------------- medication reminders (safe) ----------------
     def start_medication_monitoring(self):
         if not (self.patient_profile and self.patient_profile.get("medication_reminders")):
@@ -356,38 +459,36 @@ class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
             self.medication_thread.join(timeout=2)
 
     # ---------------- weekly check-in flow ----------------
-    def start_weekly_checkin(self):
+    def start_weekly_checkin(self, lang="en"):
         self.in_weekly_checkin = True
         self.current_checkin_index = 0
         self.checkin_data = {}
         self._save_state()
 
         name = self.patient_profile.get("name", "there") if self.patient_profile else "there"
-        intro = (
-            f"🌟 Hi {name}! Time for your weekly diabetes check-in. "
-            "I'll ask you 6 quick questions. You can say 'skip' for any question, or 'stop' to do this later."
-        )
-        return intro + "\n\n" + self.get_current_checkin_question()
+        intro = localize(CHECKIN_INTRO, lang).format(name=name)
+        return intro + "\n\n" + self.get_current_checkin_question(lang)
 
-    def get_current_checkin_question(self):
+    def get_current_checkin_question(self, lang="en"):
         questions = self._questions()
         if self.current_checkin_index >= len(questions):
             return None
         qd = questions[self.current_checkin_index]
-        text = f"**Question {self.current_checkin_index + 1}/{len(questions)}**: {qd['question']}"
+        label = localize(CHECKIN_QUESTION_LABEL, lang)
+        text = f"**{label} {self.current_checkin_index + 1}/{len(questions)}**: {localize(qd['question'], lang)}"
         if qd.get("options") and qd["type"] != "text":
-            text += "\n\nOptions:"
+            text += "\n\n" + localize(CHECKIN_OPTIONS_LABEL, lang)
             for i, opt in enumerate(qd["options"], 1):
-                text += f"\n{i}. {opt}"
-            text += "\n\nJust tell me the number or describe your answer!"
+                text += f"\n{i}. {localize(opt, lang)}"
+            text += "\n\n" + localize(CHECKIN_ANSWER_HINT, lang)
         return text
 
-    def process_checkin_answer(self, user_input):
+    def process_checkin_answer(self, user_input, lang="en"):
         user_input_clean = (user_input or "").strip().lower()
         if user_input_clean in {"stop", "quit", "later", "not now"}:
             self.in_weekly_checkin = False
             self._save_state()
-            return "No worries! Say 'weekly check-in' anytime to resume. 😊"
+            return localize(CHECKIN_STOPPED, lang)
 
         questions = self._questions()
         qd = questions[self.current_checkin_index]
@@ -395,7 +496,7 @@ class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
         if user_input_clean == "skip":
             self.checkin_data[qd["field"]] = None
         else:
-            self.checkin_data[qd["field"]] = self._process_answer_by_type(user_input, qd)
+            self.checkin_data[qd["field"]] = self._process_answer_by_type(user_input, qd, lang)
 
         self.current_checkin_index += 1
         self._save_state()
@@ -409,7 +510,8 @@ class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
             self._save_state()
             return reply
 
-        return f"Great! ({self.current_checkin_index}/{len(questions)} completed)\n\n{self.get_current_checkin_question()}"
+        progress = localize(CHECKIN_PROGRESS, lang).format(done=self.current_checkin_index, total=len(questions))
+        return f"{progress}\n\n{self.get_current_checkin_question(lang)}"
 
 
     def complete_weekly_checkin(self):
@@ -461,6 +563,29 @@ class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
 
     # ---------------- general chat ----------------
     def flask_integrated_chat(self, user_input, target_language_code="en"):
+        with span("begin_turn"):
+            text, reply = self._begin_turn(user_input, target_language_code)
+        if reply is not None:
+            return reply
+
+        # Default: medical chat (LLM) with safe fallback
+        return self._safe_enhanced_medical_chat(text, target_language_code)
+
+    def flask_integrated_chat_stream(self, user_input, target_language_code="en"):
+        """Same routing as flask_integrated_chat, but yields the reply in chunks."""
+        with span("begin_turn"):
+            text, reply = self._begin_turn(user_input, target_language_code)
+        if reply is not None:
+            yield reply
+            return
+
+        yield from self._safe_enhanced_medical_chat_stream(text, target_language_code)
+
+    def _begin_turn(self, user_input, target_language_code):
+        """
+        Shared start of a chat turn: state, queued saves, commands, check-in, prompts.
+        Returns (text, reply); reply is None when the turn should go to the medical chat.
+        """
         self._load_state()
         # Best-effort: flush queued assessments
         self._flush_unsent_assessments()
@@ -470,23 +595,23 @@ class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
 
         # If mid check-in, route answer
         if self.in_weekly_checkin:
-            return self.process_checkin_answer(text)
+            return text, self.process_checkin_answer(text, target_language_code)
 
         # Explicit commands
         if low in {"weekly check-in", "weekly check in", "check in"}:
-            return self.start_weekly_checkin()
+            return text, self.start_weekly_checkin(target_language_code)
         if low in {"yes", "y"} and GLUCOMATE_ENABLE_WEEKLY_CHECKIN:
-            return self.start_weekly_checkin()
+            return text, self.start_weekly_checkin(target_language_code)
         if "progress report" in low or "how am i doing" in low:
-            return self.generate_progress_report()
+            return text, self.generate_progress_report()
         if "meal plan" in low or "diet plan" in low:
-            return self.generate_personalized_meal_plan(target_language_code)
+            return text, self.generate_personalized_meal_plan(target_language_code)
 
         # Throttled weekly prompt
         if self._should_prompt_weekly():
             name = self.patient_profile.get("name", "there") if self.patient_profile else "there"
             self._update_last_weekly_prompt()
-            return (
+            return text, (
                 f"🌟 Hi {name}! It's been a week since our last check-in.\n\n"
                 "Would you like to do a quick weekly check-in? Say 'yes' to start, or ask me anything else! 😊"
             )
@@ -496,19 +621,44 @@ class FlaskIntegratedGlucoMate(BedrockWebCrawlerGlucoMate):
             reminder = self.check_medication_time()
             if reminder:
                 who = self.patient_profile.get("name", "there") if self.patient_profile else "there"
-                return f"🔔 Hi {who}! {reminder} Now, what were you asking about?"
+                return text, f"🔔 Hi {who}! {reminder} Now, what were you asking about?"
 
-        # Default: medical chat (LLM) with safe fallback
-        return self._safe_enhanced_medical_chat(text, target_language_code)
+        return text, None
 
     # ---------------- LLM safety & fallbacks ----------------
     def _safe_enhanced_medical_chat(self, text, lang):
         """Call base LLM chat; on any exception, return a helpful offline answer."""
+        if self.bedrock_degraded():
+            # Bedrock circuit open: answer now instead of waiting on a failing service
+            # (the offline answer still runs the local safety checks first)
+            print("⚡ Bedrock circuit open - serving offline answer")
+            return self._offline_medical_fallback(text, lang)
+        context = ChatTurnContext(text, lang)
         try:
-            return self.enhanced_medical_chat(text, lang)
+            return self.enhanced_medical_chat(text, lang, context)
         except Exception as e:
             logger.exception("enhanced_medical_chat failed: %s", e)
-            return self._offline_medical_fallback(text)
+            return self._offline_medical_fallback(text, lang, context)
+
+    def _safe_enhanced_medical_chat_stream(self, text, lang):
+        """Streaming twin of _safe_enhanced_medical_chat (fallback only if nothing was sent yet)."""
+        if self.bedrock_degraded():
+            print("⚡ Bedrock circuit open - serving offline answer")
+            yield self._offline_medical_fallback(text, lang)
+            return
+        sent_any = False
+        context = ChatTurnContext(text, lang)
+        try:
+            for chunk in self.enhanced_medical_chat_stream(text, lang, context):
+                if chunk:
+                    sent_any = True
+                    yield chunk
+        except Exception as e:
+            logger.exception("enhanced_medical_chat_stream failed: %s", e)
+            if not sent_any:
+                yield self._offline_medical_fallback(text, lang, context)
+            else:
+                yield "\n\n" + localize(ANSWER_CUT_SHORT, lang)
 
     def generate_personalized_meal_plan(self, target_language_code="en"):
         if not self.patient_profile:
@@ -536,97 +686,72 @@ Requirements:
 Format: 3 days with breakfast, lunch, dinner, 2 snacks; include carb counts and portions.
 """
         try:
-            response = self.call_bedrock_model(prompt, conversation_type="medical")
+            # Built from the patient profile -> never served from the response cache
+            response = self.call_bedrock_model(prompt, conversation_type="medical", cacheable=False)
             if target_language_code != "en":
                 response = self.enhance_medical_translation(response, target_language_code)
             return response
         except Exception as e:
             logger.exception("meal plan LLM failed: %s", e)
             # Offline quick-start if LLM not available
-            return self._offline_diet_basics()
+            return self._offline_diet_basics(target_language_code)
+
+    def _offline_safety_reply(self, text, lang, context=None):
+        """
+        Cataloged EMERGENCY/HIGH safety message for this input, or None.
+        Keyword and reading checks only (no Bedrock, no Translate); the raw
+        input covers native-language keywords, the English translation (if
+        this turn got that far) the rest.
+        """
+        candidates = [text]
+        if context is not None and context.get("english_input"):
+            candidates.append(context.get("english_input"))
+        for candidate in candidates:
+            safety_check = self.check_safety(candidate)
+            if safety_check["urgency_level"] in ("EMERGENCY", "HIGH"):
+                print(f"🚨 Safety check ({safety_check['urgency_level']}): {', '.join(safety_check['keywords_found'])}")
+                return localize(safety_check["message"], lang)
+        return None
 
-    def _offline_medical_fallback(self, text):
+    def _offline_medical_fallback(self, text, lang="en", context=None):
+        """Best offline answer (keywords, then the local library), in the user's language where cataloged"""
+        urgent = self._offline_safety_reply(text, lang, context)
+        if urgent:
+            return urgent
+
+        # the English translation, if this turn got that far before failing
+        if context is not None:
+            text = context.get("english_input") or text
         t = (text or "").lower()
 
         # emergency-ish keyword: low blood sugar
         if any(k in t for k in ["low blood sugar", "hypogly", "i'm dizzy", "feeling dizzy", "shaky", "sweaty"]) or re.search(r"\blow\b.*\bsugar\b", t):
-            return (
-                "🚑 **Possible hypoglycemia (low blood sugar). Quick steps:**\n"
-                "1) If you can test, check your glucose now.\n"
-                "2) If below ~70 mg/dL *or you have symptoms*: take **15g fast carbs** (e.g., 120–150 ml juice, 3–4 glucose tabs, 1 tbsp honey).\n"
-                "3) Wait 15 minutes, **re-check**. If still low, repeat Step 2.\n"
-                "4) Once normal and next meal is >1 hour away, eat a **small snack** with carbs + protein (e.g., crackers + cheese).\n"
-                "5) If symptoms are severe, you can’t keep food down, or you’re alone and getting worse → seek medical help immediately.\n"
-            )
+            return localize(OFFLINE_HYPOGLYCEMIA, lang)
 
         # definition / basics
         if "what is diabetes" in t or "whats diabetes" in t or "what's diabetes" in t or t.strip() == "diabetes":
-            return (
-                "**Diabetes** is a condition where the body has trouble regulating blood glucose. "
-                "Either the pancreas makes little/no insulin (Type 1), or the body doesn’t use insulin well (Type 2). "
-                "Gestational diabetes happens during pregnancy. Management focuses on healthy eating, activity, "
-                "monitoring glucose, and—if prescribed—medications or insulin."
-            )
+            return localize(OFFLINE_DIABETES_BASICS, lang)
 
         # diet advice
-        if "diet" in t or "meal" in t or "nutrition" in t or "eat" in t:
-            return self._offline_diet_basics()
+        if re.search(r"\b(?:diet|meals?|nutrition|eat|eating|food|foods)\b", t):
+            return self._offline_diet_basics(lang)
+
+        # clear match in the local diabetes passages (BM25, no network)
+        local = answer_locally(text, OFFLINE_MIN_CONFIDENCE)
+        if local:
+            return localize(OFFLINE_LIBRARY_INTRO, lang) + "\n\n" + format_local_answer(local)
 
         # default fallback
-        return (
-            "I’m having trouble reaching the medical model right now, but I can still help:\n"
-            "• Tell me your question (symptoms, reading, meal idea) and I’ll give general guidance.\n"
-            "• For urgent symptoms (confusion, severe dizziness, fainting), seek medical care immediately."
-        )
+        return localize(OFFLINE_DEFAULT, lang)
 
-    def _offline_diet_basics(self):
-        return (
-            "🍽️ **Diabetes-friendly diet quick tips**\n"
-            "• Build plates with **½ non-starchy veg**, **¼ lean protein**, **¼ high-fiber carbs** (whole grains/legumes).\n"
-            "• Aim ~**45–60g carbs per meal** (individualize) and **15–20g per snack**; spread carbs evenly.\n"
-            "• Prefer water/unsweetened drinks; limit juices/sugary drinks.\n"
-            "• Choose **whole grains**, beans, lentils; limit refined carbs and ultra-processed snacks.\n"
-            "• Include healthy fats (olive oil, nuts) and proteins to slow glucose spikes.\n"
-            "• Pre-meal walk (10–15 min) can improve post-meal glucose.\n"
-        )
+    def _offline_diet_basics(self, lang="en"):
+        return localize(OFFLINE_DIET_BASICS, lang)
 
     # ---------------- utilities ----------------
     def _questions(self):
-        return [
-            {
-                "field": "glucose_frequency",
-                "question": "How often did you check your glucose this week?",
-                "options": ["1-2 times total", "3-4 times total", "Once daily", "2-3 times daily", "4+ times daily"],
-                "type": "choice",
-            },
-            {
-                "field": "range_compliance",
-                "question": "What percentage of your readings were in target range this week?",
-                "options": ["Less than 25%", "25-50%", "50-75%", "75-90%", "90%+", "Not sure"],
-                "type": "choice",
-            },
-            {
-                "field": "energy_level",
-                "question": "On a scale of 1-10, how has your energy been this week?",
-                "options": ["1-2 (Much worse)", "3-4 (Worse)", "5-6 (About the same)", "7-8 (Better)", "9-10 (Much better)"],
-                "type": "scale",
-            },
-            {
-                "field": "sleep_quality",
-                "question": "How has your sleep quality been this week (1-10)?",
-                "options": ["1-2 (Very poor)", "3-4 (Poor)", "5-6 (Fair)", "7-8 (Good)", "9-10 (Excellent)"],
-                "type": "scale",
-            },
-            {
-                "field": "medication_adherence",
-                "question": "How consistently did you take your diabetes medications this week?",
-                "options": ["Less than 50%", "50-70%", "70-85%", "85-95%", "95-100%", "I don't take medications"],
-                "type": "choice",
-            },
-            {"field": "concerns", "question": "Any concerns or symptoms you've noticed this week?", "type": "text"},
-        ]
-
-    def _process_answer_by_type(self, user_input, qd):
+        return CHECKIN_QUESTIONS
+
+    def _process_answer_by_type(self, user_input, qd, lang="en"):
         text = (user_input or "").strip()
         if qd["type"] == "text":
             return text
@@ -642,6 +767,12 @@ Format: 3 days with breakfast, lunch, dinner, 2 snacks; include carb counts and
                 o = opt.lower().strip()
                 if norm in o or o in norm:
                     return opt
+            if text and lang != "en":
+                # answered with the localized option text; store the English option
+                for opt in qd["options"]:
+                    o = localize(opt, lang).lower().strip()
+                    if o != opt.lower().strip() and (text.lower() in o or o in text.lower()):
+                        return opt
             return text
         return text
 
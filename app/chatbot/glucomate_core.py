@@ -7,7 +7,77 @@ import boto3
 import json
 import sys
 import os
-from app.chatbot.medical_safety import MedicalSafetyGuardrails
+import time
+from app.chatbot.aws_clients import get_client
+from app.chatbot.medical_safety import MedicalSafetyGuardrails, scan_keywords, scan_readings
+from app.chatbot.model_routing import MODEL_ROUTING_ENABLED, record_route_latency, route_for
+from app.chatbot.pipeline_context import turn_context
+from app.utils.circuit_breaker import CircuitOpenError, get_breaker
+from app.utils.metrics import record_span
+from app.utils.rate_limiter import aws_error_code, call_aws
+from app.utils.single_flight import SingleFlight
+from app.utils.state_store import StateStore
+from app.utils.ttl_cache import TTLCache, make_cache_key
+
+# ---------------------------- Response cache ----------------------------
+# Identical (model, prompt, temperature, max tokens) calls reuse the last answer.
+# Personalized prompts must be sent with cacheable=False.
+LLM_CACHE_ENABLED = os.getenv("GLUCOMATE_LLM_CACHE", "1") == "1"
+LLM_CACHE_SHARED = os.getenv("GLUCOMATE_LLM_CACHE_SHARED", "1") == "1"
+
+try:
+    LLM_CACHE_SIZE = int(os.getenv("GLUCOMATE_LLM_CACHE_SIZE", "512"))
+except ValueError:
+    LLM_CACHE_SIZE = 512
+
+try:
+    LLM_CACHE_TTL_SECS = int(os.getenv("GLUCOMATE_LLM_CACHE_TTL_SECS", "3600"))
+except ValueError:
+    LLM_CACHE_TTL_SECS = 3600
+
+_RESPONSE_CACHE = TTLCache(
+    maxsize=LLM_CACHE_SIZE,
+    ttl_secs=LLM_CACHE_TTL_SECS,
+    store=StateStore(namespace="glucomate-llm", default_ttl_secs=LLM_CACHE_TTL_SECS) if LLM_CACHE_SHARED else None,
+    suffix="response",
+)
+
+
+# Concurrent identical model calls share one invoke_model (across workers with Redis)
+_LLM_FLIGHTS = SingleFlight(
+    "bedrock.invoke_model",
+    store=StateStore(namespace="glucomate-flight", default_ttl_secs=60)
+    if os.getenv("GLUCOMATE_SINGLE_FLIGHT_SHARED", "1") == "1" else None,
+)
+
+
+# Client-side mistakes say nothing about the health of the service
+BREAKER_NEUTRAL_CODES = {"ValidationException"}
+
+# Standardized language support: menu choice -> (name, code)
+SUPPORTED_LANGUAGES = {
+    '1': ('English', 'en'),
+    '2': ('Arabic', 'ar'),
+    '3': ('French', 'fr'),
+    '4': ('Spanish', 'es'),
+    '5': ('Portuguese', 'pt'),
+    '6': ('German', 'de')
+}
+
+# Consistent encouragement phrases (pre-translated in data/translation_catalog.json)
+ENCOURAGEMENT_PHRASES = (
+    "You're taking a positive step by learning about your health.",
+    "It's wonderful that you're being proactive about your diabetes care.",
+    "Taking control of your diabetes is empowering - you're on the right track.",
+    "Every small step towards better health matters.",
+    "You're not alone in this journey - many people successfully manage diabetes.",
+)
+
+
+def get_response_cache_stats():
+    """Hit/miss counters and size of the shared Bedrock response cache"""
+    return _RESPONSE_CACHE.stats()
+
 
 class GlucoMateCore:
     """
@@ -16,12 +86,13 @@ class GlucoMateCore:
     """
     
     def __init__(self):
-        # Standardized AWS clients
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-        self.bedrock_agent = boto3.client('bedrock-agent-runtime', region_name='us-east-1')
-        self.translate_client = boto3.client('translate', region_name='us-east-1')
+        # Standardized AWS clients (shared process-wide, see aws_clients)
+        self.bedrock_client = get_client('bedrock-runtime')
+        self.bedrock_agent = get_client('bedrock-agent-runtime')
+        self.translate_client = get_client('translate')
         
         # Consistent model configuration across ALL GlucoMate variants
+        # (defaults; with GLUCOMATE_MODEL_ROUTING each conversation type gets its own route)
         self.model_id = "amazon.titan-text-premier-v1:0"
         self.default_temperature = 0.3  # Medical accuracy focused
         self.max_tokens = 2048
@@ -31,23 +102,10 @@ class GlucoMateCore:
         self.safety = MedicalSafetyGuardrails()
         
         # Standardized language support
-        self.supported_languages = {
-            '1': ('English', 'en'),
-            '2': ('Arabic', 'ar'), 
-            '3': ('French', 'fr'),
-            '4': ('Spanish', 'es'),
-            '5': ('Portuguese', 'pt'),
-            '6': ('German', 'de')
-        }
+        self.supported_languages = dict(SUPPORTED_LANGUAGES)
         
         # Consistent encouragement phrases
-        self.encouragement = [
-            "You're taking a positive step by learning about your health.",
-            "It's wonderful that you're being proactive about your diabetes care.",
-            "Taking control of your diabetes is empowering - you're on the right track.",
-            "Every small step towards better health matters.",
-            "You're not alone in this journey - many people successfully manage diabetes."
-        ]
+        self.encouragement = list(ENCOURAGEMENT_PHRASES)
         
         # Core conversation starters for consistency
         self.conversation_starters = [
@@ -58,7 +116,7 @@ class GlucoMateCore:
             "Let me share what I know about"
         ]
     
-    def call_bedrock_model(self, prompt, temperature=None, max_tokens=None, conversation_type="medical"):
+    def call_bedrock_model(self, prompt, temperature=None, max_tokens=None, conversation_type="medical", cacheable=True):
         """
         Standardized Bedrock model calling with consistent error handling
         
@@ -67,10 +125,160 @@ class GlucoMateCore:
             temperature (float): Override default temperature
             max_tokens (int): Override default max tokens  
             conversation_type (str): 'medical', 'casual', 'emergency'
+            cacheable (bool): False for personalized prompts (never cached)
         
         Returns:
             str: The response from Bedrock or an error message
+        
+        Raises:
+            CircuitOpenError: Bedrock circuit is open and RAISE_WHEN_CIRCUIT_OPEN is set
+        """
+        temperature, max_tokens, route = self._resolve_generation_params(temperature, max_tokens, conversation_type)
+        
+        request_key = self._request_key(route.model_id, prompt, temperature, max_tokens) if cacheable else None
+        if request_key and LLM_CACHE_ENABLED:
+            cached = _RESPONSE_CACHE.get(request_key)
+            if cached is not None:
+                return cached
+            
+        try:
+            if request_key:
+                output = _LLM_FLIGHTS.do(
+                    request_key, lambda: self._invoke_text_model(route, prompt, temperature, max_tokens)
+                )
+            else:
+                output = self._invoke_text_model(route, prompt, temperature, max_tokens)
+            
+        except Exception as e:
+            if isinstance(e, CircuitOpenError) and self.RAISE_WHEN_CIRCUIT_OPEN:
+                raise
+            return self._handle_bedrock_error(e)
+        
+        # Only real model output is cached, never the error messages above
+        if request_key and LLM_CACHE_ENABLED:
+            _RESPONSE_CACHE.set(request_key, output)
+        return output
+    
+    def _invoke_text_model(self, route, prompt, temperature, max_tokens):
+        """One invoke_model round trip on the route's model; raises on failure"""
+        started = time.monotonic()
+        ok = False
+        try:
+            response = self._aws_call(
+                "bedrock.invoke_model",
+                self.bedrock_client.invoke_model,
+                modelId=route.model_id,
+                body=json.dumps(self._titan_request_body(prompt, temperature, max_tokens)),
+                contentType='application/json'
+            )
+            
+            response_body = json.loads(response['body'].read())
+            ok = True
+            return response_body['results'][0]['outputText']
+        finally:
+            elapsed_ms = (time.monotonic() - started) * 1000.0
+            record_route_latency(route, elapsed_ms, ok=ok)
+            record_span("model", elapsed_ms)
+    
+    def stream_bedrock_model(self, prompt, temperature=None, max_tokens=None, conversation_type="medical", cacheable=True):
+        """
+        Streaming variant of call_bedrock_model (invoke_model_with_response_stream)
+        
+        Yields:
+            str: Text chunks as the model generates them. Errors are yielded as the
+                 same friendly messages call_bedrock_model returns. A cached answer
+                 is yielded as a single chunk.
+        """
+        temperature, max_tokens, route = self._resolve_generation_params(temperature, max_tokens, conversation_type)
+        
+        cache_key = self._request_key(route.model_id, prompt, temperature, max_tokens) if (cacheable and LLM_CACHE_ENABLED) else None
+        if cache_key:
+            cached = _RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts = []
+        sent_any = False
+        started = time.monotonic()
+        try:
+            response = self._aws_call(
+                "bedrock.invoke_model_with_response_stream",
+                self.bedrock_client.invoke_model_with_response_stream,
+                modelId=route.model_id,
+                body=json.dumps(self._titan_request_body(prompt, temperature, max_tokens)),
+                contentType='application/json'
+            )
+            
+            for event in response['body']:
+                chunk = event.get('chunk')
+                if not chunk:
+                    continue
+                text = json.loads(chunk['bytes']).get('outputText', '')
+                if text:
+                    sent_any = True
+                    parts.append(text)
+                    yield text
+                    
+        except Exception as e:
+            elapsed_ms = (time.monotonic() - started) * 1000.0
+            record_route_latency(route, elapsed_ms, ok=False)
+            record_span("model_stream", elapsed_ms)
+            if isinstance(e, CircuitOpenError) and self.RAISE_WHEN_CIRCUIT_OPEN and not sent_any:
+                raise
+            message = self._handle_bedrock_error(e)
+            yield ("\n\n" + message) if sent_any else message
+            return
+        
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+        record_route_latency(route, elapsed_ms)
+        record_span("model_stream", elapsed_ms)
+        if cache_key and parts:
+            _RESPONSE_CACHE.set(cache_key, "".join(parts))
+    
+    def _request_key(self, model_id, prompt, temperature, max_tokens):
+        """Identity of a model call, for the response cache and single-flight"""
+        normalized_prompt = " ".join(prompt.split()).casefold()
+        return make_cache_key(model_id, normalized_prompt, temperature, max_tokens)
+    
+    # Subclasses with an offline fallback set this to get CircuitOpenError
+    # from call_bedrock_model/stream_bedrock_model instead of an error message
+    RAISE_WHEN_CIRCUIT_OPEN = False
+    
+    def _aws_call(self, operation, fn, **kwargs):
+        """
+        Every outbound AWS call goes through its service's circuit breaker
+        ("bedrock", "bedrock-agent", "translate") and the shared adaptive limiter + retry
         """
+        breaker = get_breaker(operation.split(".", 1)[0])
+        if not breaker.allow():
+            raise CircuitOpenError(breaker.name)
+        
+        started = time.monotonic()
+        try:
+            result = call_aws(operation, fn, **kwargs)
+        except Exception as e:
+            if aws_error_code(e) in BREAKER_NEUTRAL_CODES:
+                breaker.record_success(time.monotonic() - started)
+            else:
+                breaker.record_failure(e, time.monotonic() - started)
+            raise
+        breaker.record_success(time.monotonic() - started)
+        return result
+    
+    def bedrock_degraded(self):
+        """True while the Bedrock circuit is open (model calls would fail fast)"""
+        return get_breaker("bedrock").is_open()
+    
+    def _route_for(self, conversation_type):
+        """Model route for a conversation type (this bot's model when routing is off)"""
+        route = route_for(conversation_type)
+        if not MODEL_ROUTING_ENABLED:
+            route = route._replace(model_id=self.model_id, max_tokens=self.max_tokens)
+        return route
+    
+    def _resolve_generation_params(self, temperature, max_tokens, conversation_type):
+        """Fill in temperature/max tokens defaults for a conversation type; returns (temperature, max_tokens, route)"""
         # Adjust temperature based on conversation type for optimal responses
         if temperature is None:
             if conversation_type == "medical":
@@ -82,48 +290,47 @@ class GlucoMateCore:
             else:
                 temperature = self.default_temperature
         
+        route = self._route_for(conversation_type)
         if max_tokens is None:
-            max_tokens = self.max_tokens
-            
-        try:
-            body = {
-                "inputText": prompt,
-                "textGenerationConfig": {
-                    "maxTokenCount": max_tokens,
-                    "temperature": temperature,
-                    "topP": self.top_p,
-                    "stopSequences": []
-                }
+            max_tokens = route.max_tokens
+        
+        return temperature, max_tokens, route
+    
+    def _titan_request_body(self, prompt, temperature, max_tokens):
+        """Request body for Titan text models"""
+        return {
+            "inputText": prompt,
+            "textGenerationConfig": {
+                "maxTokenCount": max_tokens,
+                "temperature": temperature,
+                "topP": self.top_p,
+                "stopSequences": []
             }
-            
-            response = self.bedrock_client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(body),
-                contentType='application/json'
-            )
-            
-            response_body = json.loads(response['body'].read())
-            return response_body['results'][0]['outputText']
-            
-        except Exception as e:
-            return self._handle_bedrock_error(e)
+        }
+    
+    # Friendly replies used in place of model output when a Bedrock call fails
+    BEDROCK_ERROR_MESSAGES = {
+        "ThrottlingException": "I'm getting a lot of questions right now! Please try again in a moment. I'm here whenever you're ready.",
+        "ValidationException": "I'm having trouble processing that request. Could you try rephrasing your question? I want to make sure I give you the best answer possible.",
+        "AccessDeniedException": "I'm having authentication issues with my AI system. Please check the system configuration or try again in a few minutes.",
+        "ServiceQuotaExceededException": "I've reached my usage limit for now. Please try again in a few minutes, and I'll be ready to help!",
+        "InternalServerException": "I'm experiencing some internal issues. Please try again in a moment - I should be back to normal shortly.",
+    }
+    GENERIC_ERROR_PREFIX = "I'm experiencing technical difficulties right now. Please try again in a moment."
     
     def _handle_bedrock_error(self, error):
         """Standardized error handling for Bedrock calls"""
         error_str = str(error)
         
-        if "ThrottlingException" in error_str:
-            return "I'm getting a lot of questions right now! Please try again in a moment. I'm here whenever you're ready."
-        elif "ValidationException" in error_str:
-            return "I'm having trouble processing that request. Could you try rephrasing your question? I want to make sure I give you the best answer possible."
-        elif "AccessDeniedException" in error_str:
-            return "I'm having authentication issues with my AI system. Please check the system configuration or try again in a few minutes."
-        elif "ServiceQuotaExceededException" in error_str:
-            return "I've reached my usage limit for now. Please try again in a few minutes, and I'll be ready to help!"
-        elif "InternalServerException" in error_str:
-            return "I'm experiencing some internal issues. Please try again in a moment - I should be back to normal shortly."
-        else:
-            return f"I'm experiencing technical difficulties right now. Please try again in a moment. If the problem persists, the technical details are: {error_str[:100]}"
+        for code, message in self.BEDROCK_ERROR_MESSAGES.items():
+            if code in error_str:
+                return message
+        return f"{self.GENERIC_ERROR_PREFIX} If the problem persists, the technical details are: {error_str[:100]}"
+    
+    def is_error_response(self, text):
+        """True if text is one of the _handle_bedrock_error replies, not model output"""
+        text = (text or "").strip()
+        return text.startswith(self.GENERIC_ERROR_PREFIX) or text in self.BEDROCK_ERROR_MESSAGES.values()
     
     def check_safety(self, user_input):
         """Standardized safety checking across all implementations"""
@@ -196,49 +403,46 @@ Respond in {language}:"""
         Returns:
             str: 'emergency', 'casual', 'medical'
         """
-        user_input_lower = user_input.lower()
+        # One automaton pass (shared with the safety checks of this turn)
+        found = scan_keywords(user_input)
         
-        # Emergency indicators
-        emergency_keywords = [
-            'emergency', 'urgent', 'help', '911', 'hospital', 'dying', 'emergency room',
-            'ambulance', 'call doctor', 'severe', 'can\'t breathe', 'chest pain',
-            'unconscious', 'passed out', 'blood sugar 400', 'dka', 'ketoacidosis'
-        ]
-        if any(keyword in user_input_lower for keyword in emergency_keywords):
+        # Glucose/ketone values (same memoized pass as check_emergency_situation)
+        readings = scan_readings(user_input)
+        
+        # Emergency indicators (medical_safety.CONVERSATION_EMERGENCY_KEYWORDS)
+        if found.get('conversation_emergency') or any(r.urgency_level == 'EMERGENCY' for r in readings):
             return "emergency"
         
-        # Casual conversation indicators  
-        casual_keywords = [
-            'hi', 'hello', 'hey', 'how are you', 'what\'s up', 'thanks', 'thank you',
-            'good morning', 'good afternoon', 'good evening', 'bye', 'goodbye',
-            'comment ça va', 'ça va', 'كيف حالك', '¿cómo estás', 'hola', 'bonjour',
-            'guten tag', 'bom dia', 'marhaba'
-        ]
-        if any(keyword in user_input_lower for keyword in casual_keywords):
+        # Casual conversation indicators (medical_safety.CASUAL_KEYWORDS); a reading is never small talk
+        if found.get('casual') and not readings:
             return "casual"
         
         # Medical conversation (default)
         return "medical"
     
-    def generate_core_response(self, user_input, language="English"):
+    def generate_core_response(self, user_input, language="English", context=None):
         """
         Core response generation that all implementations can use/extend
         
         Args:
             user_input (str): User's input
             language (str): Target language
+            context (ChatTurnContext): per-message results shared with the
+                other levels (see pipeline_context)
             
         Returns:
             str: Complete response with safety checks and disclaimers
         """
+        context = turn_context(context, user_input, language)
+        
         # Safety check first - this is critical
-        safety_check = self.check_safety(user_input)
+        safety_check = context.memo('safety_check', lambda: self.check_safety(user_input))
         
         if safety_check['is_emergency']:
             return safety_check['message']
         
         # Classify conversation type
-        conversation_type = self.classify_conversation_type(user_input)
+        conversation_type = context.memo('conversation_type', lambda: self.classify_conversation_type(user_input))
         
         # Create appropriate prompt
         prompt = self.create_base_diabetes_prompt(
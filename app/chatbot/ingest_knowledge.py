@@ -0,0 +1,520 @@
+# app/chatbot/ingest_knowledge.py
+"""
+Build the local knowledge index from crawled documents
+
+    python -m app.chatbot.ingest_knowledge CRAWL_DIR [--out DIR] [--full]
+
+- Streams .html/.htm/.md/.markdown/.txt files: text extraction (scripts, styles,
+  nav and boilerplate dropped), section-aware chunking with word overlap
+- Near-duplicate chunks (MinHash + LSH, Jaccard >= --dedup-threshold) are dropped;
+  the first occurrence in path order wins
+- The curated passages (data/diabetes_passages.json) are included unless --no-curated
+- Output is a directory of flat little arrays the bot mmaps at startup
+  (GLUCOMATE_LOCAL_INDEX_DIR), see local_knowledge.LocalKnowledgeIndex
+- Incremental: files whose sha256 is unchanged reuse their chunks and MinHash
+  signatures from the previous build; only new/changed files are extracted.
+  Duplicates are only re-resolved against changed files, so run --full now
+  and then (or after changing chunking options, which forces it anyway)
+
+Index directory:
+    manifest.json       version, options, per-file sha256 + chunk range
+    vocab.json          terms in term-id order
+    chunks.json         [title, source, file] per chunk
+    chunk_text.bin      UTF-8 chunk texts, back to back
+    chunk_offsets.u64   byte offset of chunk i is [i], end is [i + 1]
+    term_offsets.u32    postings of term t are [t], [t + 1]
+    postings_doc.u32    chunk ids
+    postings_tf.u16     term frequencies
+    doc_len.u32         tokens per chunk
+    minhash.u32         NUM_PERM signature slots per chunk
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import time
+from array import array
+from html.parser import HTMLParser
+
+from app.chatbot.local_knowledge import DEFAULT_PASSAGES_PATH, LOCAL_INDEX_DIR, build_postings, passage_tokens
+from app.utils.minhash import LSHIndex, MinHasher
+
+INDEX_VERSION = 1
+NUM_PERM = 64
+LSH_BANDS = 16
+READ_BLOCK = 64 * 1024
+
+
+DOC_EXTENSIONS = {".html", ".htm", ".md", ".markdown", ".txt"}
+CURATED_FILE = "curated:diabetes_passages.json"
+
+# typecode per array file (sizes are checked: the files are read back by mmap)
+ARRAY_FILES = {
+    "chunk_offsets.u64": "Q",
+    "term_offsets.u32": "I",
+    "postings_doc.u32": "I",
+    "postings_tf.u16": "H",
+    "doc_len.u32": "I",
+    "minhash.u32": "I",
+}
+_ITEMSIZE = {"Q": 8, "I": 4, "H": 2}
+for _code, _size in _ITEMSIZE.items():
+    if array(_code).itemsize != _size:
+        raise ImportError(f"array typecode {_code!r} is not {_size} bytes on this platform")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+# ---------------------------- Extraction ----------------------------
+class _HTMLTextExtractor(HTMLParser):
+    """Collects (section heading, paragraph) blocks; fed incrementally."""
+    SKIP = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe", "template"}
+    BLOCK = {"p", "div", "li", "td", "th", "section", "article", "blockquote", "pre", "dd", "dt", "tr", "br", "table", "ul", "ol"}
+    HEADINGS = {"h1", "h2", "h3", "h4"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.source = None
+        self.section = ""
+        self.blocks = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._heading = None
+        self._buf = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+            return
+        attrs = dict(attrs)
+        if tag == "title":
+            self._in_title = True
+        elif tag == "link" and (attrs.get("rel") or "").lower() == "canonical" and attrs.get("href"):
+            self.source = attrs["href"]
+        elif tag == "meta" and attrs.get("property") == "og:url" and attrs.get("content") and not self.source:
+            self.source = attrs["content"]
+        elif tag in self.HEADINGS:
+            self._flush()
+            self._heading = []
+        elif tag in self.BLOCK:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if tag == "title":
+            self._in_title = False
+        elif tag in self.HEADINGS and self._heading is not None:
+            heading = _SPACE_RE.sub(" ", "".join(self._heading)).strip()
+            self._heading = None
+            if heading:
+                self.section = heading
+                if tag == "h1" and not self.title:
+                    self.title = heading
+        elif tag in self.BLOCK:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self.title = (self.title + data).strip()
+        elif self._heading is not None:
+            self._heading.append(data)
+        else:
+            self._buf.append(data)
+
+    def _flush(self):
+        text = _SPACE_RE.sub(" ", "".join(self._buf)).strip()
+        self._buf = []
+        if text:
+            self.blocks.append((self.section, text))
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_html(path, meta):
+    """Yield (section, paragraph) from an HTML file, reading it in blocks; fills meta title/source"""
+    parser = _HTMLTextExtractor()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            data = f.read(READ_BLOCK)
+            if not data:
+                break
+            parser.feed(data)
+            blocks, parser.blocks = parser.blocks, []
+            yield from blocks
+    parser.close()
+    yield from parser.blocks
+    meta.update(title=parser.title, source=parser.source)
+
+
+_MD_LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_MD_MARKUP_RE = re.compile(r"(\*\*|__|\*|_|`|~~)")
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+def extract_markdown(path, meta):
+    """Yield (section, paragraph) from a markdown/text file, line by line; fills meta title/source"""
+    section = ""
+    para = []
+    in_code = False
+    with open(path, encoding="utf-8", errors="replace") as f:
+        first = f.readline()
+        if first.strip() == "---":
+            # YAML-ish front matter: title/url/source keys
+            for line in f:
+                if line.strip() == "---":
+                    break
+                key, _, value = line.partition(":")
+                key, value = key.strip().lower(), value.strip().strip("'\"")
+                if key == "title" and value:
+                    meta["title"] = value
+                elif key in ("url", "source", "canonical_url") and value:
+                    meta["source"] = value
+            lines = f
+        else:
+            lines = itertools.chain([first], f)
+
+        for line in lines:
+            stripped = line.strip()
+            if stripped.startswith("```"):
+                in_code = not in_code
+                continue
+            if in_code:
+                continue
+            heading = _MD_HEADING_RE.match(stripped)
+            if heading or not stripped:
+                if para:
+                    yield section, _clean_md(" ".join(para))
+                    para = []
+                if heading:
+                    section = _clean_md(heading.group(2))
+                    if len(heading.group(1)) == 1 and not meta.get("title"):
+                        meta["title"] = section
+                continue
+            para.append(stripped.lstrip(">-*+ ").strip() if stripped[:2] in ("- ", "* ", "+ ", "> ") else stripped)
+        if para:
+            yield section, _clean_md(" ".join(para))
+
+
+def _clean_md(text):
+    text = _MD_LINK_RE.sub(r"\1", text)
+    text = _MD_MARKUP_RE.sub("", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+# ---------------------------- Chunking ----------------------------
+def chunk_blocks(blocks, chunk_words=180, overlap=40, min_words=12):
+    """
+    Group (section, paragraph) blocks into chunks of about chunk_words words.
+    Chunks never span sections; long paragraphs are windowed with overlap.
+    Yields (section, text).
+    """
+    step = max(1, chunk_words - overlap)
+    current, current_section = [], None
+
+    for section, text in blocks:
+        words = text.split()
+        if current and (section != current_section or len(current) + len(words) > chunk_words):
+            if len(current) >= min_words:
+                yield current_section, " ".join(current)
+            current = []
+        current_section = section
+
+        start = 0
+        while len(words) - start > chunk_words:
+            yield section, " ".join(words[start:start + chunk_words])
+            start += step
+        current.extend(words[start:])
+
+    if len(current) >= min_words:
+        yield current_section, " ".join(current)
+
+
+def chunk_title(doc_title, section):
+    if section and doc_title and section.casefold() != doc_title.casefold():
+        return f"{doc_title}: {section}"
+    return section or doc_title
+
+
+def extract_chunks(path, rel_path, chunk_words, overlap):
+    """[(title, source, text)] for one crawled file"""
+    ext = os.path.splitext(path)[1].lower()
+    extractor = extract_html if ext in (".html", ".htm") else extract_markdown
+    meta = {}
+    chunks = list(chunk_blocks(extractor(path, meta), chunk_words=chunk_words, overlap=overlap))
+    doc_title = meta.get("title") or os.path.splitext(os.path.basename(path))[0].replace("-", " ").replace("_", " ")
+    source = meta.get("source") or rel_path
+    return [(chunk_title(doc_title, section), source, text) for section, text in chunks]
+
+
+# ---------------------------- Dedup ----------------------------
+def _shingles(text):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+class _Deduper:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=NUM_PERM)
+        self.lsh = LSHIndex(num_perm=NUM_PERM, bands=LSH_BANDS)
+        self.sigs = {}
+
+    def add(self, key, sig):
+        self.lsh.insert(key, sig)
+        self.sigs[key] = sig
+
+    def is_duplicate(self, sig):
+        return any(MinHasher.similarity(sig, self.sigs[c]) >= self.threshold for c in self.lsh.query(sig))
+
+
+# ---------------------------- Index IO ----------------------------
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _map_array(path, typecode):
+    size = os.path.getsize(path)
+    if size == 0:
+        return memoryview(array(typecode))
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # the memoryview keeps the mapping alive
+    return memoryview(mm).cast(typecode)
+
+
+class _MappedChunks:
+    """Chunk texts decoded on access from the mmapped chunk_text.bin"""
+    def __init__(self, text, offsets, meta):
+        self._text = text
+        self._offsets = offsets
+        self._meta = meta
+        self.titles = [m[0] for m in meta]
+
+    def __len__(self):
+        return len(self._meta)
+
+    def __getitem__(self, i):
+        title, source, file = self._meta[i]
+        text = bytes(self._text[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+        return {"id": i, "title": title, "text": text, "source": source, "file": file}
+
+
+def load_index_dir(index_dir):
+    """(passages, vocab, term_offsets, postings_doc, postings_tf, doc_len) for LocalKnowledgeIndex"""
+    with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != INDEX_VERSION:
+        raise ValueError(f"unsupported local index version {manifest.get('version')}")
+    if manifest.get("byteorder") != sys.byteorder:
+        raise ValueError(f"local index was built on a {manifest.get('byteorder')}-endian machine")
+
+    arrays = {name: _map_array(os.path.join(index_dir, name), code) for name, code in ARRAY_FILES.items()}
+    with open(os.path.join(index_dir, "vocab.json"), encoding="utf-8") as f:
+        vocab = {term: i for i, term in enumerate(json.load(f))}
+    with open(os.path.join(index_dir, "chunks.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+
+    text = _map_array(os.path.join(index_dir, "chunk_text.bin"), "B")
+    passages = _MappedChunks(text, arrays["chunk_offsets.u64"], meta)
+    return (
+        passages, vocab, arrays["term_offsets.u32"], arrays["postings_doc.u32"],
+        arrays["postings_tf.u16"], arrays["doc_len.u32"],
+    )
+
+
+def _load_previous(index_dir, options):
+    """Previous build's manifest + chunk access, or (None, None) when it can't be reused"""
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION or manifest.get("options") != options:
+            return None, None
+        passages = load_index_dir(index_dir)[0]
+        sigs = _map_array(os.path.join(index_dir, "minhash.u32"), "I")
+        return manifest, (passages, sigs)
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def _write_array(path, typecode, values):
+    with open(path, "wb") as f:
+        (values if isinstance(values, array) else array(typecode, values)).tofile(f)
+
+
+# ---------------------------- Build ----------------------------
+def build_index(source_dir, index_dir=LOCAL_INDEX_DIR, full=False, include_curated=True,
+                chunk_words=180, overlap=40, dedup_threshold=0.85, log=print):
+    started = time.monotonic()
+    options = {"chunk_words": chunk_words, "overlap": overlap, "dedup_threshold": dedup_threshold,
+               "num_perm": NUM_PERM, "curated": include_curated}
+    previous, prev_data = (None, None) if full else _load_previous(index_dir, options)
+    prev_files = (previous or {}).get("files", {})
+
+    # current inputs: {rel path: (abs path or None, sha256)}
+    inputs = {}
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in DOC_EXTENSIONS:
+                path = os.path.join(root, name)
+                inputs[os.path.relpath(path, source_dir).replace(os.sep, "/")] = (path, file_sha256(path))
+    if include_curated:
+        inputs[CURATED_FILE] = (DEFAULT_PASSAGES_PATH, file_sha256(DEFAULT_PASSAGES_PATH))
+
+    unchanged = {rel for rel, (_, sha) in inputs.items()
+                 if prev_data and rel in prev_files and prev_files[rel]["sha256"] == sha}
+    changed = [rel for rel in sorted(inputs) if rel not in unchanged]
+    removed = sorted(set(prev_files) - set(inputs))
+
+    deduper = _Deduper(dedup_threshold)
+    per_file = {}  # rel -> [(title, source, text, sig)]
+
+    # 1) unchanged files: chunks and signatures straight from the previous build
+    if unchanged:
+        prev_passages, prev_sigs = prev_data
+        for rel in sorted(unchanged):
+            start, end = prev_files[rel]["chunks"]
+            kept = []
+            for i in range(start, end):
+                chunk = prev_passages[i]
+                sig = tuple(prev_sigs[i * NUM_PERM:(i + 1) * NUM_PERM])
+                deduper.add((rel, len(kept)), sig)
+                kept.append((chunk["title"], chunk["source"], chunk["text"], sig))
+            per_file[rel] = kept
+
+    # 2) new/changed files: extract, chunk, drop near-duplicates
+    duplicates = {}
+    for rel in changed:
+        path, _ = inputs[rel]
+        if rel == CURATED_FILE:
+            with open(path, encoding="utf-8") as f:
+                raw = [(p.get("title", ""), p.get("source"), p.get("text", "")) for p in json.load(f).get("passages", [])]
+        else:
+            raw = extract_chunks(path, rel, chunk_words, overlap)
+        kept, dropped = [], 0
+        for title, source, text in raw:
+            sig = deduper.hasher.signature(_shingles(text))
+            if deduper.is_duplicate(sig):
+                dropped += 1
+                continue
+            deduper.add((rel, len(kept)), sig)
+            kept.append((title, source, text, sig))
+        per_file[rel] = kept
+        duplicates[rel] = dropped
+
+    # 3) write the new index next to the old one, then swap directories
+    tmp_dir = f"{index_dir.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    files_manifest, meta, sigs = {}, [], array("I")
+    text_offsets = array("Q", [0])
+    docs_tokens = []
+    with open(os.path.join(tmp_dir, "chunk_text.bin"), "wb") as text_out:
+        for rel in sorted(per_file):
+            start = len(meta)
+            for title, source, text, sig in per_file[rel]:
+                encoded = text.encode("utf-8")
+                text_out.write(encoded)
+                text_offsets.append(text_offsets[-1] + len(encoded))
+                meta.append([title, source, rel])
+                sigs.extend(sig)
+                docs_tokens.append(passage_tokens({"title": title, "text": text}))
+            entry = prev_files.get(rel, {}) if rel in unchanged else {}
+            files_manifest[rel] = {
+                "sha256": inputs[rel][1],
+                "chunks": [start, len(meta)],
+                "duplicates_dropped": duplicates.get(rel, entry.get("duplicates_dropped", 0)),
+            }
+
+    vocab, term_offsets, postings_doc, postings_tf, doc_len = build_postings(docs_tokens)
+    _write_array(os.path.join(tmp_dir, "chunk_offsets.u64"), "Q", text_offsets)
+    _write_array(os.path.join(tmp_dir, "term_offsets.u32"), "I", term_offsets)
+    _write_array(os.path.join(tmp_dir, "postings_doc.u32"), "I", postings_doc)
+    _write_array(os.path.join(tmp_dir, "postings_tf.u16"), "H", postings_tf)
+    _write_array(os.path.join(tmp_dir, "doc_len.u32"), "I", doc_len)
+    _write_array(os.path.join(tmp_dir, "minhash.u32"), "I", sigs)
+    with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(sorted(vocab, key=vocab.get), f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    stats = {
+        "files": len(inputs),
+        "files_changed": len(changed),
+        "files_unchanged": len(unchanged),
+        "files_removed": len(removed),
+        "chunks": len(meta),
+        "duplicates_dropped": sum(duplicates.values()),
+        "terms": len(vocab),
+        "postings": len(postings_doc),
+        "elapsed_secs": round(time.monotonic() - started, 2),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "byteorder": sys.byteorder,
+            "options": options,
+            "stats": stats,
+            "files": files_manifest,
+        }, f, ensure_ascii=False, indent=1)
+
+    old_dir = f"{index_dir.rstrip(os.sep)}.old-{os.getpid()}"
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    log(f"📦 Local index written to {index_dir}")
+    for key, value in stats.items():
+        log(f"   {key}: {value}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the GlucoMate local knowledge index from crawled documents")
+    parser.add_argument("source_dir", help="directory of crawled .html/.md/.txt files")
+    parser.add_argument("--out", default=LOCAL_INDEX_DIR, help="index directory (default: %(default)s)")
+    parser.add_argument("--full", action="store_true", help="ignore the previous build and re-process every file")
+    parser.add_argument("--no-curated", action="store_true", help="leave out data/diabetes_passages.json")
+    parser.add_argument("--chunk-words", type=int, default=180)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--dedup-threshold", type=float, default=0.85)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source_dir):
+        parser.error(f"not a directory: {args.source_dir}")
+    build_index(
+        args.source_dir,
+        index_dir=args.out,
+        full=args.full,
+        include_curated=not args.no_curated,
+        chunk_words=args.chunk_words,
+        overlap=args.overlap,
+        dedup_threshold=args.dedup_threshold,
+    )
+
+
+if __name__ == "__main__":
+    main()
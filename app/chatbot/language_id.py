@@ -0,0 +1,207 @@
+# app/chatbot/language_id.py
+"""
+In-process language identification for user input (no network)
+
+    python -m app.chatbot.language_id [--out PATH] [--top N]
+
+- Character 1-3 gram profiles per supported language, shipped as
+  data/language_profiles.json (GLUCOMATE_LANGUAGE_PROFILES_PATH)
+- Naive Bayes over the n-grams of the text: each profile stores log
+  probabilities of its most frequent n-grams plus one floor for the rest
+- Arabic script short-circuits to 'ar'
+- The profiles are built from text already in the repo: the translation
+  catalog (every language) and the curated diabetes passages (English)
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+DEFAULT_PROFILES_PATH = os.path.join(os.path.dirname(__file__), "data", "language_profiles.json")
+LANGUAGE_PROFILES_PATH = os.getenv("GLUCOMATE_LANGUAGE_PROFILES_PATH", DEFAULT_PROFILES_PATH)
+
+NGRAM_SIZES = (1, 2, 3)
+# below this many letters there is too little text to call
+MIN_LETTERS = 8
+
+_NON_LETTERS = re.compile(r"[^\w]+|[\d_]+")
+ARABIC_LETTER = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]")
+
+
+def char_ngrams(text):
+    """Lower-cased letter n-grams, words padded with spaces ("_di", "dia", ...)"""
+    grams = []
+    for word in _NON_LETTERS.sub(" ", text.lower()).split():
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1) if padded[i:i + n] != " ")
+    return grams
+
+
+def build_profiles(corpus, top=1000):
+    """
+    corpus: {language code: [text, ...]}
+
+    Returns:
+        dict: {language code: {'logprob': {ngram: float}, 'floor': float}}
+    """
+    profiles = {}
+    for lang, texts in corpus.items():
+        counts = Counter()
+        for text in texts:
+            counts.update(char_ngrams(text))
+        total = sum(counts.values())
+        vocab = len(counts) + 1
+        # add-one smoothing over the kept n-grams; everything else shares the floor
+        profiles[lang] = {
+            "logprob": {g: round(math.log((c + 1) / (total + vocab)), 4) for g, c in counts.most_common(top)},
+            "floor": round(math.log(1 / (total + vocab)), 4),
+        }
+    # one shared floor: a smaller training text must not make unseen n-grams cheaper
+    floor = min((profile["floor"] for profile in profiles.values()), default=0.0)
+    for profile in profiles.values():
+        profile["floor"] = floor
+    return profiles
+
+
+class LanguageIdentifier:
+    def __init__(self, profiles, version=0):
+        self.profiles = profiles
+        self.version = version
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("profiles", {}), data.get("version", 0))
+
+    def identify(self, text):
+        """
+        Most likely language of text
+
+        Returns:
+            tuple: (language code or None, confidence 0..1); None when the
+                   text is too short to call
+        """
+        letters = [ch for ch in (text or "") if ch.isalpha()]
+        if len(letters) < MIN_LETTERS:
+            return None, 0.0
+        arabic = sum(1 for ch in letters if ARABIC_LETTER.match(ch))
+        if arabic / len(letters) >= 0.5:
+            return "ar", round(arabic / len(letters), 3)
+
+        grams = char_ngrams(text)
+        if not grams or not self.profiles:
+            return None, 0.0
+        ranked = self._ranked(grams)
+        best, best_score = ranked[0]
+        if len(ranked) == 1:
+            return best, 1.0
+        # posterior of the best language against the runner-up
+        margin = min(best_score - ranked[1][1], 50.0)
+        return best, round(1.0 / (1.0 + math.exp(-margin)), 3)
+
+    def margin_over(self, text, language):
+        """
+        Mean log-likelihood per n-gram by which the best language beats
+        `language` (the runner-up if `language` has no profile). Unlike the
+        confidence of identify() it doesn't grow with the length of the text.
+        0.0 if `language` is the best or there is nothing to compare.
+        """
+        grams = char_ngrams(text or "")
+        if not grams or len(self.profiles) < 2:
+            return 0.0
+        ranked = self._ranked(grams)
+        scores = dict(ranked)
+        other = scores.get(language, ranked[1][1])
+        return round(max(0.0, ranked[0][1] - other) / len(grams), 3)
+
+    def _ranked(self, grams):
+        """[(language, log-likelihood of grams)], best first"""
+        scores = {}
+        for lang, profile in self.profiles.items():
+            logprob = profile["logprob"]
+            floor = profile["floor"]
+            scores[lang] = sum(logprob.get(g, floor) for g in grams)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+_IDENTIFIER = None
+_IDENTIFIER_LOCK = threading.Lock()
+
+
+def get_language_identifier():
+    """The process-wide identifier (profiles loaded on first call; empty if missing)"""
+    global _IDENTIFIER
+    if _IDENTIFIER is not None:
+        return _IDENTIFIER
+    with _IDENTIFIER_LOCK:
+        if _IDENTIFIER is None:
+            identifier = LanguageIdentifier({})
+            try:
+                identifier = LanguageIdentifier.load(LANGUAGE_PROFILES_PATH)
+            except Exception as e:
+                print(f"⚠️ Language profiles unavailable: {e}")
+            _IDENTIFIER = identifier
+    return _IDENTIFIER
+
+
+def identify_language(text):
+    """(language code or None, confidence) for a piece of user input"""
+    return get_language_identifier().identify(text)
+
+
+def language_margin(text, language):
+    """Per n-gram score margin of the best language over `language` (see margin_over)"""
+    return get_language_identifier().margin_over(text, language)
+
+
+# ---------------------------- Build ----------------------------
+def training_corpus():
+    """{language code: [text]} from the translation catalog and the curated passages"""
+    from app.chatbot.local_knowledge import DEFAULT_PASSAGES_PATH
+    from app.chatbot.translation_catalog import DEFAULT_CATALOG_PATH
+
+    corpus = {"en": []}
+    with open(DEFAULT_CATALOG_PATH, encoding="utf-8") as f:
+        catalog = json.load(f)
+    for english, translations in catalog.get("strings", {}).items():
+        corpus["en"].append(english)
+        for lang, text in translations.items():
+            corpus.setdefault(lang, []).append(text)
+    with open(DEFAULT_PASSAGES_PATH, encoding="utf-8") as f:
+        passages = json.load(f).get("passages", [])
+    corpus["en"].extend(p.get("title", "") + ". " + p.get("text", "") for p in passages)
+    # Arabic is recognised by script; no n-gram profile needed
+    corpus.pop("ar", None)
+    return corpus
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the GlucoMate language identification profiles")
+    parser.add_argument("--out", default=LANGUAGE_PROFILES_PATH, help="profiles file (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=1000, help="n-grams kept per language (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    version = 0
+    if os.path.exists(args.out):
+        with open(args.out, encoding="utf-8") as f:
+            version = json.load(f).get("version", 0)
+    profiles = build_profiles(training_corpus(), top=args.top)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version + 1,
+            "ngram_sizes": list(NGRAM_SIZES),
+            "top": args.top,
+            "profiles": profiles,
+        }, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        f.write("\n")
+    print(f"🔤 Language profiles v{version + 1}: {', '.join(sorted(profiles))} ({args.top} n-grams each) → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# app/chatbot/local_knowledge.py
+"""
+Local BM25 answer engine over curated diabetes passages (no network)
+- Passages live in app/chatbot/data/diabetes_passages.json, or in an index
+  built from crawled documents by app.chatbot.ingest_knowledge
+- Inverted index in flat typed arrays: per-term offsets into one postings
+  array of doc ids and one of term frequencies (a few bytes per posting)
+- Built lazily on first use, then shared by every bot in the process
+- Used as the degraded-mode responder and as a pre-check before network calls
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from array import array
+
+from app.chatbot.question_cache import normalize_question
+
+DEFAULT_PASSAGES_PATH = os.path.join(os.path.dirname(__file__), "data", "diabetes_passages.json")
+LOCAL_KB_PATH = os.getenv("GLUCOMATE_LOCAL_KB_PATH", DEFAULT_PASSAGES_PATH)
+# Directory written by `python -m app.chatbot.ingest_knowledge`; preferred when it holds an index
+LOCAL_INDEX_DIR = os.getenv("GLUCOMATE_LOCAL_INDEX_DIR", os.path.join(os.path.dirname(__file__), "data", "local_index"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# A passage whose title the query covers is what the question is about
+TITLE_WEIGHT = 1.0
+
+_IRREGULAR = {"feet": "foot", "teeth": "tooth", "children": "child", "women": "woman", "men": "man"}
+
+
+def _stem(word):
+    """Crude suffix folding (treating/treat, stored/store, levels/level)"""
+    word = _IRREGULAR.get(word, word)
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """normalize_question tokens, stemmed"""
+    return [_stem(word) for word in normalize_question(text)]
+
+
+def build_postings(docs_tokens):
+    """
+    Inverted index over tokenized documents
+
+    Returns:
+        tuple: (vocab {term: id}, offsets, postings_doc, postings_tf, doc_len)
+               where term id t's postings are [offsets[t], offsets[t + 1])
+    """
+    vocab = {}
+    per_term = []  # term id -> [(doc, tf)]
+    doc_len = array("I")
+    for doc_id, tokens in enumerate(docs_tokens):
+        doc_len.append(len(tokens))
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            term_id = vocab.setdefault(token, len(vocab))
+            if term_id == len(per_term):
+                per_term.append([])
+            per_term[term_id].append((doc_id, tf))
+
+    offsets = array("I", [0])
+    postings_doc = array("I")
+    postings_tf = array("H")
+    for postings in per_term:
+        for doc_id, tf in postings:
+            postings_doc.append(doc_id)
+            postings_tf.append(min(tf, 0xFFFF))
+        offsets.append(len(postings_doc))
+    return vocab, offsets, postings_doc, postings_tf, doc_len
+
+
+def passage_tokens(passage):
+    return tokenize(passage.get("title", "")) + tokenize(passage.get("text", ""))
+
+
+class LocalKnowledgeIndex:
+    def __init__(self, passages, vocab, offsets, postings_doc, postings_tf, doc_len):
+        """
+        passages: sequence of {'title', 'text', 'source'} indexed by doc id;
+        the arrays may be array.array or memoryviews over mmapped files
+        """
+        self.passages = passages
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings_doc = postings_doc
+        self.postings_tf = postings_tf
+        self.doc_len = doc_len
+        self.num_docs = len(doc_len)
+        self.avg_doc_len = (sum(doc_len) / self.num_docs) if self.num_docs else 0.0
+        self.title_terms = []  # doc id -> frozenset of title term ids
+        by_title = {}  # crawled chunks of one page share a title
+        for title in self._titles():
+            if title not in by_title:
+                by_title[title] = frozenset(vocab[t] for t in tokenize(title) if t in vocab)
+            self.title_terms.append(by_title[title])
+
+    def _titles(self):
+        titles = getattr(self.passages, "titles", None)
+        if titles is not None:
+            return titles
+        return (self.passages[doc_id].get("title", "") for doc_id in range(self.num_docs))
+
+    @classmethod
+    def build(cls, passages):
+        """In-memory index over [{'id', 'title', 'text', 'source'}]"""
+        return cls(passages, *build_postings(passage_tokens(p) for p in passages))
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls.build(data.get("passages", []))
+
+    @classmethod
+    def from_index_dir(cls, path):
+        """Index written by app.chatbot.ingest_knowledge (arrays are mmapped, not read)"""
+        from app.chatbot.ingest_knowledge import load_index_dir
+        return cls(*load_index_dir(path))
+
+    def _idf(self, term_id):
+        df = self.offsets[term_id + 1] - self.offsets[term_id]
+        return math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=3):
+        """
+        Top-k passages for a query
+
+        Returns:
+            list: [{'passage': dict, 'score': float, 'confidence': float}] where
+                  confidence (0..1) blends the BM25 score relative to the best
+                  score the query could reach with how much of the passage
+                  title the query covers, scaled by the share of query terms
+                  the passage matched
+        """
+        query_tokens = tokenize(query)
+        term_ids = {self.vocab[t] for t in query_tokens if t in self.vocab}
+        if not term_ids or not self.num_docs:
+            return []
+
+        scores = {}
+        matched = {}
+        best_possible = 0.0
+        for term_id in term_ids:
+            idf = self._idf(term_id)
+            best_possible += idf * (BM25_K1 + 1.0)
+            for i in range(self.offsets[term_id], self.offsets[term_id + 1]):
+                doc_id = self.postings_doc[i]
+                tf = self.postings_tf[i]
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[doc_id] / self.avg_doc_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+                matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        query_terms = len(set(query_tokens))
+        results = []
+        for doc_id, bm25 in scores.items():
+            title = self.title_terms[doc_id]
+            title_overlap = len(title & term_ids) / len(title) if title else 0.0
+            coverage = matched[doc_id] / query_terms
+            results.append({
+                "passage": self.passages[doc_id],
+                "score": round(bm25 * (1.0 + TITLE_WEIGHT * title_overlap), 4),
+                "confidence": round(coverage * (min(1.0, bm25 / best_possible) + title_overlap) / 2.0, 4),
+            })
+        results.sort(key=lambda hit: hit["score"], reverse=True)
+        return results[:k]
+
+    def stats(self):
+        return {
+            "passages": self.num_docs,
+            "terms": len(self.vocab),
+            "postings": len(self.postings_doc),
+            "source": "index_dir" if isinstance(self.doc_len, memoryview) else "json",
+            "index_bytes": (
+                self.offsets.itemsize * len(self.offsets)
+                + self.postings_doc.itemsize * len(self.postings_doc)
+                + self.postings_tf.itemsize * len(self.postings_tf)
+                + self.doc_len.itemsize * len(self.doc_len)
+            ),
+        }
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+_INDEX_FAILED = False
+
+
+def get_local_knowledge():
+    """The process-wide index (built on first call); None if the passages can't be loaded"""
+    global _INDEX, _INDEX_FAILED
+    if _INDEX is not None or _INDEX_FAILED:
+        return _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None and not _INDEX_FAILED:
+            started = time.monotonic()
+            if LOCAL_INDEX_DIR and os.path.exists(os.path.join(LOCAL_INDEX_DIR, "manifest.json")):
+                try:
+                    _INDEX = LocalKnowledgeIndex.from_index_dir(LOCAL_INDEX_DIR)
+                except Exception as e:
+                    print(f"⚠️ Local index in {LOCAL_INDEX_DIR} unusable, using curated passages: {e}")
+            try:
+                if _INDEX is None:
+                    _INDEX = LocalKnowledgeIndex.from_json(LOCAL_KB_PATH)
+                print(f"📖 Local knowledge index: {_INDEX.num_docs} passages in {(time.monotonic() - started) * 1000:.1f} ms")
+            except Exception as e:
+                _INDEX_FAILED = True
+                print(f"⚠️ Local knowledge index unavailable: {e}")
+    return _INDEX
+
+
+def answer_locally(question, min_confidence=0.0):
+    """
+    Best local passage for a question, or None
+
+    Returns:
+        dict: {'title', 'text', 'source', 'confidence'} for the top passage
+              if its confidence is at least min_confidence
+    """
+    index = get_local_knowledge()
+    if index is None:
+        return None
+    hits = index.search(question, k=1)
+    if not hits or hits[0]["confidence"] < min_confidence:
+        return None
+    passage = hits[0]["passage"]
+    return {
+        "title": passage.get("title", ""),
+        "text": passage.get("text", ""),
+        "source": passage.get("source"),
+        "confidence": hits[0]["confidence"],
+    }
+
+
+def format_local_answer(answer):
+    """Markdown reply for an answer_locally() result"""
+    reply = f"**{answer['title']}**\n{answer['text']}"
+    if answer.get("source"):
+        reply += f"\n\n📚 **Source**: {answer['source']}"
+    return reply
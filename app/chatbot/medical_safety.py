@@ -3,55 +3,380 @@ Medical Safety Guardrails for GlucoMate
 Handles emergency detection, warning signs, and medical disclaimers
 """
 
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+from time import perf_counter
+
+from app.utils.keyword_matcher import KeywordAutomaton
+
+# Fixed safety messages (pre-translated in data/translation_catalog.json)
+EMERGENCY_MESSAGE = '🚨 **MEDICAL EMERGENCY**: What you\'re describing sounds like a serious medical emergency. Please call 911 (or your local emergency number) immediately or go to the nearest emergency room right now. Do not delay - your safety is the top priority.'
+HIGH_URGENCY_MESSAGE = '⚠️ **Important**: What you\'re describing needs prompt medical attention. Please contact your healthcare provider or diabetes care team as soon as possible today. If it\'s after hours, consider calling their emergency line or visiting an urgent care center.'
+MODERATE_URGENCY_MESSAGE = '💛 **Keep an eye on this**: What you\'re describing is worth monitoring. Consider discussing this with your healthcare provider at your next appointment, or sooner if it gets worse or doesn\'t improve.'
+MEDICATION_CONCERN_MESSAGE = '💊 **Medication Concern Detected**: Please contact your healthcare provider or pharmacist immediately about medication-related issues. For overdose or severe reactions, seek emergency care.'
+
+# Critical emergency keywords requiring immediate medical attention
+EMERGENCY_KEYWORDS = [
+    'severe hypoglycemia', 'blood sugar below 50', 'blood sugar under 50',
+    'unconscious', 'passed out', 'unresponsive', 'not responding',
+    'diabetic ketoacidosis', 'dka', 'blood sugar over 400', 'blood sugar above 400',
+    'vomiting repeatedly', 'can\'t stop vomiting', 'throwing up repeatedly',
+    'difficulty breathing', 'trouble breathing', 'can\'t breathe',
+    'chest pain', 'heart pain', 'severe chest pain',
+    'severe dehydration', 'extremely dehydrated',
+    'can\'t keep fluids down', 'cannot keep water down',
+    'ketones high', 'high ketones', 'ketones in blood',
+    'fruity breath', 'acetone breath',
+    'severe abdominal pain', 'severe stomach pain',
+    'rapid heart rate', 'heart racing dangerously',
+    'confusion severe', 'extremely confused', 'altered consciousness',
+    'seizure', 'convulsions', 'fitting'
+]
+
+# Warning keywords requiring prompt medical consultation
+WARNING_KEYWORDS = [
+    'blood sugar over 300', 'blood sugar above 300', 'glucose over 300',
+    'blood sugar over 250', 'blood sugar above 250',
+    'ketones in urine', 'ketones positive', 'ketones detected',
+    'blurred vision', 'vision problems', 'can\'t see clearly',
+    'frequent urination', 'urinating constantly', 'peeing all the time',
+    'extreme thirst', 'extremely thirsty', 'can\'t quench thirst',
+    'unexplained weight loss', 'losing weight rapidly', 'weight dropping',
+    'persistent nausea', 'feeling sick constantly', 'nauseous all day',
+    'fatigue extreme', 'extremely tired', 'exhausted constantly',
+    'wounds not healing', 'cuts not healing', 'slow healing',
+    'numbness in feet', 'tingling in hands', 'nerve pain',
+    'swollen feet', 'swelling in legs', 'edema',
+    'blood sugar won\'t come down', 'glucose stuck high',
+    'medication not working', 'insulin not effective'
+]
+
+# Moderate concern keywords requiring monitoring
+MODERATE_CONCERN_KEYWORDS = [
+    'blood sugar over 200', 'glucose above 200',
+    'blood sugar below 70', 'glucose under 70',
+    'feeling shaky', 'trembling', 'jittery',
+    'sweating heavily', 'cold sweats',
+    'headache persistent', 'headaches daily',
+    'mood changes', 'irritable often', 'mood swings',
+    'sleep problems', 'can\'t sleep', 'insomnia',
+    'appetite changes', 'not hungry', 'eating too much'
+]
+
+# Emergency keywords in the other supported languages, matched on the raw
+# input before it is translated (accents and Arabic diacritics are optional)
+NATIVE_EMERGENCY_KEYWORDS = {
+    'ar': [
+        'فقدت الوعي', 'فقد الوعي', 'فقدت وعيها', 'فاقد الوعي', 'غائب عن الوعي', 'أغمي علي', 'أغمي عليه',
+        'إغماء', 'لا يستجيب', 'لا تستجيب', 'تشنجات', 'تشنج', 'نوبة صرع',
+        'لا أستطيع التنفس', 'لا أقدر أتنفس', 'صعوبة في التنفس', 'ضيق في التنفس',
+        'ألم في الصدر', 'ألم بالصدر', 'الحماض الكيتوني', 'حماض كيتوني',
+        'قيء مستمر', 'تقيؤ مستمر', 'لا أتوقف عن التقيؤ', 'هبوط حاد في السكر', 'انخفاض شديد في السكر',
+        'ارتباك شديد'
+    ],
+    'fr': [
+        'inconscient', 'inconsciente', 'perdu connaissance', 'évanoui', 'évanouie', 'ne répond pas',
+        'convulsions', 'convulse', 'crise convulsive', 'crise d\'épilepsie',
+        'je ne peux pas respirer', 'je n\'arrive pas à respirer', 'difficulté à respirer', 'du mal à respirer',
+        'douleur thoracique', 'douleur à la poitrine', 'douleur dans la poitrine',
+        'acidocétose', 'vomissements répétés', 'je n\'arrête pas de vomir', 'vomit sans arrêt',
+        'hypoglycémie sévère', 'hypoglycémie grave', 'haleine fruitée', 'cétones élevées',
+        'déshydratation sévère', 'confusion sévère'
+    ],
+    'es': [
+        'inconsciente', 'perdí el conocimiento', 'perdió el conocimiento', 'me desmayé', 'se desmayó',
+        'no responde', 'convulsiones', 'convulsión', 'convulsionando',
+        'no puedo respirar', 'dificultad para respirar', 'me falta el aire',
+        'dolor en el pecho', 'dolor de pecho', 'cetoacidosis',
+        'vómitos constantes', 'no paro de vomitar', 'no puedo dejar de vomitar',
+        'hipoglucemia severa', 'hipoglucemia grave', 'aliento afrutado', 'cetonas altas',
+        'deshidratación severa', 'confusión severa'
+    ],
+    'pt': [
+        'inconsciente', 'desmaiei', 'desmaiou', 'perdi a consciência', 'perdeu a consciência',
+        'não responde', 'convulsões', 'convulsão', 'convulsionando',
+        'não consigo respirar', 'dificuldade para respirar', 'falta de ar',
+        'dor no peito', 'cetoacidose', 'vômitos repetidos', 'não paro de vomitar',
+        'hipoglicemia grave', 'hipoglicemia severa', 'hálito frutado', 'cetonas altas',
+        'desidratação severa', 'confusão severa'
+    ],
+    'de': [
+        'bewusstlos', 'ohnmächtig', 'in ohnmacht gefallen', 'reagiert nicht', 'nicht ansprechbar',
+        'krampfanfall', 'krampfanfälle', 'epileptischer anfall',
+        'kann nicht atmen', 'bekomme keine luft', 'atemnot',
+        'brustschmerzen', 'schmerzen in der brust', 'ketoazidose',
+        'ständiges erbrechen', 'muss ständig erbrechen', 'höre nicht auf zu erbrechen',
+        'schwere unterzuckerung', 'schwere hypoglykämie', 'fruchtiger atem', 'azetonatem',
+        'starke dehydrierung', 'starke verwirrung'
+    ],
+}
+
+MEDICATION_CONCERNS = [
+    'double dose', 'took twice', 'overdose', 'too much insulin',
+    'missed insulin', 'forgot medication', 'ran out of',
+    'expired medication', 'old insulin', 'medication reaction',
+    'allergic reaction', 'rash from', 'side effects'
+]
+
+# Conversation routing (GlucoMateCore.classify_conversation_type)
+CONVERSATION_EMERGENCY_KEYWORDS = [
+    'emergency', 'urgent', 'help', '911', 'hospital', 'dying', 'emergency room',
+    'ambulance', 'call doctor', 'severe', 'can\'t breathe', 'chest pain',
+    'unconscious', 'passed out', 'blood sugar 400', 'dka', 'ketoacidosis'
+]
+
+CASUAL_KEYWORDS = [
+    'hi', 'hello', 'hey', 'how are you', 'what\'s up', 'thanks', 'thank you',
+    'good morning', 'good afternoon', 'good evening', 'bye', 'goodbye',
+    'comment ça va', 'ça va', 'كيف حالك', '¿cómo estás', 'hola', 'bonjour',
+    'guten tag', 'bom dia', 'marhaba'
+]
+
+# (category, severity, keywords): every list is compiled into one automaton at import
+KEYWORD_LISTS = [
+    ('emergency', 'EMERGENCY', EMERGENCY_KEYWORDS),
+    *(('emergency', 'EMERGENCY', keywords) for keywords in NATIVE_EMERGENCY_KEYWORDS.values()),
+    ('warning', 'HIGH', WARNING_KEYWORDS),
+    ('moderate', 'MODERATE', MODERATE_CONCERN_KEYWORDS),
+    ('medication', 'HIGH', MEDICATION_CONCERNS),
+    ('conversation_emergency', 'EMERGENCY', CONVERSATION_EMERGENCY_KEYWORDS),
+    ('casual', None, CASUAL_KEYWORDS),
+]
+
+# Keywords match whole words, so the safety lists also accept inflected
+# forms of their last word: 'chest pains', 'seizures', 'unconsciousness';
+# the last word of a multi-word safety phrase also matches as a prefix, as
+# the substring search did: 'ketones in bloodstream', 'chest painful'
+INFLECTION_SUFFIXES = ("s", "es", "ness")
+INFLECTED_CATEGORIES = {'emergency', 'warning', 'moderate', 'medication', 'conversation_emergency'}
+
+KEYWORD_MATCHER = KeywordAutomaton(
+    (keyword, category, severity, *((INFLECTION_SUFFIXES, True) if category in INFLECTED_CATEGORIES else ()))
+    for category, severity, keywords in KEYWORD_LISTS for keyword in keywords
+).build()
+
+
+@lru_cache(maxsize=256)
+def scan_keywords(user_input):
+    """
+    One word-boundary-aware pass over the input for every keyword list
+
+    Memoized, so the safety check, the medication check and the conversation
+    classifier of one turn (and any fallback path re-checking it) share the pass.
+
+    Returns:
+        dict: {category: [keyword, ...]} (treat as read-only)
+    """
+    return KEYWORD_MATCHER.by_category(user_input or '')
+
+
+# ---------------------------- Numeric readings ----------------------------
+# "my sugar is 452", "BG 38 mg/dL", "ketones 3.2 mmol/L" carry no keyword, so
+# glucose and ketone values are extracted by one precompiled regex pass and
+# checked against these thresholds (first level that matches wins).
+def _threshold_from_env(name, default):
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# mg/dL: (below, at or above) per urgency level
+GLUCOSE_THRESHOLDS = {
+    'EMERGENCY': (_threshold_from_env("GLUCOMATE_GLUCOSE_EMERGENCY_BELOW", 50),
+                  _threshold_from_env("GLUCOMATE_GLUCOSE_EMERGENCY_ABOVE", 400)),
+    'HIGH': (_threshold_from_env("GLUCOMATE_GLUCOSE_HIGH_BELOW", 54),
+             _threshold_from_env("GLUCOMATE_GLUCOSE_HIGH_ABOVE", 250)),
+    'MODERATE': (_threshold_from_env("GLUCOMATE_GLUCOSE_MODERATE_BELOW", 70),
+                 _threshold_from_env("GLUCOMATE_GLUCOSE_MODERATE_ABOVE", 200)),
+}
+
+# blood ketones, mmol/L: at or above per urgency level
+KETONE_THRESHOLDS = {
+    'EMERGENCY': _threshold_from_env("GLUCOMATE_KETONES_EMERGENCY", 3.0),
+    'HIGH': _threshold_from_env("GLUCOMATE_KETONES_HIGH", 1.5),
+    'MODERATE': _threshold_from_env("GLUCOMATE_KETONES_MODERATE", 0.6),
+}
+
+MG_DL_PER_MMOL_L = 18.0
+# a glucose value given without a unit is mmol/L up to this, mg/dL above it;
+# such a small unitless value only counts right after a reading cue ("is 4")
+# or when it has decimals ("glucose 3.5")
+MAX_UNITLESS_MMOL_L = 35
+
+_GLUCOSE_TERMS = (
+    r"blood\s+(?:sugar|glucose)|sugars?|glucose|bgl?|bs|cgm|meter"
+    r"|az[uú]car|glucosa|glucemia|glyc[ée]mie|sucre|a[çc][uú]car|glicose|glicemia|blutzucker|zucker"
+    r"|السكر|سكر|الجلوكوز|جلوكوز|الغلوكوز|غلوكوز"
+)
+_KETONE_TERMS = r"ketones?|cetonas|c[ée]tones|cetonemia|ketonk[öo]rper|الكيتونات|كيتونات|الكيتون|كيتون"
+# words allowed between the term and the number ("my sugar is at 452", "glycémie à 3,2")
+_LINKING_WORDS = (
+    r"is|was|are|were|'s|at|of|reading|readings|level|levels|reads|read|went|gone|up|down|to|dropped|rose"
+    r"|spiked|jumped|fell|hit|around|about|almost|nearly|over|above|under|below|only|still|now|currently"
+    r"|just|right|it|my|as|high|low|test|tested|showed|shows|says|said"
+    r"|est|était|etait|à|a|de|du|ma|mon|monté|monte|descendu|tombée|tombee"
+    r"|está|esta|es|en|mi|subió|subio|bajó|bajo|tengo"
+    r"|é|e|em|minha|meu|subiu|caiu"
+    r"|ist|liegt|bei|war|auf|von|mein|meine|gestiegen|gefallen"
+    r"|هو|هي|عند|على|كان|كانت|وصل|وصلت|إلى|الى|عندي"
+)
+# times of day between the term and the reading are skipped ("sugar at 2 am was 45")
+_TIME = r"(?<![\d.,])\d{1,2}(?::\d{2}\s*(?:[ap]\.?m\b\.?)?|\s*(?:[ap]\.?m\b\.?|o'?clock\b))"
+_GAP = rf"(?:[\s:=~\-]*(?:\b(?:{_LINKING_WORDS})\b|{_TIME})){{0,6}}[\s:=~\-]*"
+_NUMBER = r"\d+(?:[.,]\d+)?"
+# not the start of a longer number, a time ("2:30") or a date ("12/05")
+_NUMBER_END = r"(?![\d:/])"
+_UNIT = r"mg\s*/\s*dl|mmol\s*/\s*l|mmol"
+# numbers that are quantities, counts, times or durations, not readings
+# ("2 cubes", "1 of the worst foods", "30 grams", "2 pm")
+_NOT_A_READING = (
+    r"(?!\s*(?:[ap]\.?m\b|o'?clock|h\b|hours?|hrs?|min\b|minutes?|days?|weeks?|months?|years?|times?|x\b"
+    r"|g\b|grams?|kg|lbs?|pounds?|%|units?|u\b|ml\b|cups?|spoons?|spoonfuls?|teaspoons?|tablespoons?|tsp|tbsp"
+    r"|pieces?|slices?|cubes?|lumps?|packets?|sachets?|servings?|portions?|glass(?:es)?|cans?|bottles?|bars?"
+    r"|cookies?|candies|candy|sweets|drinks?|sodas?|tablets?|pills?|doses?|shots?|carbs?|calories|kcal"
+    r"|of\b|out\s+of|more\b|less\b|extra\b|ways?|things?|tips?|foods?|types?|kinds?))"
+)
+# words right before a small unitless number that make it a reading
+_READING_CUES = (
+    r"is|was|are|were|'s|at|of|reading|readings|reads|read|level|levels|to|hit|around|about|over|above|under|below"
+    r"|showed|shows|says|said|now|currently|only|still|just|almost|nearly"
+    r"|est|était|etait|à|a|de|está|esta|es|en|é|em|ist|liegt|bei|war|auf|von"
+    r"|هو|هي|عند|على|كان|كانت|وصل|وصلت|إلى|الى"
+)
+_CUE_BEFORE_NUMBER = re.compile(rf"(?:\b(?:{_READING_CUES})|[:=~])\s*$", re.IGNORECASE)
+
+# A reading the user places in the past ("was 400 in 2019", "500 yesterday")
+# is reported but not escalated. "was" alone is how a fresh reading is told
+# ("my sugar was 45"), so it takes a time reference in the same clause.
+_PAST_MARKERS = re.compile(
+    r"\b(?:yesterday|last\s+(?:night|week|month|year|time)|(?:\d+|a|an)\s+(?:days?|weeks?|months?|years?)\s+ago"
+    r"|used\s+to|in\s+the\s+past|previously|(?:19|20)\d{2}"
+    r"|hier|la\s+semaine\s+derni[èe]re|l'ann[ée]e\s+derni[èe]re"
+    r"|ayer|la\s+semana\s+pasada|el\s+a[ñn]o\s+pasado|ontem|semana\s+passada|ano\s+passado"
+    r"|gestern|letzte\s+woche|letztes\s+jahr)\b|أمس|الأمس|الأسبوع\s+الماضي|العام\s+الماضي",
+    re.IGNORECASE,
+)
+# clauses end at sentence punctuation (not a decimal point) and at a contrast
+# or a switch to the present ("500 yesterday but now 110")
+_CLAUSE_BREAK = re.compile(
+    r"[;!?\n]|\.(?!\d)|,(?!\d)|\b(?:but|now|today|currently|mais|maintenant|aujourd'hui|pero|ahora|hoy"
+    r"|mas|agora|hoje|aber|jetzt|heute)\b|لكن|الآن|اليوم",
+    re.IGNORECASE,
+)
+# the current value after a past one: "... but now 110"
+_NOW_READING = re.compile(
+    rf"\b(?:now|today|currently|maintenant|aujourd'hui|ahora|hoy|agora|hoje|jetzt|heute)\b"
+    rf"{_GAP}(?P<value>{_NUMBER}){_NUMBER_END}{_NOT_A_READING}\s*(?P<unit>{_UNIT})?",
+    re.IGNORECASE,
+)
+
+READING_PATTERN = re.compile(
+    rf"\b(?:{_KETONE_TERMS}){_GAP}(?P<ketones>{_NUMBER}){_NUMBER_END}{_NOT_A_READING}(?:\s*(?:{_UNIT}))?"
+    rf"|\b(?:{_GLUCOSE_TERMS})\b{_GAP}(?P<glucose>{_NUMBER}){_NUMBER_END}{_NOT_A_READING}\s*(?P<glucose_unit>{_UNIT})?"
+    rf"|(?<![\w.,])(?P<bare>{_NUMBER})\s*(?P<bare_unit>{_UNIT})\b",
+    re.IGNORECASE,
+)
+
+_DIGIT = re.compile(r"\d")
+
+Reading = namedtuple("Reading", ["kind", "value", "unit", "urgency_level"])
+
+
+def _glucose_urgency(mg_dl):
+    for level, (below, above) in GLUCOSE_THRESHOLDS.items():
+        if mg_dl < below or mg_dl >= above:
+            return level
+    return 'NORMAL'
+
+
+def _ketone_urgency(mmol_l):
+    for level, at_least in KETONE_THRESHOLDS.items():
+        if mmol_l >= at_least:
+            return level
+    return 'NORMAL'
+
+
+def _reading(kind, number, unit):
+    """Reading for a matched value (None if out of range)"""
+    value = float(number.replace(',', '.'))
+    if kind == 'ketones':
+        return Reading('ketones', value, 'mmol/L', _ketone_urgency(value)) if 0 < value <= 30 else None
+    unit = (unit or '').lower().replace(' ', '')
+    if unit.startswith('mmol') or (not unit and value <= MAX_UNITLESS_MMOL_L):
+        unit, mg_dl = 'mmol/L', value * MG_DL_PER_MMOL_L
+    else:
+        unit, mg_dl = 'mg/dL', value
+    return Reading('glucose', value, unit, _glucose_urgency(mg_dl)) if 10 <= mg_dl <= 1500 else None
+
+
+def _clause(text, start, end):
+    """(start, end) of the clause around text[start:end]"""
+    before = 0
+    for brk in _CLAUSE_BREAK.finditer(text, 0, start):
+        before = brk.end()
+    after = _CLAUSE_BREAK.search(text, end)
+    return before, after.start() if after else len(text)
+
+
+@lru_cache(maxsize=256)
+def scan_readings(user_input):
+    """
+    Glucose and ketone values in the input, one regex pass (memoized like scan_keywords)
+    
+    Returns:
+        tuple: (Reading(kind, value, unit, urgency_level), ...) with kind
+               'glucose' or 'ketones' and urgency_level from the threshold
+               tables ('NORMAL' for a reading the user places in the past)
+    """
+    if not _DIGIT.search(user_input or ''):
+        return ()
+    readings = []
+    for match in READING_PATTERN.finditer(user_input):
+        if match.group('ketones'):
+            kind, number, unit = 'ketones', match.group('ketones'), None
+        else:
+            kind = 'glucose'
+            number = match.group('glucose') or match.group('bare')
+            unit = match.group('glucose_unit') or match.group('bare_unit')
+            if (not unit and float(number.replace(',', '.')) <= MAX_UNITLESS_MMOL_L
+                    and not re.search(r"[.,]", number)
+                    and not _CUE_BEFORE_NUMBER.search(user_input, match.start(), match.start('glucose'))):
+                continue  # "I ate sugar 2 ...": a small whole number needs a unit or "is/was/at ..."
+        reading = _reading(kind, number, unit)
+        if reading is None:
+            continue
+        start, end = _clause(user_input, match.start(), match.end())
+        if reading.urgency_level != 'NORMAL' and _PAST_MARKERS.search(user_input, start, end):
+            readings.append(reading._replace(urgency_level='NORMAL'))
+            # "... but now 110": the value that follows is the current one
+            now = _NOW_READING.search(user_input, end)
+            if now:
+                current = _reading(kind, now.group('value'), now.group('unit'))
+                if current is not None:
+                    readings.append(current)
+            continue
+        readings.append(reading)
+    return tuple(readings)
+
+
+def reading_findings(user_input):
+    """{urgency level: ['glucose 452 mg/dL', ...]} for the non-normal readings in the input"""
+    findings = {}
+    for reading in scan_readings(user_input):
+        if reading.urgency_level != 'NORMAL':
+            findings.setdefault(reading.urgency_level, []).append(f"{reading.kind} {reading.value:g} {reading.unit}")
+    return findings
+
+
 class MedicalSafetyGuardrails:
     def __init__(self):
-        # Critical emergency keywords requiring immediate medical attention
-        self.emergency_keywords = [
-            'severe hypoglycemia', 'blood sugar below 50', 'blood sugar under 50',
-            'unconscious', 'passed out', 'unresponsive', 'not responding',
-            'diabetic ketoacidosis', 'dka', 'blood sugar over 400', 'blood sugar above 400',
-            'vomiting repeatedly', 'can\'t stop vomiting', 'throwing up repeatedly',
-            'difficulty breathing', 'trouble breathing', 'can\'t breathe',
-            'chest pain', 'heart pain', 'severe chest pain',
-            'severe dehydration', 'extremely dehydrated',
-            'can\'t keep fluids down', 'cannot keep water down',
-            'ketones high', 'high ketones', 'ketones in blood',
-            'fruity breath', 'acetone breath',
-            'severe abdominal pain', 'severe stomach pain',
-            'rapid heart rate', 'heart racing dangerously',
-            'confusion severe', 'extremely confused', 'altered consciousness',
-            'seizure', 'convulsions', 'fitting'
-        ]
-        
-        # Warning keywords requiring prompt medical consultation
-        self.warning_keywords = [
-            'blood sugar over 300', 'blood sugar above 300', 'glucose over 300',
-            'blood sugar over 250', 'blood sugar above 250',
-            'ketones in urine', 'ketones positive', 'ketones detected',
-            'blurred vision', 'vision problems', 'can\'t see clearly',
-            'frequent urination', 'urinating constantly', 'peeing all the time',
-            'extreme thirst', 'extremely thirsty', 'can\'t quench thirst',
-            'unexplained weight loss', 'losing weight rapidly', 'weight dropping',
-            'persistent nausea', 'feeling sick constantly', 'nauseous all day',
-            'fatigue extreme', 'extremely tired', 'exhausted constantly',
-            'wounds not healing', 'cuts not healing', 'slow healing',
-            'numbness in feet', 'tingling in hands', 'nerve pain',
-            'swollen feet', 'swelling in legs', 'edema',
-            'blood sugar won\'t come down', 'glucose stuck high',
-            'medication not working', 'insulin not effective'
-        ]
-        
-        # Moderate concern keywords requiring monitoring
-        self.moderate_concern_keywords = [
-            'blood sugar over 200', 'glucose above 200',
-            'blood sugar below 70', 'glucose under 70',
-            'feeling shaky', 'trembling', 'jittery',
-            'sweating heavily', 'cold sweats',
-            'headache persistent', 'headaches daily',
-            'mood changes', 'irritable often', 'mood swings',
-            'sleep problems', 'can\'t sleep', 'insomnia',
-            'appetite changes', 'not hungry', 'eating too much'
-        ]
+        self.emergency_keywords = EMERGENCY_KEYWORDS
+        self.native_emergency_keywords = NATIVE_EMERGENCY_KEYWORDS
+        self.warning_keywords = WARNING_KEYWORDS
+        self.moderate_concern_keywords = MODERATE_CONCERN_KEYWORDS
     
     def check_emergency_situation(self, user_input):
         """
@@ -65,47 +390,40 @@ class MedicalSafetyGuardrails:
                 'keywords_found': list
             }
         """
-        user_text = user_input.lower()
+        found = scan_keywords(user_input)
+        # Glucose/ketone values checked against the threshold tables
+        readings = reading_findings(user_input)
         
         # Check for emergency situations
-        emergency_found = []
-        for keyword in self.emergency_keywords:
-            if keyword in user_text:
-                emergency_found.append(keyword)
+        emergency_found = list(found.get('emergency', [])) + readings.get('EMERGENCY', [])
         
         if emergency_found:
             return {
                 'is_emergency': True,
                 'urgency_level': 'EMERGENCY',
-                'message': '🚨 **MEDICAL EMERGENCY**: What you\'re describing sounds like a serious medical emergency. Please call 911 (or your local emergency number) immediately or go to the nearest emergency room right now. Do not delay - your safety is the top priority.',
+                'message': EMERGENCY_MESSAGE,
                 'keywords_found': emergency_found
             }
         
         # Check for high-priority warnings
-        warning_found = []
-        for keyword in self.warning_keywords:
-            if keyword in user_text:
-                warning_found.append(keyword)
+        warning_found = list(found.get('warning', [])) + readings.get('HIGH', [])
         
         if warning_found:
             return {
                 'is_emergency': False,
                 'urgency_level': 'HIGH',
-                'message': '⚠️ **Important**: What you\'re describing needs prompt medical attention. Please contact your healthcare provider or diabetes care team as soon as possible today. If it\'s after hours, consider calling their emergency line or visiting an urgent care center.',
+                'message': HIGH_URGENCY_MESSAGE,
                 'keywords_found': warning_found
             }
         
         # Check for moderate concerns
-        moderate_found = []
-        for keyword in self.moderate_concern_keywords:
-            if keyword in user_text:
-                moderate_found.append(keyword)
+        moderate_found = list(found.get('moderate', [])) + readings.get('MODERATE', [])
         
         if moderate_found:
             return {
                 'is_emergency': False,
                 'urgency_level': 'MODERATE',
-                'message': '💛 **Keep an eye on this**: What you\'re describing is worth monitoring. Consider discussing this with your healthcare provider at your next appointment, or sooner if it gets worse or doesn\'t improve.',
+                'message': MODERATE_URGENCY_MESSAGE,
                 'keywords_found': moderate_found
             }
         
@@ -168,21 +486,13 @@ class MedicalSafetyGuardrails:
     
     def check_medication_interactions(self, user_input):
         """Check for potential medication-related concerns"""
-        medication_concerns = [
-            'double dose', 'took twice', 'overdose', 'too much insulin',
-            'missed insulin', 'forgot medication', 'ran out of',
-            'expired medication', 'old insulin', 'medication reaction',
-            'allergic reaction', 'rash from', 'side effects'
-        ]
-        
-        user_text = user_input.lower()
-        found_concerns = [concern for concern in medication_concerns if concern in user_text]
+        found_concerns = list(scan_keywords(user_input).get('medication', []))
         
         if found_concerns:
             return {
                 'has_medication_concern': True,
                 'concerns': found_concerns,
-                'message': '💊 **Medication Concern Detected**: Please contact your healthcare provider or pharmacist immediately about medication-related issues. For overdose or severe reactions, seek emergency care.'
+                'message': MEDICATION_CONCERN_MESSAGE
             }
         
         return {'has_medication_concern': False, 'concerns': [], 'message': ''}
@@ -198,7 +508,18 @@ if __name__ == "__main__":
         "Blood sugar over 300 and I have ketones in my urine",
         "I'm feeling a bit tired today",
         "What should I eat for breakfast?",
-        "I forgot to take my insulin this morning"
+        "I forgot to take my insulin this morning",
+        "My sugar is 452",
+        "BG 38 mg/dL",
+        "Ketones 1.8 mmol/L",
+        # numbers next to a glucose term that are not readings, and a time before the reading
+        "sugar is 1 of the worst foods",
+        "I ate sugar 2 cubes",
+        "sugar at 2 am was 45",
+        # inflected keywords (whole-word matching must still flag these)
+        "I have chest pains",
+        "he is having seizures",
+        "I'm unconsciousness"
     ]
     
     print("🧪 Medical Safety Testing:")
@@ -216,4 +537,89 @@ if __name__ == "__main__":
         if med_result['has_medication_concern']:
             print(f"Medication Concern: {med_result['message'][:50]}...")
     
+    # Regression vs. the substring search: every safety phrase, its inflected
+    # forms and a longer last word must still be flagged; words merely
+    # containing a keyword ('vodka' for 'dka') no longer are, on purpose
+    def substring_hit(keyword, text):
+        return keyword in text.lower()
+
+    def automaton_hit(keyword, category, text):
+        return keyword in scan_keywords(text).get(category, [])
+
+    probes = []
+    for category, _, keywords in KEYWORD_LISTS:
+        if category in INFLECTED_CATEGORIES:
+            for keyword in keywords:
+                probes += [(keyword, category, f"I have {keyword}"), (keyword, category, f"I have {keyword}s")]
+                if ' ' in keyword:
+                    probes.append((keyword, category, f"I have {keyword}stream"))
+    probes += [
+        ('ketones in blood', 'emergency', "there are ketones in bloodstream"),
+        ('chest pain', 'emergency', "my chest pains are back"),
+    ]
+    regressions = [text for keyword, category, text in probes
+                   if substring_hit(keyword, text) and not automaton_hit(keyword, category, text)]
+    intended = [("dka", 'emergency', "a vodka tonic"), ("edema", 'warning', "myxedema")]
+    for keyword, category, text in intended:
+        assert substring_hit(keyword, text) and not automaton_hit(keyword, category, text), text
+    print(f"\n{'✅' if not regressions else '❌'} {len(probes) - len(regressions)}/{len(probes)} "
+          f"substring matches still flagged; {len(intended)} in-word matches dropped on purpose")
+    for text in regressions:
+        print(f"   ❌ {text}")
+    
+    # Readings: (message, expected urgency), current vs. past values and units
+    reading_cases = [
+        # current readings escalate
+        ("my sugar was 45", 'EMERGENCY'),
+        ("sugar at 2 am was 45", 'EMERGENCY'),
+        ("my sugar was 45 an hour ago", 'EMERGENCY'),
+        ("glucose 500 yesterday but now 45", 'EMERGENCY'),
+        ("my sugar is 500 now, it was 100 yesterday", 'EMERGENCY'),
+        ("glucose 3.5", 'MODERATE'),
+        ("glycémie 2,5", 'EMERGENCY'),
+        ("bg 2.9 mmol/L", 'HIGH'),
+        ("glucose 6.5 is that ok?", 'NORMAL'),
+        # past readings don't
+        ("my bg was 400 in 2019", 'NORMAL'),
+        ("glucose 500 yesterday but now 110", 'NORMAL'),
+        ("yesterday my sugar was 500", 'NORMAL'),
+        ("sugar 450 3 days ago", 'NORMAL'),
+        ("ma glycémie était 450 hier", 'NORMAL'),
+        # small whole numbers still need a cue or a unit
+        ("I ate sugar 2 cubes", 'NORMAL'),
+        ("I ate sugar 2.5 cubes", 'NORMAL'),
+    ]
+    reading_failures = [(text, expected, safety.check_emergency_situation(text)['urgency_level'])
+                        for text, expected in reading_cases]
+    reading_failures = [failure for failure in reading_failures if failure[1] != failure[2]]
+    print(f"{'✅' if not reading_failures else '❌'} {len(reading_cases) - len(reading_failures)}/{len(reading_cases)} "
+          f"reading cases passed")
+    for text, expected, got in reading_failures:
+        print(f"   ❌ {text!r}: expected {expected}, got {got}")
+    
+    # Microbenchmark: one automaton pass vs. the per-keyword substring scans it replaced
+    message = ("I have been feeling tired after lunch and my readings are a little higher than usual, "
+               "so I wanted to ask what I should change in my meals this week. ") * 14
+    message = message[:2000]
+    runs = 2000
+
+    def substring_scans(text):
+        text = text.lower()
+        return [[keyword for keyword in keywords if keyword in text] for _, _, keywords in KEYWORD_LISTS]
+
+    started = perf_counter()
+    for _ in range(runs):
+        substring_scans(message)
+    substring_ms = (perf_counter() - started) * 1000 / runs
+    started = perf_counter()
+    for _ in range(runs):
+        KEYWORD_MATCHER.find_all(message)
+    automaton_ms = (perf_counter() - started) * 1000 / runs
+
+    keyword_count = sum(len(keywords) for _, _, keywords in KEYWORD_LISTS)
+    print(f"\n⏱️ {len(message)}-char message, {keyword_count} keywords:")
+    print(f"   substring scans: {substring_ms:.3f} ms/turn")
+    print(f"   automaton pass:  {automaton_ms:.3f} ms/turn ({substring_ms / automaton_ms:.1f}x)")
+    print(f"   memoized:        repeat checks of the same turn reuse scan_keywords()")
+    
     print("\n✅ Safety testing complete!")
@@ -0,0 +1,72 @@
+# app/chatbot/model_routing.py
+"""
+Model routing tiers per conversation type
+- casual turns go to a small, fast model with a short token budget;
+  medical/emergency answers keep the premium model
+- each route carries a latency SLO; call latency is recorded per route in
+  METRICS ("route.<type>.ms") and SLO misses are counted
+- every field is overridable from env, e.g.
+    GLUCOMATE_ROUTE_CASUAL_MODEL=amazon.titan-text-lite-v1
+    GLUCOMATE_ROUTE_CASUAL_MAX_TOKENS=256
+    GLUCOMATE_ROUTE_CASUAL_SLO_MS=1500
+Routes must point at Titan text models (GlucoMateCore builds Titan request bodies).
+"""
+
+import os
+from collections import namedtuple
+
+from app.utils.metrics import METRICS
+
+MODEL_ROUTING_ENABLED = os.getenv("GLUCOMATE_MODEL_ROUTING", "1") == "1"
+
+ModelRoute = namedtuple("ModelRoute", ["name", "model_id", "max_tokens", "latency_slo_ms"])
+
+# conversation type -> (model id, max tokens, latency SLO in ms)
+DEFAULT_ROUTES = {
+    "casual": ("amazon.titan-text-lite-v1", 256, 1500),
+    "medical": ("amazon.titan-text-premier-v1:0", 2048, 8000),
+    "emergency": ("amazon.titan-text-premier-v1:0", 1024, 4000),
+}
+DEFAULT_ROUTE = "medical"
+
+
+def _load_route(name, model_id, max_tokens, slo_ms):
+    prefix = f"GLUCOMATE_ROUTE_{name.upper()}_"
+    model_id = os.getenv(prefix + "MODEL", model_id)
+    try:
+        max_tokens = int(os.getenv(prefix + "MAX_TOKENS", str(max_tokens)))
+    except ValueError:
+        pass
+    try:
+        slo_ms = float(os.getenv(prefix + "SLO_MS", str(slo_ms)))
+    except ValueError:
+        pass
+    return ModelRoute(name, model_id, max_tokens, slo_ms)
+
+
+ROUTES = {name: _load_route(name, *spec) for name, spec in DEFAULT_ROUTES.items()}
+
+
+def route_for(conversation_type):
+    """Route for a conversation type (unknown types use the medical route)"""
+    return ROUTES.get(conversation_type) or ROUTES[DEFAULT_ROUTE]
+
+
+def record_route_latency(route, elapsed_ms, ok=True):
+    """Per-route latency histogram plus SLO-miss and error counters"""
+    prefix = f"route.{route.name}."
+    METRICS.observe(prefix + "ms", elapsed_ms)
+    METRICS.incr(prefix + "calls")
+    if not ok:
+        METRICS.incr(prefix + "errors")
+    elif elapsed_ms > route.latency_slo_ms:
+        METRICS.incr(prefix + "slo_misses")
+
+
+def get_routing_stats():
+    """Configured routes and their recorded latency"""
+    return {
+        "enabled": MODEL_ROUTING_ENABLED,
+        "routes": {name: route._asdict() for name, route in ROUTES.items()},
+        "metrics": METRICS.snapshot("route."),
+    }
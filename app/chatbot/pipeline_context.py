@@ -0,0 +1,51 @@
+# app/chatbot/pipeline_context.py
+"""
+Per-message context shared by every level of the chat pipeline
+- The entry point that receives a user message creates one ChatTurnContext
+  and passes it down the GlucoMateCore → MultilingualGlucoMate →
+  KnowledgeEnhancedGlucoMate → BedrockWebCrawlerGlucoMate chain
+- memo(stage, compute) runs a stage (translation, safety check, language
+  name, classification, ...) at most once per message, so fallbacks that
+  re-enter multilingual_chat reuse the results instead of repeating them
+- Each stage that runs is timed as a span ("span.<stage>_ms"); reuses are
+  printed and counted under "turn_context.reused.<stage>"
+"""
+
+from app.utils.metrics import METRICS, span
+
+
+class ChatTurnContext:
+    def __init__(self, user_input, target_language_code):
+        self.user_input = user_input
+        self.target_language_code = target_language_code
+        self.results = {}
+        self.computed = []  # stages run for this message, in order
+        self.reused = []    # stages served from the context
+
+    def memo(self, stage, compute):
+        """compute() the first time a stage is asked for, the stored result afterwards"""
+        if stage in self.results:
+            self.reused.append(stage)
+            METRICS.incr(f"turn_context.reused.{stage}")
+            print(f"♻️ Turn context: {stage} reused")
+            return self.results[stage]
+        with span(stage):
+            value = compute()
+        self.results[stage] = value
+        self.computed.append(stage)
+        return value
+
+    def get(self, stage, default=None):
+        """Result of a stage that already ran, or default"""
+        return self.results.get(stage, default)
+
+    def summary(self):
+        return {"computed": list(self.computed), "reused": list(self.reused)}
+
+
+def turn_context(context, user_input, target_language_code):
+    """The caller's context if it is for this message, otherwise a fresh one"""
+    if (context is None or context.user_input != user_input
+            or context.target_language_code != target_language_code):
+        return ChatTurnContext(user_input, target_language_code)
+    return context
@@ -0,0 +1,222 @@
+# app/chatbot/question_cache.py
+"""
+Near-duplicate question cache for non-personalized medical answers
+- Questions are normalized English (after translate_to_english)
+- MinHash signatures over per-word character trigrams + an LSH band index
+- A hit also requires the same numbers, negations, question words and
+  polarity/qualifier terms ("70" vs "700", "not", "when" vs "why",
+  hypo- vs hyper-, "before" vs "after", type 1 vs 2)
+- Stores the final answer per language; LRU + TTL eviction
+- invalidate() drops everything (e.g. after a knowledge base re-sync)
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.minhash import MinHasher, LSHIndex
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+_STOP_WORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "were", "be", "been", "being",
+    "do", "does", "did", "can", "could", "should", "would", "will", "shall", "may", "might", "must",
+    "i", "me", "my", "mine", "we", "our", "you", "your", "it", "its", "they", "their",
+    "of", "to", "in", "on", "for", "with", "about", "at", "by", "from", "as", "into",
+    "and", "or", "if", "so", "that", "this", "these", "those", "there",
+    "please", "tell", "know", "want", "need", "like", "some", "any", "really", "just",
+}
+# Question words are content: "when", "why" and "how" to check blood sugar are different questions
+_QUESTION_WORDS = {"what", "which", "who", "how", "why", "when", "where", "much", "many"}
+_NEGATIONS = {"no", "not", "never", "without", "nor", "cannot", "cant", "dont", "doesnt", "isnt", "shouldnt"}
+# Polarity and qualifier terms: questions that differ only in one of these
+# need different (often opposite) answers, however similar the rest is.
+# Folded so "lower"/"low" or "t2d"/"type2" still count as the same term.
+_QUALIFIERS = {
+    "high": "high", "higher": "high", "highs": "high", "raise": "high", "raises": "high",
+    "increase": "high", "increases": "high", "rise": "high", "rising": "high", "spike": "high", "spikes": "high",
+    "low": "low", "lower": "low", "lows": "low", "lowers": "low", "drop": "low", "drops": "low",
+    "decrease": "low", "decreases": "low", "fall": "low", "falling": "low",
+    "above": "above", "over": "above", "below": "below", "under": "below",
+    "before": "before", "after": "after", "fasting": "fasting", "during": "during",
+    "morning": "morning", "night": "night", "nighttime": "night", "overnight": "night", "bedtime": "night",
+    "type1": "type1", "t1d": "type1", "type2": "type2", "t2d": "type2", "gestational": "gestational",
+    "prediabetes": "prediabetes", "pregnant": "pregnancy", "pregnancy": "pregnancy",
+    "child": "child", "children": "child", "kid": "child", "kids": "child",
+    "elderly": "elderly", "older": "elderly", "senior": "elderly", "seniors": "elderly",
+}
+_SYNONYMS = {
+    "whats": "what", "hows": "how", "whens": "when", "wheres": "where", "whys": "why",
+    "glucose": "sugar", "sugars": "sugar", "bg": "sugar",
+    "levels": "level", "readings": "level", "reading": "level",
+    "diabetic": "diabetes", "diabetics": "diabetes",
+    "foods": "food", "meals": "meal", "carbohydrate": "carb", "carbohydrates": "carb", "carbs": "carb",
+}
+
+
+def normalize_question(text):
+    """Lowercase content words with light synonym folding (stop words dropped)."""
+    words = _WORD_RE.findall((text or "").lower().replace("'", ""))
+    out = []
+    for w in words:
+        w = _SYNONYMS.get(w, w)
+        if w in _STOP_WORDS:
+            continue
+        out.append(w)
+    return out
+
+
+def _shingles(words):
+    grams = set()
+    for w in words:
+        padded = f"^{w}$"
+        if len(padded) <= 3:
+            grams.add(padded)
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def _qualifier(word):
+    """Canonical polarity/qualifier term for a word, or None"""
+    if word.startswith("hypo"):
+        return "hypo"    # hypoglycemia, hypoglycaemia, hypo, hypos
+    if word.startswith("hyper"):
+        return "hyper"   # hyperglycemia, hyperglycaemia, hyper
+    return _QUALIFIERS.get(word)
+
+
+def _guard(words):
+    """Tokens that must match exactly for two questions to share an answer."""
+    guard = set()
+    for w in words:
+        if w in _NEGATIONS or w in _QUESTION_WORDS or w[0].isdigit():
+            guard.add(w)
+        else:
+            qualifier = _qualifier(w)
+            if qualifier:
+                guard.add(qualifier)
+    return frozenset(guard)
+
+
+class NearDuplicateQuestionCache:
+    def __init__(self, threshold=0.8, maxsize=1000, ttl_secs=6 * 3600, num_perm=64, bands=16):
+        self.threshold = threshold
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl_secs
+
+        self._hasher = MinHasher(num_perm=num_perm)
+        self._lsh = LSHIndex(num_perm=num_perm, bands=bands)
+        self._entries = OrderedDict()  # normalized question -> entry dict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fingerprint(self, question):
+        words = normalize_question(question)
+        if not words:
+            return None, None, None
+        key = " ".join(words)
+        return key, self._hasher.signature(_shingles(words)), _guard(words)
+
+    def lookup(self, question, language_code):
+        """Cached answer for a near-duplicate question in this language, else None."""
+        key, sig, guard = self._fingerprint(question)
+        if key is None:
+            return None
+
+        now = time.time()
+        best_key, best_sim = None, 0.0
+        for cand in self._lsh.query(sig):
+            with self._lock:
+                entry = self._entries.get(cand)
+            if not entry or entry["guard"] != guard or language_code not in entry["answers"]:
+                continue
+            if now - entry["created_at"] > self.ttl:
+                self._drop(cand)
+                continue
+            sim = 1.0 if cand == key else MinHasher.similarity(sig, entry["sig"])
+            if sim > best_sim:
+                best_key, best_sim = cand, sim
+
+        with self._lock:
+            if best_key is None or best_sim < self.threshold or best_key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]["answers"][language_code]
+
+    def store(self, question, language_code, answer):
+        key, sig, guard = self._fingerprint(question)
+        if key is None or not answer:
+            return
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["created_at"] > self.ttl:
+                entry = {"sig": sig, "guard": guard, "answers": {}, "created_at": time.time()}
+                self._entries[key] = entry
+            entry["answers"][language_code] = answer
+            self._entries.move_to_end(key)
+
+            evicted = []
+            while len(self._entries) > self.maxsize:
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append(old_key)
+
+        self._lsh.insert(key, sig)
+        for old_key in evicted:
+            self._lsh.remove(old_key)
+
+    def _drop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        self._lsh.remove(key)
+
+    def invalidate(self):
+        """Forget every cached answer (call when the knowledge base changes)."""
+        with self._lock:
+            self._entries.clear()
+        self._lsh.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Testing and validation
+if __name__ == "__main__":
+    # (cached question, asked question, should the cached answer be served?)
+    cases = [
+        ("When should I check my blood sugar?", "Why should I check my blood sugar?", False),
+        ("When should I check my blood sugar?", "How should I check my blood sugar?", False),
+        ("What is insulin?", "How much insulin?", False),
+        ("What is insulin?", "When insulin?", False),
+        ("What are the warning symptoms of hypoglycemia in elderly diabetes patients at night?",
+         "What are the warning symptoms of hyperglycemia in elderly diabetes patients at night?", False),
+        ("When should I check my blood sugar?", "when should i check my blood glucose", True),
+        ("What is insulin?", "What's insulin?", True),
+    ]
+
+    print("🧪 Near-duplicate question cache:")
+    failures = 0
+    for cached_question, question, should_hit in cases:
+        cache = NearDuplicateQuestionCache()
+        cache.store(cached_question, "en", "cached answer")
+        hit = cache.lookup(question, "en") is not None
+        ok = hit == should_hit
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {'hit ' if hit else 'miss'} {question!r} (cached: {cached_question!r})")
+
+    print(f"\n{'✅' if not failures else '❌'} {len(cases) - failures}/{len(cases)} cases passed")
+    raise SystemExit(1 if failures else 0)
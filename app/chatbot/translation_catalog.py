@@ -0,0 +1,240 @@
+# app/chatbot/translation_catalog.py
+"""
+Pre-translated catalog of the bot's fixed strings
+
+    python -m app.chatbot.translation_catalog [--out PATH] [--full] [--check]
+
+- Fixed strings: safety messages, encouragement phrases, the source-attribution
+  footer, weekly check-in questions/options and the offline fallbacks
+- Translated once at build time (Amazon Translate, formal register) into every
+  language in GlucoMateCore.supported_languages and written to a versioned JSON
+  file (data/translation_catalog.json, GLUCOMATE_TRANSLATION_CATALOG_PATH)
+- At runtime lookups are a dict access: translate_response serves cataloged
+  strings without a network call, and the offline paths use localize()
+- Keys are the English strings themselves, so an edited string simply misses
+  the catalog (and falls back to Translate) until the next build
+- Incremental: existing translations are kept unless --full; the version is
+  bumped whenever the content changes
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+from app.utils.metrics import METRICS
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), "data", "translation_catalog.json")
+TRANSLATION_CATALOG_PATH = os.getenv("GLUCOMATE_TRANSLATION_CATALOG_PATH", DEFAULT_CATALOG_PATH)
+TRANSLATION_CATALOG_ENABLED = os.getenv("GLUCOMATE_TRANSLATION_CATALOG", "1") == "1"
+
+_PLACEHOLDER = re.compile(r"\{[a-z_]+\}")
+
+
+def catalog_source_strings():
+    """The English strings the catalog covers, in a stable order"""
+    from app.chatbot.medical_safety import (
+        EMERGENCY_MESSAGE, HIGH_URGENCY_MESSAGE, MODERATE_URGENCY_MESSAGE, MEDICATION_CONCERN_MESSAGE,
+    )
+    from app.chatbot.glucomate_core import ENCOURAGEMENT_PHRASES
+    from app.chatbot.clean_bedrock_web_crawler import BedrockWebCrawlerGlucoMate
+    from app.chatbot import flask_integrated_glucomate as flask_bot
+
+    strings = [EMERGENCY_MESSAGE, HIGH_URGENCY_MESSAGE, MODERATE_URGENCY_MESSAGE, MEDICATION_CONCERN_MESSAGE]
+    strings += ENCOURAGEMENT_PHRASES
+    strings.append(BedrockWebCrawlerGlucoMate.SOURCE_ATTRIBUTION)
+    strings += flask_bot.CATALOG_STRINGS
+    for qd in flask_bot.CHECKIN_QUESTIONS:
+        strings.append(qd["question"])
+        strings += qd.get("options", [])
+
+    seen = set()
+    # option labels like "25-50%" have nothing to translate
+    return [s for s in strings if re.search(r"[A-Za-z]", s) and not (s in seen or seen.add(s))]
+
+
+def catalog_languages():
+    """Target language codes: every supported language except English"""
+    from app.chatbot.glucomate_core import SUPPORTED_LANGUAGES
+    return [code for _, code in SUPPORTED_LANGUAGES.values() if code != "en"]
+
+
+class TranslationCatalog:
+    def __init__(self, strings=None, version=0, languages=()):
+        """strings: {english: {language code: translation}}"""
+        self.strings = strings or {}
+        self.version = version
+        self.languages = list(languages)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("strings", {}), data.get("version", 0), data.get("languages", []))
+
+    def lookup(self, text, language_code):
+        """Pre-translated text, or None if the string/language isn't cataloged"""
+        entry = self.strings.get(text)
+        if entry is None:
+            return None
+        return entry.get(language_code)
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "languages": self.languages,
+            "strings": len(self.strings),
+            "translations": sum(len(entry) for entry in self.strings.values()),
+        }
+
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_translation_catalog():
+    """The process-wide catalog (loaded on first call; empty if the file is missing)"""
+    global _CATALOG
+    if _CATALOG is not None:
+        return _CATALOG
+    with _CATALOG_LOCK:
+        if _CATALOG is None:
+            catalog = TranslationCatalog()
+            if TRANSLATION_CATALOG_ENABLED:
+                try:
+                    catalog = TranslationCatalog.load(TRANSLATION_CATALOG_PATH)
+                    print(f"🗂️ Translation catalog v{catalog.version}: {len(catalog.strings)} strings, "
+                          f"{', '.join(catalog.languages)}")
+                except Exception as e:
+                    print(f"⚠️ Translation catalog unavailable: {e}")
+            _CATALOG = catalog
+    return _CATALOG
+
+
+def lookup_translation(text, language_code):
+    """Cataloged translation of a fixed string, or None (counted under "translate.catalog.")"""
+    if language_code == "en" or not text:
+        return None
+    translated = get_translation_catalog().lookup(text, language_code)
+    METRICS.incr("translate.catalog." + ("hits" if translated is not None else "misses"))
+    return translated
+
+
+def localize(text, language_code):
+    """Fixed string in the user's language if cataloged, else English (never calls the network)"""
+    return lookup_translation(text, language_code) or text
+
+
+# ---------------------------- Build ----------------------------
+def _content_hash(strings):
+    return hashlib.sha256(json.dumps(strings, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def build_catalog(translate, path=TRANSLATION_CATALOG_PATH, languages=None, full=False):
+    """
+    Translate every catalog string into every language and write the catalog
+
+    Args:
+        translate: callable(text, language_code) -> translated text
+        path: catalog file (read for incremental builds, then rewritten)
+        languages: target codes (default: all supported languages but English)
+        full: re-translate strings that are already in the catalog
+
+    Returns:
+        dict: {'version', 'strings', 'translated', 'reused', 'failed'}
+    """
+    languages = languages or catalog_languages()
+    previous = {}
+    version = 0
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        previous = data.get("strings", {})
+        version = data.get("version", 0)
+
+    strings = {}
+    translated = reused = failed = 0
+    for text in catalog_source_strings():
+        entry = {}
+        for lang in languages:
+            existing = previous.get(text, {}).get(lang)
+            if existing and not full:
+                entry[lang] = existing
+                reused += 1
+                continue
+            try:
+                result = translate(text, lang)
+            except Exception as e:
+                print(f"❌ {lang}: {text[:60]!r}: {e}")
+                failed += 1
+                continue
+            if sorted(_PLACEHOLDER.findall(result)) != sorted(_PLACEHOLDER.findall(text)):
+                print(f"⚠️ {lang}: placeholders lost in {text[:60]!r}; left untranslated")
+                failed += 1
+                continue
+            entry[lang] = result
+            translated += 1
+        strings[text] = entry
+
+    if _content_hash(strings) != _content_hash(previous):
+        version += 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "built_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "source_language": "en",
+            "languages": languages,
+            "strings": strings,
+        }, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+    print(f"🗂️ Catalog v{version}: {len(strings)} strings, {translated} translated, "
+          f"{reused} reused, {failed} failed → {path}")
+    return {"version": version, "strings": len(strings), "translated": translated, "reused": reused, "failed": failed}
+
+
+def missing_translations(path=TRANSLATION_CATALOG_PATH, languages=None):
+    """[(english, language code)] not covered by the catalog at path"""
+    languages = languages or catalog_languages()
+    catalog = TranslationCatalog.load(path) if os.path.exists(path) else TranslationCatalog()
+    return [(text, lang) for text in catalog_source_strings() for lang in languages
+            if catalog.lookup(text, lang) is None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the GlucoMate translation catalog of fixed bot strings")
+    parser.add_argument("--out", default=TRANSLATION_CATALOG_PATH, help="catalog file (default: %(default)s)")
+    parser.add_argument("--full", action="store_true", help="re-translate strings already in the catalog")
+    parser.add_argument("--check", action="store_true", help="only report missing translations (exit 1 if any)")
+    parser.add_argument("--languages", help="comma-separated language codes (default: all supported)")
+    args = parser.parse_args(argv)
+    languages = args.languages.split(",") if args.languages else None
+
+    if args.check:
+        missing = missing_translations(args.out, languages)
+        for text, lang in missing:
+            print(f"missing {lang}: {text[:70]!r}")
+        print(f"{len(missing)} missing translations")
+        sys.exit(1 if missing else 0)
+
+    from app.chatbot.aws_clients import get_client
+    client = get_client("translate")
+
+    def translate(text, lang):
+        response = client.translate_text(
+            Text=text,
+            SourceLanguageCode="en",
+            TargetLanguageCode=lang,
+            Settings={"Formality": "FORMAL"},
+        )
+        return response["TranslatedText"]
+
+    build_catalog(translate, args.out, languages, full=args.full)
+
+
+if __name__ == "__main__":
+    main()
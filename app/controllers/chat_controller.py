@@ -3,15 +3,25 @@
 Chat controller for GlucoMate integration with existing chat system
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.chatbot import flask_integrated_glucomate
 from app.extensions import db
 from app.models import ChatSession, ChatMessage, User
+from app.utils.circuit_breaker import breaker_states
+from app.utils.metrics import METRICS, format_timings, span, span_log
 from datetime import datetime
+import hmac
+import json
 import sys
 import os
 
+# Shared secret for the operational endpoints (cache purge, metrics); they are off while unset
+OPS_TOKEN = os.getenv("GLUCOMATE_OPS_TOKEN", "")
+
+# Return per-stage timings with each reply (X-GlucoMate-Timings header / "timings" in the stream's done event)
+TIMINGS_HEADER_ENABLED = os.getenv("GLUCOMATE_TIMINGS_HEADER", "0") == "1"
+
 # Add chatbot directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'chatbot'))
 
@@ -43,138 +53,217 @@ def _dispose_glucomate(user_id: int):
         except Exception:
             pass
 
-@jwt_required()
-def send_message_to_glucomate():
+def _start_chat_turn(user_id):
     """
-    Send message to GlucoMate and save conversation using existing ChatSession/ChatMessage models
+    Validate the chat request, get/create the ChatSession and stage the user message.
+    Returns (turn, None) on success or (None, error_response).
     """
-    try:
-        # Get user ID from JWT
-        identity = get_jwt_identity()
-        user_id = int(identity)
+    # Validate user exists
+    user = User.query.get(user_id)
+    if not user:
+        return None, (jsonify({
+            "success": False,
+            "message": "User not found"
+        }), 404)
 
-        # Validate user exists
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({
-                "success": False,
-                "message": "User not found"
-            }), 404
+    # Get request data
+    data = request.get_json()
+    if not data:
+        return None, (jsonify({
+            "success": False,
+            "message": "JSON data required"
+        }), 400)
 
-        # Get request data
-        data = request.get_json()
-        if not data:
-            return jsonify({
-                "success": False,
-                "message": "JSON data required"
-            }), 400
+    message = data.get('message', '').strip()
+    language = data.get('language', 'en')
+    session_id = data.get('session_id')  # Optional: continue existing session
 
-        message = data.get('message', '').strip()
-        language = data.get('language', 'en')
-        session_id = data.get('session_id')  # Optional: continue existing session
+    # Validate message
+    if not message:
+        return None, (jsonify({
+            "success": False,
+            "message": "Message cannot be empty"
+        }), 400)
 
-        # Validate message
-        if not message:
-            return jsonify({
-                "success": False,
-                "message": "Message cannot be empty"
-            }), 400
+    if len(message) > 2000:
+        return None, (jsonify({
+            "success": False,
+            "message": "Message too long (max 2000 characters)"
+        }), 400)
 
-        if len(message) > 2000:
-            return jsonify({
-                "success": False,
-                "message": "Message too long (max 2000 characters)"
-            }), 400
+    # Check if GlucoMate is available
+    if not GLUCOMATE_AVAILABLE:
+        return None, (jsonify({
+            "success": False,
+            "message": "GlucoMate chatbot temporarily unavailable"
+        }), 503)
 
-        # Check if GlucoMate is available
-        if not GLUCOMATE_AVAILABLE:
-            return jsonify({
+    # Get or create chat session
+    if session_id:
+        chat_session = ChatSession.query.filter_by(
+            id=session_id,
+            user_id=user_id
+        ).first()
+    else:
+        chat_session = None
+
+    if not chat_session:
+        # Create new chat session
+        chat_session = ChatSession(
+            user_id=user_id,
+            started_at=datetime.utcnow()
+        )
+        db.session.add(chat_session)
+        try:
+            db.session.flush()  # Get the ID
+        except Exception as e:
+            db.session.rollback()
+            print(f"Database flush error: {e}")
+            return None, (jsonify({
                 "success": False,
-                "message": "GlucoMate chatbot temporarily unavailable"
-            }), 503
+                "message": "Error creating chat session",
+                "error": str(e)
+            }), 500)
+
+    # Save user message
+    user_message = ChatMessage(
+        chat_session_id=chat_session.id,
+        sender="user",
+        text=message,
+        timestamp=datetime.utcnow()
+    )
+    db.session.add(user_message)
+
+    return {
+        "chat_session": chat_session,
+        "user_message": user_message,
+        "message": message,
+        "language": language,
+    }, None
+
+def _turn_payload(chat_session, user_message, bot_message):
+    return {
+        "success": True,
+        "session_id": chat_session.id,
+        "user_message": {
+            "id": user_message.id,
+            "text": user_message.text,
+            "timestamp": user_message.timestamp.isoformat(),
+            "sender": "user"
+        },
+        "bot_response": {
+            "id": bot_message.id,
+            "text": bot_message.text,
+            "timestamp": bot_message.timestamp.isoformat(),
+            "sender": "glucomate"
+        }
+    }
+
+def _ops_authorized():
+    """True when the request carries the configured X-Ops-Token (patient JWTs alone are not enough)"""
+    supplied = request.headers.get("X-Ops-Token", "")
+    return bool(OPS_TOKEN) and hmac.compare_digest(supplied.encode("utf-8"), OPS_TOKEN.encode("utf-8"))
+
+def _ops_forbidden():
+    return jsonify({
+        "success": False,
+        "message": "Operations token required"
+    }), 403
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
-        # Get or create chat session
-        if session_id:
-            chat_session = ChatSession.query.filter_by(
-                id=session_id,
-                user_id=user_id
-            ).first()
-        else:
-            chat_session = None
+@jwt_required()
+def send_message_to_glucomate():
+    """
+    Send message to GlucoMate and save conversation using existing ChatSession/ChatMessage models
+    """
+    try:
+        # Get user ID from JWT
+        identity = get_jwt_identity()
+        user_id = int(identity)
 
-        if not chat_session:
-            # Create new chat session
-            chat_session = ChatSession(
-                user_id=user_id,
-                started_at=datetime.utcnow()
+        turn, error_response = _start_chat_turn(user_id)
+        if error_response:
+            return error_response
+        chat_session = turn["chat_session"]
+        user_message = turn["user_message"]
+        message = turn["message"]
+        language = turn["language"]
+
+        with span_log() as spans:
+            # Get GlucoMate response (reuse the same bot instance for this user)
+            try:
+                glucomate = _get_glucomate(user_id)
+                with span("chat_turn"):
+                    bot_response = glucomate.flask_integrated_chat(message, language)
+            except Exception as e:
+                print(f"GlucoMate error: {e}")
+                bot_response = "I'm having trouble processing your request right now. Please try again in a moment."
+
+            # Save bot response
+            bot_message = ChatMessage(
+                chat_session_id=chat_session.id,
+                sender="glucomate",
+                text=bot_response,
+                timestamp=datetime.utcnow()
             )
-            db.session.add(chat_session)
+            db.session.add(bot_message)
+
+            # Commit all changes
             try:
-                db.session.flush()  # Get the ID
+                with span("db_commit"):
+                    db.session.commit()
             except Exception as e:
                 db.session.rollback()
-                print(f"Database flush error: {e}")
+                print(f"Database commit error: {e}")
                 return jsonify({
                     "success": False,
-                    "message": "Error creating chat session",
+                    "message": "Error saving conversation",
                     "error": str(e)
                 }), 500
 
-        # Save user message
-        user_message = ChatMessage(
-            chat_session_id=chat_session.id,
-            sender="user",
-            text=message,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(user_message)
+        response = jsonify(_turn_payload(chat_session, user_message, bot_message))
+        if TIMINGS_HEADER_ENABLED:
+            response.headers["X-GlucoMate-Timings"] = format_timings(spans)
+        return response, 200
 
-        # Get GlucoMate response (reuse the same bot instance for this user)
-        try:
-            glucomate = _get_glucomate(user_id)
-            bot_response = glucomate.flask_integrated_chat(message, language)
-        except Exception as e:
-            print(f"GlucoMate error: {e}")
-            bot_response = "I'm having trouble processing your request right now. Please try again in a moment."
-
-        # Save bot response
-        bot_message = ChatMessage(
-            chat_session_id=chat_session.id,
-            sender="glucomate",
-            text=bot_response,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(bot_message)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "message": "Invalid user token"
+        }), 401
+    except Exception as e:
+        db.session.rollback()
+        print(f"Chat error: {e}")
+        return jsonify({
+            "success": False,
+            "message": "Internal server error",
+            "error": str(e)
+        }), 500
 
-        # Commit all changes
-        try:
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            print(f"Database commit error: {e}")
-            return jsonify({
-                "success": False,
-                "message": "Error saving conversation",
-                "error": str(e)
-            }), 500
+@jwt_required()
+def stream_message_to_glucomate():
+    """
+    Streaming variant of send_message_to_glucomate (Server-Sent Events)
 
-        return jsonify({
-            "success": True,
-            "session_id": chat_session.id,
-            "user_message": {
-                "id": user_message.id,
-                "text": message,
-                "timestamp": user_message.timestamp.isoformat(),
-                "sender": "user"
-            },
-            "bot_response": {
-                "id": bot_message.id,
-                "text": bot_response,
-                "timestamp": bot_message.timestamp.isoformat(),
-                "sender": "glucomate"
-            }
-        }), 200
+    Events:
+      - start: {"session_id"}
+      - token: {"text"} as the reply is generated
+      - done:  same payload as the non-streaming endpoint, once the reply is saved
+      - error: {"message", "error"} if the conversation could not be saved
+    """
+    try:
+        identity = get_jwt_identity()
+        user_id = int(identity)
 
+        turn, error_response = _start_chat_turn(user_id)
+        if error_response:
+            return error_response
+
+        # Commit the user message now; the generator below runs after this
+        # view returns and may not share its database session.
+        db.session.commit()
     except ValueError:
         return jsonify({
             "success": False,
@@ -189,6 +278,59 @@ def send_message_to_glucomate():
             "error": str(e)
         }), 500
 
+    session_id = turn["chat_session"].id
+    user_message_id = turn["user_message"].id
+
+    def generate():
+        yield _sse("start", {"session_id": session_id})
+
+        with span_log() as spans:
+            parts = []
+            try:
+                glucomate = _get_glucomate(user_id)
+                with span("chat_turn"):
+                    for chunk in glucomate.flask_integrated_chat_stream(turn["message"], turn["language"]):
+                        if chunk:
+                            parts.append(chunk)
+                            yield _sse("token", {"text": chunk})
+            except Exception as e:
+                print(f"GlucoMate stream error: {e}")
+                fallback = "I'm having trouble processing your request right now. Please try again in a moment."
+                if parts:
+                    fallback = "\n\n" + fallback
+                parts.append(fallback)
+                yield _sse("token", {"text": fallback})
+
+            # Save the finished bot response
+            bot_message = ChatMessage(
+                chat_session_id=session_id,
+                sender="glucomate",
+                text="".join(parts),
+                timestamp=datetime.utcnow()
+            )
+            db.session.add(bot_message)
+            try:
+                with span("db_commit"):
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Database commit error: {e}")
+                yield _sse("error", {"message": "Error saving conversation", "error": str(e)})
+                return
+
+        chat_session = ChatSession.query.get(session_id)
+        user_message = ChatMessage.query.get(user_message_id)
+        payload = _turn_payload(chat_session, user_message, bot_message)
+        if TIMINGS_HEADER_ENABLED:
+            payload["timings"] = format_timings(spans)
+        yield _sse("done", payload)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @jwt_required()
 def get_chat_history(session_id=None):
     """
@@ -351,7 +493,9 @@ def get_chat_status():
                 "email": user.email,
                 "has_medical_profile": has_profile
             },
-            "glucomate_available": GLUCOMATE_AVAILABLE
+            "glucomate_available": GLUCOMATE_AVAILABLE,
+            # CLOSED / OPEN / HALF_OPEN per AWS dependency, for monitoring
+            "circuit_breakers": breaker_states()
         }), 200
 
     except Exception as e:
@@ -359,4 +503,78 @@ def get_chat_status():
             "success": False,
             "message": "Status check failed",
             "error": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@jwt_required()
+def purge_knowledge_cache():
+    """
+    Drop cached knowledge base results and near-duplicate answers
+    (call after the knowledge base has been re-synced; needs X-Ops-Token)
+    """
+    if not _ops_authorized():
+        return _ops_forbidden()
+    try:
+        from app.chatbot.fixed_knowledge_enhanced_glucomate import (
+            purge_knowledge_cache as purge_kb_results,
+            get_knowledge_cache_stats,
+        )
+        from app.chatbot.clean_bedrock_web_crawler import invalidate_question_cache
+
+        generation = purge_kb_results()
+        invalidate_question_cache()
+
+        return jsonify({
+            "success": True,
+            "message": "Knowledge cache purged",
+            "generation": generation,
+            "cache": get_knowledge_cache_stats()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": "Knowledge cache purge failed",
+            "error": str(e)
+        }), 500
+
+@jwt_required()
+def get_chat_metrics():
+    """
+    In-process chat metrics for this worker: per-stage latency histograms
+    ("span.<stage>_ms"), counters, cache hit rates, circuit breakers,
+    rate limiters and model routing (needs X-Ops-Token)
+    """
+    if not _ops_authorized():
+        return _ops_forbidden()
+    try:
+        from app.chatbot.glucomate_core import get_response_cache_stats
+        from app.chatbot.clean_multilingual_glucomate import get_translation_cache_stats
+        from app.chatbot.fixed_knowledge_enhanced_glucomate import get_knowledge_cache_stats
+        from app.chatbot.clean_bedrock_web_crawler import get_question_cache_stats
+        from app.chatbot.model_routing import get_routing_stats
+        from app.chatbot.translation_catalog import get_translation_catalog
+        from app.chatbot.local_knowledge import get_local_knowledge
+        from app.utils.rate_limiter import limiter_stats
+
+        return jsonify({
+            "success": True,
+            "metrics": METRICS.snapshot(),
+            "caches": {
+                "responses": get_response_cache_stats(),
+                "translations": get_translation_cache_stats(),
+                "translation_catalog": get_translation_catalog().stats(),
+                "knowledge": get_knowledge_cache_stats(),
+                "questions": get_question_cache_stats(),
+                "local_knowledge": get_local_knowledge().stats(),
+            },
+            "circuit_breakers": breaker_states(),
+            "rate_limiters": limiter_stats(),
+            "model_routing": get_routing_stats()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": "Metrics unavailable",
+            "error": str(e)
+        }), 500
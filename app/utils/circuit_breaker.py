@@ -0,0 +1,155 @@
+# app/utils/circuit_breaker.py
+"""
+Circuit breakers for the AWS dependencies (Bedrock, Bedrock KB, Translate)
+- CLOSED: calls flow; outcomes kept in a rolling time window
+- OPEN: error rate (slow calls count as errors) crossed the threshold;
+  calls fail fast with CircuitOpenError for open_secs
+- HALF_OPEN: after open_secs a few probe calls go through; a success closes
+  the breaker, a failure re-opens it
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+BREAKER_FAILURE_RATE = _env_float("GLUCOMATE_BREAKER_FAILURE_RATE", 0.5)
+BREAKER_MIN_CALLS = int(_env_float("GLUCOMATE_BREAKER_MIN_CALLS", 5))
+BREAKER_WINDOW_SECS = _env_float("GLUCOMATE_BREAKER_WINDOW_SECS", 60)
+BREAKER_SLOW_CALL_SECS = _env_float("GLUCOMATE_BREAKER_SLOW_CALL_SECS", 20)
+BREAKER_OPEN_SECS = _env_float("GLUCOMATE_BREAKER_OPEN_SECS", 30)
+BREAKER_HALF_OPEN_PROBES = int(_env_float("GLUCOMATE_BREAKER_HALF_OPEN_PROBES", 1))
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name):
+        super().__init__(f"Circuit '{name}' is open; skipping call")
+        self.name = name
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_rate=BREAKER_FAILURE_RATE, min_calls=BREAKER_MIN_CALLS,
+                 window_secs=BREAKER_WINDOW_SECS, slow_call_secs=BREAKER_SLOW_CALL_SECS,
+                 open_secs=BREAKER_OPEN_SECS, half_open_probes=BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_secs = window_secs
+        self.slow_call_secs = slow_call_secs
+        self.open_secs = open_secs
+        self.half_open_probes = max(1, half_open_probes)
+
+        self.state = CLOSED
+        self._window = deque()  # (timestamp, ok, latency_secs)
+        self._opened_at = None
+        self._probes = 0
+        self._last_error = None
+        self._times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out now (may admit a half-open probe)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_secs:
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            return False
+
+    def is_open(self):
+        """True while calls are being refused (and no probe is due yet)."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < self.open_secs
+            return self.state == HALF_OPEN and self._probes >= self.half_open_probes
+
+    def record_success(self, latency_secs=0.0):
+        if latency_secs >= self.slow_call_secs:
+            self._record(False, latency_secs, f"slow call ({latency_secs:.1f}s)")
+        else:
+            self._record(True, latency_secs, None)
+
+    def record_failure(self, error=None, latency_secs=0.0):
+        self._record(False, latency_secs, str(error)[:200] if error else "error")
+
+    def _record(self, ok, latency_secs, error):
+        now = time.monotonic()
+        with self._lock:
+            if not ok:
+                self._last_error = error
+            if self.state == HALF_OPEN:
+                if ok:
+                    self.state = CLOSED
+                    self._window.clear()
+                else:
+                    self._open(now)
+                return
+            if self.state == OPEN:
+                return
+
+            self._window.append((now, ok, latency_secs))
+            self._trim(now)
+            calls = len(self._window)
+            failures = sum(1 for _, good, _ in self._window if not good)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._open(now)
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+        self._times_opened += 1
+        self._window.clear()
+
+    def _trim(self, now):
+        while self._window and now - self._window[0][0] > self.window_secs:
+            self._window.popleft()
+
+    def snapshot(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = len(self._window)
+            failures = sum(1 for _, good, _ in self._window if not good)
+            latencies = [lat for _, _, lat in self._window]
+            return {
+                "state": self.state,
+                "calls_in_window": calls,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "avg_latency_ms": round(sum(latencies) / calls * 1000.0, 1) if calls else 0.0,
+                "open_for_secs": round(time.monotonic() - self._opened_at, 1) if self.state != CLOSED else None,
+                "times_opened": self._times_opened,
+                "last_error": self._last_error,
+            }
+
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name):
+    breaker = _BREAKERS.get(name)
+    if breaker is None:
+        with _BREAKERS_LOCK:
+            breaker = _BREAKERS.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_states():
+    with _BREAKERS_LOCK:
+        items = list(_BREAKERS.items())
+    return {name: breaker.snapshot() for name, breaker in sorted(items)}
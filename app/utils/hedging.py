@@ -0,0 +1,127 @@
+# app/utils/hedging.py
+"""
+Hedged requests: if the primary call is slow, race a backup call against it
+- The hedge delay is a percentile of recent primary latency (e.g. p95), so
+  only the slow tail gets a second call
+- A budget caps hedges at a fraction of primary calls (e.g. 5% extra load)
+- First successful answer wins; the loser is cancelled if it has not started,
+  otherwise its result is discarded
+- Without hedge credit the primary runs on the calling thread; otherwise it
+  starts at once on its own thread (never queued, so the hedge delay and
+  primary_ms measure the call itself) and only the hedge goes to the pool
+- Both run in a copy of the caller's context, so their spans land in the
+  caller's span log
+- Counters under "hedge.<name>.": primary_wins, hedge_wins, hedges_sent, budget_exhausted
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from app.utils.metrics import METRICS
+
+
+class Hedger:
+    def __init__(self, name, percentile=95.0, budget=0.05, min_delay_ms=250.0, max_delay_ms=10000.0,
+                 default_delay_ms=3000.0, min_samples=20, max_workers=8, max_credit=5.0):
+        self.name = name
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.default_delay_ms = default_delay_ms
+        self.min_samples = min_samples
+        self.max_credit = max_credit
+
+        self._latency = METRICS.histogram(f"hedge.{name}.primary_ms")
+        self._prefix = f"hedge.{name}."
+        self._credit = 1.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+
+    def hedge_delay_secs(self):
+        """Current hedge delay: the latency percentile, clamped (default until warmed up)"""
+        if self._latency.count < self.min_samples:
+            delay_ms = self.default_delay_ms
+        else:
+            delay_ms = self._latency.percentile(self.percentile, self.default_delay_ms)
+        return min(self.max_delay_ms, max(self.min_delay_ms, delay_ms)) / 1000.0
+
+    def _has_hedge_credit(self):
+        with self._lock:
+            return self._credit >= 1.0
+
+    def _take_hedge_credit(self):
+        # every primary call earns `budget` credit; a hedge spends 1
+        with self._lock:
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                return True
+            return False
+
+    def _earn_credit(self):
+        with self._lock:
+            self._credit = min(self.max_credit, self._credit + self.budget)
+
+    def _timed_primary(self, fn):
+        started = time.monotonic()
+        result = fn()
+        self._latency.observe((time.monotonic() - started) * 1000.0)
+        return result
+
+    def _start_primary(self, fn):
+        """Run the timed primary on a new thread (in a copy of the caller's context); returns its Future"""
+        future = Future()
+        context = contextvars.copy_context()
+
+        def target():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(context.run(self._timed_primary, fn))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name=f"hedge-{self.name}-primary", daemon=True).start()
+        return future
+
+    def run(self, primary_fn, hedge_fn):
+        """Return primary_fn() - or hedge_fn() if the primary is slow and the hedge answers first."""
+        self._earn_credit()
+        delay_secs = self.hedge_delay_secs()
+        if not self._has_hedge_credit():
+            # no hedge can be sent: nothing to race, stay on the calling thread
+            started = time.monotonic()
+            result = self._timed_primary(primary_fn)
+            if time.monotonic() - started > delay_secs:
+                METRICS.incr(self._prefix + "budget_exhausted")
+            METRICS.incr(self._prefix + "primary_wins")
+            return result
+        primary = self._start_primary(primary_fn)
+
+        done, _ = wait([primary], timeout=delay_secs)
+        if done:
+            METRICS.incr(self._prefix + "primary_wins")
+            return primary.result()
+
+        if not self._take_hedge_credit():
+            METRICS.incr(self._prefix + "budget_exhausted")
+            result = primary.result()
+            METRICS.incr(self._prefix + "primary_wins")
+            return result
+
+        METRICS.incr(self._prefix + "hedges_sent")
+        hedge = self._pool.submit(contextvars.copy_context().run, hedge_fn)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    METRICS.incr(self._prefix + ("primary_wins" if future is primary else "hedge_wins"))
+                    return future.result()
+
+        # both failed: surface the primary's error
+        METRICS.incr(self._prefix + "both_failed")
+        return primary.result()
@@ -0,0 +1,178 @@
+# app/utils/keyword_matcher.py
+"""
+Aho-Corasick keyword automaton over words
+- Every keyword of every list is compiled once into one trie of word tokens
+  with failure links; a single left-to-right pass over the text's words finds
+  all of them (overlapping ones included: 'chest pain' in 'severe chest pain')
+- Matching whole tokens makes it word-boundary aware: 'hi' does not fire
+  inside "thirsty", 'dka' does not fire inside "vodka"
+- Case- and accent-insensitive; punctuation is ignored and typographic
+  apostrophes are folded to "'" so "can’t" matches "can't"
+- A keyword may also accept suffixes on its last word, so inflected forms
+  still match whole words ('chest pain' with ("s",) matches "chest pains"),
+  and a multi-word keyword may take its last word as a prefix ('ketones in
+  blood' matches "ketones in bloodstream", as a substring search would)
+- Each keyword carries a category and a severity, so callers can sort one
+  pass of matches into several keyword lists
+"""
+
+import unicodedata
+from collections import deque, namedtuple
+
+KeywordMatch = namedtuple("KeywordMatch", ["keyword", "category", "severity", "start", "end"])
+
+
+class _SeparatorTable(dict):
+    """
+    str.translate table (filled in lazily): punctuation -> space; letters,
+    digits and "'" kept, with diacritics folded ('é' -> 'e', 'أ' -> 'ا') so
+    unaccented typing still matches; combining marks (Arabic harakat) and
+    the Arabic tatweel are dropped
+    """
+
+    def __missing__(self, codepoint):
+        ch = chr(codepoint)
+        if ch == "'" or (ch.isalnum() and ch != "\u0640"):
+            decomposed = unicodedata.normalize("NFD", ch)
+            if len(decomposed) > 1 and all(unicodedata.category(mark) == "Mn" for mark in decomposed[1:]):
+                ch = decomposed[0]
+        elif unicodedata.category(ch) == "Mn" or ch == "\u0640":
+            ch = ""
+        else:
+            ch = " "
+        self[codepoint] = ch
+        return ch
+
+
+_SEPARATORS = _SeparatorTable()
+
+
+def normalize(text):
+    """Lower-case, with typographic apostrophes folded (keywords and text alike)"""
+    return (text or "").lower().replace("’", "'").replace("‘", "'")
+
+
+def tokenize(text):
+    """
+    normalize()d text as a list of word tokens ("can't" is one token);
+    punctuation separates words and is dropped and diacritics are folded,
+    so '¿cómo estás' is ['como', 'estas']. translate() + split() keep the
+    pass in C.
+    """
+    text = normalize(text)
+    tokens = text.translate(_SEPARATORS).split()
+    if "'" in text:
+        tokens = [token.strip("'") for token in tokens]
+        tokens = [token for token in tokens if token]
+    return tokens
+
+
+class KeywordAutomaton:
+    def __init__(self, keywords=()):
+        """keywords: iterable of (keyword, category, severity[, suffixes[, prefix]])"""
+        self._goto = [{}]     # state -> {token: state}
+        self._fail = [0]
+        self._out = [()]      # state -> ((keyword, category, severity, length in tokens), ...)
+        self._prefix = [()]   # state -> ((last word, output), ...) for prefix keywords
+        self._built = False
+        self.size = 0
+        for entry in keywords:
+            self.add(*entry)
+
+    def add(self, keyword, category, severity=None, suffixes=(), prefix=False):
+        """
+        Add one keyword (before build()); suffixes are also accepted on its
+        last word and report the keyword itself ('seizures' -> 'seizure').
+        With prefix, a multi-word keyword also matches when a longer word
+        starts with its last word ('ketones in bloodstream').
+        """
+        if self._built:
+            raise RuntimeError("KeywordAutomaton is already built")
+        tokens = tokenize(keyword)
+        if not tokens:
+            return
+        state = 0
+        for token in tokens[:-1]:
+            state = self._child(state, token)
+        output = ((normalize(keyword).strip(), category, severity, len(tokens)),)
+        for form in dict.fromkeys([tokens[-1]] + [tokens[-1] + suffix for suffix in suffixes]):
+            final = self._child(state, form)
+            if output[0] not in self._out[final]:
+                self._out[final] += output
+        if prefix and len(tokens) > 1 and (tokens[-1], output[0]) not in self._prefix[state]:
+            self._prefix[state] += ((tokens[-1], output[0]),)
+        self.size += 1
+
+    def _child(self, state, token):
+        """goto[state][token], creating the state if needed"""
+        nxt = self._goto[state].get(token)
+        if nxt is None:
+            nxt = len(self._goto)
+            self._goto[state][token] = nxt
+            self._goto.append({})
+            self._fail.append(0)
+            self._out.append(())
+            self._prefix.append(())
+        return nxt
+
+    def build(self):
+        """Compute failure links (breadth-first); returns self"""
+        goto, fail, out, prefix = self._goto, self._fail, self._out, self._prefix
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in goto[state].items():
+                queue.append(nxt)
+                link = fail[state]
+                while link and token not in goto[link]:
+                    link = fail[link]
+                fail[nxt] = goto[link].get(token, 0)
+                out[nxt] += out[fail[nxt]]
+                prefix[nxt] += prefix[fail[nxt]]
+        self._built = True
+        return self
+
+    def find_all(self, text):
+        """
+        Every keyword occurrence in text, in order of where it ends
+
+        Returns:
+            list: [KeywordMatch(keyword, category, severity, start, end)] where
+                  start/end are token positions in tokenize(text)
+        """
+        if not self._built:
+            self.build()
+        goto, fail, out, prefix = self._goto, self._fail, self._out, self._prefix
+        root = goto[0]
+        matches = []
+        state = 0
+        for i, token in enumerate(tokenize(text)):
+            pending = ()
+            if not state:
+                # most words start no keyword: one dict lookup and move on
+                state = root.get(token, 0)
+                if not state:
+                    continue
+            else:
+                pending = prefix[state]
+                while state and token not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(token, 0)
+            if out[state]:
+                for keyword, category, severity, length in out[state]:
+                    matches.append(KeywordMatch(keyword, category, severity, i - length + 1, i + 1))
+            for last, output in pending:
+                # a longer word starting with the last word (exact forms matched above)
+                if output not in out[state] and token.startswith(last) and token != last:
+                    keyword, category, severity, length = output
+                    matches.append(KeywordMatch(keyword, category, severity, i - length + 1, i + 1))
+        return matches
+
+    def by_category(self, text):
+        """{category: [keyword, ...]} for one pass over text (keywords de-duplicated, in text order)"""
+        found = {}
+        for match in self.find_all(text):
+            keywords = found.setdefault(match.category, [])
+            if match.keyword not in keywords:
+                keywords.append(match.keyword)
+        return found
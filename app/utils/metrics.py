@@ -0,0 +1,137 @@
+# app/utils/metrics.py
+"""
+Tiny in-process metrics registry (per worker, no external deps)
+  - counters:   METRICS.incr("aws.translate.retries")
+  - histograms: METRICS.observe("aws.translate.queue_wait_ms", 12.5)
+  - snapshot(): plain dict, safe to jsonify
+  - spans:      with span("kb_retrieval"): ...  -> "span.kb_retrieval_ms", plus
+                the request's span log when one is open (span_log())
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Fixed buckets for totals + a bounded window of recent samples for percentiles."""
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS, window=512):
+        self.bounds = tuple(buckets)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, value)] += 1
+            self._recent.append(value)
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q, default=None):
+        """q in [0, 100] over the recent window; default when there are no samples."""
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return default
+        idx = min(len(samples) - 1, max(0, int(round(q / 100.0 * (len(samples) - 1)))))
+        return samples[idx]
+
+    def snapshot(self):
+        p50, p95, p99 = (round(self.percentile(q, 0.0), 2) for q in (50, 95, 99))
+        with self._lock:
+            buckets = {f"le_{b}": c for b, c in zip(self.bounds, self._counts)}
+            buckets["le_inf"] = self._counts[-1]
+            return {
+                "count": self.count,
+                "avg": round(self.total / self.count, 2) if self.count else 0.0,
+                "max": round(self.max, 2),
+                "p50": p50, "p95": p95, "p99": p99,
+                "buckets": buckets,
+            }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def histogram(self, name):
+        h = self._histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self._histograms.setdefault(name, Histogram())
+        return h
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self, prefix=""):
+        with self._lock:
+            counters = {k: v for k, v in self._counters.items() if k.startswith(prefix)}
+            histograms = {k: h for k, h in self._histograms.items() if k.startswith(prefix)}
+        return {
+            "counters": dict(sorted(counters.items())),
+            "histograms": {k: h.snapshot() for k, h in sorted(histograms.items())},
+        }
+
+
+METRICS = MetricsRegistry()
+
+
+# ---------------------------- Spans ----------------------------
+# Spans of the current request, when the caller opened a span_log()
+_SPAN_LOG = contextvars.ContextVar("glucomate_span_log", default=None)
+
+
+def record_span(name, elapsed_ms):
+    """Record an already measured stage duration"""
+    METRICS.observe(f"span.{name}_ms", elapsed_ms)
+    log = _SPAN_LOG.get()
+    if log is not None:
+        log.append((name, round(elapsed_ms, 1)))
+
+
+@contextmanager
+def span(name):
+    """Time a block into the "span.<name>_ms" histogram (and the open span log)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, (time.perf_counter() - started) * 1000.0)
+
+
+@contextmanager
+def span_log():
+    """Collect this request's spans: with span_log() as spans: ... -> [(name, ms), ...] in finish order"""
+    log = []
+    token = _SPAN_LOG.set(log)
+    try:
+        yield log
+    finally:
+        _SPAN_LOG.reset(token)
+
+
+def format_timings(spans):
+    """Spans as a Server-Timing style header value: "kb_retrieval;dur=412.3, model;dur=2210.9" """
+    return ", ".join(f"{name};dur={ms}" for name, ms in spans)
@@ -0,0 +1,103 @@
+# app/utils/minhash.py
+"""
+MinHash signatures + LSH band index for near-duplicate detection
+- Pure Python, deterministic across processes (no reliance on hash())
+- Jaccard similarity of two shingle sets ~= share of equal signature slots
+"""
+
+import hashlib
+import random
+import threading
+from collections import defaultdict
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _base_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class MinHasher:
+    """Builds fixed-length MinHash signatures with universal hashing (a*x + b) mod p."""
+    def __init__(self, num_perm=64, seed=1):
+        self.num_perm = num_perm
+        rnd = random.Random(seed)
+        self._perms = [
+            (rnd.randint(1, _MERSENNE_PRIME - 1), rnd.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles):
+        hashes = [_base_hash(s) for s in set(shingles)]
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class LSHIndex:
+    """
+    Banded LSH over MinHash signatures: keys sharing any band are candidates.
+    With b bands of r rows the match probability crosses 50% near (1/b) ** (1/r).
+    """
+    def __init__(self, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+        self._keys = {}  # key -> band hashes, for removal
+        self._lock = threading.Lock()
+
+    def _band_hashes(self, sig):
+        r = self.rows
+        return [hash(sig[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def insert(self, key, sig):
+        bands = self._band_hashes(sig)
+        with self._lock:
+            self._remove_locked(key)
+            for table, bh in zip(self._buckets, bands):
+                table[bh].add(key)
+            self._keys[key] = bands
+
+    def query(self, sig):
+        found = set()
+        bands = self._band_hashes(sig)
+        with self._lock:
+            for table, bh in zip(self._buckets, bands):
+                found.update(table.get(bh, ()))
+        return found
+
+    def remove(self, key):
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key):
+        bands = self._keys.pop(key, None)
+        if not bands:
+            return
+        for table, bh in zip(self._buckets, bands):
+            bucket = table.get(bh)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del table[bh]
+
+    def clear(self):
+        with self._lock:
+            for table in self._buckets:
+                table.clear()
+            self._keys.clear()
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,166 @@
+# app/utils/rate_limiter.py
+"""
+Client-side adaptive rate limiting + retry for AWS calls
+- One token bucket per operation (e.g. "translate.translate_text"), shared by all threads
+- AIMD: throttling halves the allowed rate, successes creep it back up
+- Retries use full-jitter exponential backoff inside a per-call deadline
+- Queueing delay, retries and throttles go to METRICS under "aws.<operation>."
+"""
+
+import os
+import random
+import threading
+import time
+
+from app.utils.metrics import METRICS
+
+# ---------------------------- Env flags ----------------------------
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+AWS_RATE_LIMIT_RPS = _env_float("GLUCOMATE_AWS_RATE_LIMIT_RPS", 10.0)
+AWS_RATE_LIMIT_BURST = _env_float("GLUCOMATE_AWS_RATE_LIMIT_BURST", 20.0)
+AWS_RATE_LIMIT_MIN_RPS = _env_float("GLUCOMATE_AWS_RATE_LIMIT_MIN_RPS", 0.5)
+AWS_MAX_ATTEMPTS = int(_env_float("GLUCOMATE_AWS_MAX_ATTEMPTS", 4))
+AWS_CALL_DEADLINE_SECS = _env_float("GLUCOMATE_AWS_CALL_DEADLINE_SECS", 20.0)
+AWS_BACKOFF_BASE_SECS = _env_float("GLUCOMATE_AWS_BACKOFF_BASE_SECS", 0.25)
+AWS_BACKOFF_CAP_SECS = _env_float("GLUCOMATE_AWS_BACKOFF_CAP_SECS", 4.0)
+
+# Error codes that mean "slow down" (shrink the bucket) ...
+THROTTLE_CODES = {
+    "ThrottlingException", "TooManyRequestsException", "RequestLimitExceeded",
+    "ProvisionedThroughputExceededException", "ServiceQuotaExceededException",
+}
+# ... and the ones worth retrying (quota exhaustion is not)
+RETRYABLE_CODES = (THROTTLE_CODES - {"ServiceQuotaExceededException"}) | {
+    "ServiceUnavailableException", "InternalServerException", "ModelNotReadyException",
+    "EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError", "ConnectionClosedError",
+}
+
+
+class RateLimitDeadlineExceeded(Exception):
+    """Raised when a call could not get a token (or retry) before its deadline.
+    The message mentions ThrottlingException so the existing string-based
+    error handlers treat it as throttling."""
+    def __init__(self, operation):
+        super().__init__(f"ThrottlingException (client-side): deadline exceeded waiting for {operation}")
+        self.operation = operation
+
+
+def aws_error_code(error):
+    """botocore ClientError code, else the exception class name."""
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        code = (response.get("Error") or {}).get("Code")
+        if code:
+            return code
+    return type(error).__name__
+
+
+class AdaptiveTokenBucket:
+    def __init__(self, rate=AWS_RATE_LIMIT_RPS, burst=AWS_RATE_LIMIT_BURST,
+                 min_rate=AWS_RATE_LIMIT_MIN_RPS, max_rate=None):
+        self.max_rate = max_rate or rate
+        self.min_rate = min(min_rate, self.max_rate)
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout):
+        """Take one token; returns seconds waited, or None if not possible within timeout."""
+        start = time.monotonic()
+        deadline = start + max(0.0, timeout)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return now - start
+                wait = (1.0 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return None
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            # additive increase: regain the full rate over ~max_rate successes
+            self.rate = min(self.max_rate, self.rate + max(0.1, self.max_rate / 50.0))
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            self._tokens = min(self._tokens, 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {"rate_rps": round(self.rate, 3), "max_rate_rps": self.max_rate, "burst": self.burst}
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(operation):
+    limiter = _LIMITERS.get(operation)
+    if limiter is None:
+        with _LIMITERS_LOCK:
+            limiter = _LIMITERS.setdefault(operation, AdaptiveTokenBucket())
+    return limiter
+
+
+def limiter_stats():
+    with _LIMITERS_LOCK:
+        items = list(_LIMITERS.items())
+    return {op: limiter.stats() for op, limiter in sorted(items)}
+
+
+def call_aws(operation, fn, deadline_secs=None, max_attempts=None, **kwargs):
+    """
+    Run fn(**kwargs) through the operation's limiter with jittered exponential retry.
+    Non-retryable errors (and the last retryable one) are re-raised unchanged.
+    """
+    limiter = get_limiter(operation)
+    max_attempts = max_attempts or AWS_MAX_ATTEMPTS
+    deadline = time.monotonic() + (deadline_secs or AWS_CALL_DEADLINE_SECS)
+    prefix = f"aws.{operation}."
+
+    attempt = 0
+    while True:
+        waited = limiter.acquire(timeout=deadline - time.monotonic())
+        if waited is None:
+            METRICS.incr(prefix + "deadline_exceeded")
+            raise RateLimitDeadlineExceeded(operation)
+        METRICS.observe(prefix + "queue_wait_ms", waited * 1000.0)
+        METRICS.incr(prefix + "calls")
+
+        try:
+            result = fn(**kwargs)
+        except Exception as e:
+            code = aws_error_code(e)
+            if code in THROTTLE_CODES:
+                limiter.on_throttle()
+                METRICS.incr(prefix + "throttled")
+            attempt += 1
+            if code not in RETRYABLE_CODES or attempt >= max_attempts:
+                METRICS.incr(prefix + "errors")
+                raise
+            delay = random.uniform(0, min(AWS_BACKOFF_CAP_SECS, AWS_BACKOFF_BASE_SECS * (2 ** attempt)))
+            if time.monotonic() + delay >= deadline:
+                METRICS.incr(prefix + "errors")
+                raise
+            METRICS.incr(prefix + "retries")
+            time.sleep(delay)
+            continue
+
+        limiter.on_success()
+        return result
@@ -0,0 +1,109 @@
+# app/utils/single_flight.py
+"""
+Single-flight: concurrent identical calls share one execution
+- In-process: followers wait for the leader and get its result (or its exception)
+- Cross-worker (Redis StateStore only): the leader holds a SET NX lock and
+  publishes its result; followers in other workers poll for it and run the
+  call themselves if the leader fails or takes longer than wait_secs
+"""
+
+import os
+import threading
+import time
+
+from app.utils.metrics import METRICS
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name, store=None, lock_ttl_secs=30, result_ttl_secs=15, wait_secs=25, poll_secs=0.05):
+        self.name = name
+        self._store = store if (store is not None and store.uses_redis) else None
+        self.lock_ttl = lock_ttl_secs
+        self.result_ttl = result_ttl_secs
+        self.wait_secs = wait_secs
+        self.poll_secs = poll_secs
+
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return fn() - or the result of an identical call already in flight."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            METRICS.incr(f"single_flight.{self.name}.shared")
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._run(key, fn)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _run(self, key, fn):
+        if not self._store:
+            METRICS.incr(f"single_flight.{self.name}.executed")
+            return fn()
+
+        try:
+            is_leader = self._store.set_json_if_absent(key, {"pid": os.getpid()}, suffix="sf-lock", ttl=self.lock_ttl)
+        except Exception:
+            is_leader = True  # Redis trouble: just make the call
+
+        if is_leader:
+            METRICS.incr(f"single_flight.{self.name}.executed")
+            try:
+                result = fn()
+                try:
+                    self._store.set_json(key, {"v": result}, suffix="sf-result", ttl=self.result_ttl)
+                except Exception:
+                    pass
+                return result
+            finally:
+                try:
+                    self._store.delete(key, suffix="sf-lock")
+                except Exception:
+                    pass
+
+        # Another worker is making this call: wait for its published result
+        deadline = time.monotonic() + self.wait_secs
+        try:
+            while time.monotonic() < deadline:
+                published = self._store.get_json(key, suffix="sf-result")
+                if published and "v" in published:
+                    METRICS.incr(f"single_flight.{self.name}.shared_remote")
+                    return published["v"]
+                if self._store.get_json(key, suffix="sf-lock") is None:
+                    # leader finished: one last look for its result, then go ourselves
+                    published = self._store.get_json(key, suffix="sf-result")
+                    if published and "v" in published:
+                        METRICS.incr(f"single_flight.{self.name}.shared_remote")
+                        return published["v"]
+                    break
+                time.sleep(self.poll_secs)
+        except Exception:
+            pass
+
+        METRICS.incr(f"single_flight.{self.name}.executed")
+        return fn()
@@ -0,0 +1,93 @@
+# app/utils/stage_executor.py
+"""
+Concurrent execution of independent, network-bound pipeline stages
+- One bounded thread pool per process, shared by all bots
+- Each stage has its own timeout and a default used on timeout/error
+  (exception types listed in reraise propagate to the caller instead)
+- Stage latency and outcomes go to METRICS under "stage.<name>."
+- Stages run in a copy of the caller's context, so spans recorded inside a
+  stage land in the caller's span log
+- A lone stage has nothing to overlap with and runs on the calling thread
+  (no pool hop; its timeout is not enforced)
+"""
+
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from app.utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+try:
+    STAGE_MAX_WORKERS = int(os.getenv("GLUCOMATE_STAGE_WORKERS", "16"))
+except ValueError:
+    STAGE_MAX_WORKERS = 16
+
+
+class Stage:
+    __slots__ = ("fn", "timeout", "default", "reraise")
+
+    def __init__(self, fn, timeout=30.0, default=None, reraise=()):
+        self.fn = fn
+        self.timeout = timeout
+        self.default = default
+        self.reraise = reraise
+
+
+class StageExecutor:
+    def __init__(self, max_workers=STAGE_MAX_WORKERS, thread_name_prefix="glucomate-stage"):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def run(self, stages):
+        """
+        Run {name: Stage} concurrently; returns {name: result}.
+        A stage that raises or misses its timeout yields its default. Timed-out
+        work is not interrupted, its result is simply dropped.
+        """
+        if len(stages) == 1:
+            (name, stage), = stages.items()
+            try:
+                return {name: self._timed(name, stage.fn)}
+            except Exception as e:
+                return {name: self._failed(name, stage, e)}
+
+        started = time.monotonic()
+        futures = {
+            name: self._pool.submit(contextvars.copy_context().run, self._timed, name, stage.fn)
+            for name, stage in stages.items()
+        }
+
+        results = {}
+        for name, future in futures.items():
+            stage = stages[name]
+            remaining = max(0.0, started + stage.timeout - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeout:
+                METRICS.incr(f"stage.{name}.timeouts")
+                logger.warning("stage %s timed out after %.1fs", name, stage.timeout)
+                results[name] = stage.default
+            except Exception as e:
+                results[name] = self._failed(name, stage, e)
+        return results
+
+    def _failed(self, name, stage, error):
+        """Default for a stage that raised (or re-raise it if listed in reraise)"""
+        METRICS.incr(f"stage.{name}.errors")
+        if isinstance(error, stage.reraise):
+            raise error
+        logger.exception("stage %s failed: %s", name, error)
+        return stage.default
+
+    def _timed(self, name, fn):
+        t0 = time.monotonic()
+        try:
+            return fn()
+        finally:
+            METRICS.observe(f"stage.{name}.ms", (time.monotonic() - t0) * 1000.0)
+
+
+STAGES = StageExecutor()
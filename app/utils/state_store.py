@@ -23,6 +23,23 @@ class _InMemoryTTL:
         with self._lock:
             self._d[k] = (exp, payload)
 
+    def add(self, k, payload, ttl=None):
+        now = time.time()
+        with self._lock:
+            v = self._d.get(k)
+            if v and not (v[0] and now > v[0]):
+                return False
+            self._d[k] = (now + ttl if ttl else None, payload)
+            return True
+
+    def delete(self, k):
+        with self._lock:
+            self._d.pop(k, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._d)
+
 class StateStore:
     """
     Simple namespaced state store:
@@ -51,6 +68,15 @@ class StateStore:
         if self._file_cache:
             os.makedirs(self._file_dir, exist_ok=True)
 
+    @property
+    def is_shared(self):
+        """True when state is visible to other workers (Redis or file cache)."""
+        return bool(self._redis) or self._file_cache
+
+    @property
+    def uses_redis(self):
+        return bool(self._redis)
+
     def _key(self, user_id, suffix="state"):
         return f"{self.ns}:{user_id}:{suffix}"
 
@@ -87,3 +113,61 @@ class StateStore:
             return
 
         self._mem.set(key, payload, ttl=ttl)
+
+    def set_json_if_absent(self, user_id, payload, suffix="state", ttl=None):
+        """Atomic create (Redis SET NX); False if the key already exists."""
+        key = self._key(user_id, suffix)
+        ttl = ttl or self.default_ttl
+        raw = json.dumps(payload, ensure_ascii=False)
+
+        if self._redis:
+            return bool(self._redis.set(key, raw, ex=ttl, nx=True))
+
+        if self._file_cache:
+            path = os.path.join(self._file_dir, key.replace(":", "_") + ".json")
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                return False
+            with os.fdopen(fd, "w") as f:
+                f.write(raw)
+            return True
+
+        return self._mem.add(key, payload, ttl=ttl)
+
+    def delete(self, user_id, suffix="state"):
+        key = self._key(user_id, suffix)
+        if self._redis:
+            self._redis.delete(key)
+            return
+
+        if self._file_cache:
+            path = os.path.join(self._file_dir, key.replace(":", "_") + ".json")
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            return
+
+        self._mem.delete(key)
+
+    def keys(self, suffix="state"):
+        """user_ids stored under suffix (Redis SCAN, file listing or memory); file ids have ':' as '_'"""
+        if self._redis:
+            prefix, end = f"{self.ns}:", f":{suffix}"
+            return [k[len(prefix):-len(end)] for k in self._redis.scan_iter(match=f"{self.ns}:*:{suffix}", count=500)]
+
+        if self._file_cache:
+            prefix, end = f"{self.ns}_", f"_{suffix}.json"
+            with suppress(FileNotFoundError):
+                return [name[len(prefix):-len(end)] for name in os.listdir(self._file_dir)
+                        if name.startswith(prefix) and name.endswith(end) and len(name) > len(prefix) + len(end)]
+            return []
+
+        prefix, end = f"{self.ns}:", f":{suffix}"
+        return [k[len(prefix):-len(end)] for k in self._mem.keys() if k.startswith(prefix) and k.endswith(end)]
+
+    def delete_all(self, suffix="state"):
+        """Delete every entry under suffix; returns how many"""
+        user_ids = self.keys(suffix)
+        for user_id in user_ids:
+            self.delete(user_id, suffix=suffix)
+        return len(user_ids)
@@ -0,0 +1,148 @@
+# app/utils/ttl_cache.py
+import hashlib, json, threading, time
+from collections import OrderedDict
+
+
+def make_cache_key(*parts):
+    """Stable short key from JSON-serializable parts."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry TTL and hit/miss counters:
+      - Process-local LRU tier (always on)
+      - Optional shared tier through a StateStore, used only when the store is
+        shared across workers (Redis/file); values must then be JSON-serializable.
+        Each shared entry carries its own expiry, checked on read, because the
+        file store keeps entries forever; writers also start a background sweep
+        of expired file entries every sweep_interval_secs (Redis expires its own)
+      - clear() empties both tiers (the shared one for every worker)
+    """
+    def __init__(self, maxsize=512, ttl_secs=3600, store=None, suffix="cache", sweep_interval_secs=600):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl_secs
+        self.suffix = suffix
+        self.sweep_interval = sweep_interval_secs
+        self._store = store if (store is not None and store.is_shared) else None
+
+        self._d = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + sweep_interval_secs
+        self._sweeping = False
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.swept = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._d.get(key)
+            if item:
+                exp, value = item
+                if now <= exp:
+                    self._d.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._d.pop(key, None)
+
+        if self._store:
+            try:
+                wrapped = self._store.get_json(key, suffix=self.suffix)
+            except Exception:
+                wrapped = None
+            if wrapped and "v" in wrapped:
+                remaining = wrapped.get("exp", 0) - now
+                if remaining > 0:
+                    self._set_local(key, wrapped["v"], min(self.ttl, remaining))
+                    with self._lock:
+                        self.hits += 1
+                        self.shared_hits += 1
+                    return wrapped["v"]
+                try:
+                    self._store.delete(key, suffix=self.suffix)
+                except Exception:
+                    pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        self._set_local(key, value, ttl)
+        if self._store:
+            try:
+                self._store.set_json(key, {"v": value, "exp": time.time() + ttl}, suffix=self.suffix, ttl=ttl)
+            except Exception:
+                pass
+            self._maybe_sweep()
+
+    def _set_local(self, key, value, ttl):
+        with self._lock:
+            self._d[key] = (time.time() + ttl, value)
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+    def _maybe_sweep(self):
+        """Start a background sweep of the shared file tier once per interval"""
+        if self._store.uses_redis:
+            return
+        now = time.time()
+        with self._lock:
+            if self._sweeping or now < self._next_sweep:
+                return
+            self._sweeping = True
+            self._next_sweep = now + self.sweep_interval
+        threading.Thread(target=self.sweep_shared, name=f"ttl-cache-sweep-{self.suffix}", daemon=True).start()
+
+    def sweep_shared(self):
+        """Delete the shared tier's expired entries; returns how many"""
+        removed = 0
+        try:
+            if not self._store:
+                return 0
+            now = time.time()
+            for key in self._store.keys(suffix=self.suffix):
+                try:
+                    wrapped = self._store.get_json(key, suffix=self.suffix)
+                    if wrapped is None or wrapped.get("exp", 0) <= now:
+                        self._store.delete(key, suffix=self.suffix)
+                        removed += 1
+                except Exception:
+                    continue
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._sweeping = False
+                self.swept += removed
+        return removed
+
+    def clear(self):
+        """Empty the local tier and delete the shared entries (seen by every worker)"""
+        with self._lock:
+            self._d.clear()
+        if self._store:
+            try:
+                self._store.delete_all(suffix=self.suffix)
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._d),
+                "maxsize": self.maxsize,
+                "ttl_secs": self.ttl,
+                "shared": bool(self._store),
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "shared_swept": self.swept,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }